@@ -18,6 +18,7 @@ from routes.user import user_bp
 
 # Import config
 from config.opensearch_client import init_opensearch
+from config.metrics import metrics
 
 def create_app():
     app = Flask(__name__)
@@ -34,16 +35,11 @@ def create_app():
     # JWT Manager
     jwt = JWTManager(app)
     
-    # JWT blacklist checker
+    # JWT blacklist checker (answered from the per-worker revocation cache)
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
-        jti = jwt_payload['jti']
-        try:
-            from config.opensearch_client import opensearch_ops
-            opensearch_ops.get_document('blacklisted_tokens', jti)
-            return True  # Token is blacklisted
-        except:
-            return False  # Token is not blacklisted
+        from services.token_revocation import revocation_cache
+        return revocation_cache.is_revoked(jwt_payload['jti'])
 
     # Bcrypt for password hashing
     bcrypt = Bcrypt(app)
@@ -72,6 +68,13 @@ def create_app():
             'version': '1.0.0'
         }), 200
 
+    # Metrics of this worker process (circuit breaker, job tracker, ...).
+    # Unauthenticated, so only registered when explicitly enabled
+    if os.getenv('METRICS_ENABLED', 'false').lower() == 'true':
+        @app.route('/api/metrics', methods=['GET'])
+        def metrics_snapshot():
+            return jsonify(metrics.snapshot()), 200
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
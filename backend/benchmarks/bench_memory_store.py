@@ -0,0 +1,116 @@
+"""Benchmark: list-scan mock storage vs the indexed MemoryStore.
+
+Loads the same documents into a replica of the old list-based fallback
+(every get/update/search walks the whole list) and into MemoryStore, then
+times the lookups the routes actually issue: a user by email, the active
+sessions of a user, a get by id and a partial update.
+
+    cd backend && python benchmarks/bench_memory_store.py [documents]
+
+The list baseline is timed over fewer iterations since each call is O(n).
+"""
+import os
+import sys
+import time
+import uuid
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config.opensearch_client import INDEX_MAPPINGS  # noqa: E402
+from config.document_store import keyword_fields_from_mappings  # noqa: E402
+from config.memory_store import MemoryStore  # noqa: E402
+
+
+class ListStore:
+    """The previous fallback: one list per index, linear scans everywhere"""
+
+    def __init__(self):
+        self.data = {}
+
+    def index(self, index, doc_id, body):
+        self.data.setdefault(index, []).append({'_id': doc_id, '_source': body})
+
+    def get(self, index, doc_id):
+        for doc in self.data.get(index, []):
+            if doc['_id'] == doc_id:
+                return doc
+        raise Exception('Document not found')
+
+    def update(self, index, doc_id, body):
+        for doc in self.data.get(index, []):
+            if doc['_id'] == doc_id:
+                doc['_source'].update(body)
+                return doc
+        raise Exception('Document not found')
+
+    def search(self, index, query, size):
+        # The old fallback ignored the query; filtering here keeps the
+        # comparison honest about the work a correct list scan has to do
+        from config.query_dsl import matches
+        hits = [d for d in self.data.get(index, []) if matches(query, d['_id'], d['_source'])]
+        return hits[:size]
+
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(samples)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    users = max(count // 10, 1)
+
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    documents = []
+    for i, user_id in enumerate(user_ids):
+        documents.append(('users', user_id, {
+            'user_id': user_id, 'email': f"user{i}@example.com",
+            'username': f"user{i}", 'is_active': True}))
+    for i in range(count - users):
+        documents.append(('sessions', str(uuid.uuid4()), {
+            'user_id': user_ids[i % users], 'is_active': i % 3 != 0,
+            'session_id': str(uuid.uuid4())}))
+
+    store = MemoryStore(keyword_fields=keyword_fields_from_mappings(INDEX_MAPPINGS))
+    baseline = ListStore()
+    for index, doc_id, body in documents:
+        store.index(index, doc_id, body)
+        baseline.index(index, doc_id, dict(body))
+
+    def email_query(i):
+        return {'term': {'email': f"user{(i * 7919) % users}@example.com"}}
+
+    def sessions_query(i):
+        return {'bool': {'must': [{'term': {'user_id': user_ids[(i * 7919) % users]}},
+                                  {'term': {'is_active': True}}]}}
+
+    cases = [
+        ('term email',
+         lambda i: baseline.search('users', email_query(i), 1),
+         lambda i: store.search('users', email_query(i), 1)),
+        ('bool user sessions',
+         lambda i: baseline.search('sessions', sessions_query(i), 100),
+         lambda i: store.search('sessions', sessions_query(i), 100)),
+        ('get by id',
+         lambda i: baseline.get('users', user_ids[-1 - i % 10]),
+         lambda i: store.get('users', user_ids[-1 - i % 10])),
+        ('update',
+         lambda i: baseline.update('users', user_ids[-1 - i % 10], {'last_login': str(i)}),
+         lambda i: store.update('users', user_ids[-1 - i % 10], {'last_login': str(i)})),
+    ]
+
+    print(f"{count} documents ({users} users, {count - users} sessions)")
+    print(f"{'operation':<20} {'list scan':>12} {'MemoryStore':>12} {'speedup':>9}")
+    for name, old, new in cases:
+        old_ms = timed(old, 20)
+        new_ms = timed(new, 2000)
+        print(f"{name:<20} {old_ms:9.3f} ms {new_ms:9.4f} ms {old_ms / new_ms:8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
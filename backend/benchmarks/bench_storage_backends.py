@@ -0,0 +1,187 @@
+"""Benchmark: in-memory vs SQLite vs OpenSearch storage backends.
+
+Loads users, sessions and travel packages into each backend and times the
+queries behind the hot paths:
+
+- login: user lookup by email (term), then a session write
+- package list: packages of a user's jobs (bool of should terms, size 100)
+- get by id and a partial update
+
+    cd backend && python benchmarks/bench_storage_backends.py [users]
+
+OpenSearch is included when OPENSEARCH_HOST/OPENSEARCH_PORT point at a
+reachable cluster; it works on throwaway `bench_*` indices that are
+deleted at the end. The SQLite file lives in a temporary directory.
+"""
+import os
+import sys
+import time
+import uuid
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config.opensearch_client import INDEX_MAPPINGS  # noqa: E402
+from config.document_store import keyword_fields_from_mappings  # noqa: E402
+from config.memory_store import MemoryStore  # noqa: E402
+from config.sqlite_store import SQLiteStore  # noqa: E402
+
+JOBS_PER_USER = 3
+PACKAGES_PER_JOB = 5
+SESSIONS_PER_USER = 4
+
+
+class OpenSearchBench:
+    """Just enough of the store interface on top of a real cluster"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _name(self, index):
+        return f"bench_{index}"
+
+    def setup(self):
+        for index, mapping in INDEX_MAPPINGS.items():
+            self.client.indices.delete(index=self._name(index), ignore=[404])
+            self.client.indices.create(index=self._name(index), body=mapping)
+
+    def teardown(self):
+        for index in INDEX_MAPPINGS:
+            self.client.indices.delete(index=self._name(index), ignore=[404])
+
+    def bulk_index(self, index, documents):
+        from opensearchpy import helpers
+        helpers.bulk(self.client, ({'_index': self._name(index), '_id': doc_id,
+                                    '_source': body} for doc_id, body in documents),
+                     refresh='true')
+
+    def index(self, index, doc_id, body, op_type=None):
+        return self.client.index(index=self._name(index), id=doc_id, body=body)
+
+    def get(self, index, doc_id):
+        return self.client.get(index=self._name(index), id=doc_id)
+
+    def update(self, index, doc_id, body):
+        return self.client.update(index=self._name(index), id=doc_id, body={'doc': body})
+
+    def search(self, index, query=None, size=10, sort=None):
+        body = {'size': size, 'query': query or {'match_all': {}}}
+        if sort:
+            body['sort'] = sort
+        return self.client.search(index=self._name(index), body=body)
+
+
+def connect_opensearch():
+    try:
+        from opensearchpy import OpenSearch
+        client = OpenSearch(hosts=[{'host': os.getenv('OPENSEARCH_HOST', 'localhost'),
+                                    'port': int(os.getenv('OPENSEARCH_PORT', 9200))}],
+                            http_auth=(os.getenv('OPENSEARCH_USERNAME', 'admin'),
+                                       os.getenv('OPENSEARCH_PASSWORD', 'admin')),
+                            use_ssl=os.getenv('OPENSEARCH_USE_SSL', 'false').lower() == 'true',
+                            verify_certs=False, ssl_show_warn=False,
+                            max_retries=0, timeout=5)
+        client.info()
+        return client
+    except Exception as e:
+        print(f"OpenSearch not reachable, skipped ({type(e).__name__})")
+        return None
+
+
+def build_dataset(users):
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    data = {'users': [], 'sessions': [], 'travel_packages': []}
+    jobs = {}
+    for i, user_id in enumerate(user_ids):
+        data['users'].append((user_id, {'id': user_id, 'email': f"user{i}@example.com",
+                                        'username': f"user{i}", 'name': f"User {i}"}))
+        for _ in range(SESSIONS_PER_USER):
+            session_id = str(uuid.uuid4())
+            data['sessions'].append((session_id, {'session_id': session_id,
+                                                  'user_id': user_id, 'is_active': True}))
+        jobs[user_id] = [str(uuid.uuid4()) for _ in range(JOBS_PER_USER)]
+        for position, job_id in enumerate(jobs[user_id]):
+            for p in range(PACKAGES_PER_JOB):
+                data['travel_packages'].append((f"{job_id}:p{p}", {
+                    'job_id': job_id, 'package_id': f"p{p}", 'position': p,
+                    'status': 'available', 'created_at': f"2025-01-{position + 1:02d}",
+                    'hotels_selezionati': {'roma': [{'nome': 'Hotel', 'prezzo': 100}]}}))
+    return user_ids, jobs, data
+
+
+def timed(fn, iterations):
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95)]
+
+
+def run(name, store, user_ids, jobs, data, iterations):
+    start = time.perf_counter()
+    for index, documents in data.items():
+        store.bulk_index(index, documents)
+    load = time.perf_counter() - start
+
+    users = len(user_ids)
+
+    def login(i):
+        n = (i * 7919) % users
+        user = store.search('users', {'term': {'email': f"user{n}@example.com"}}, 1)
+        assert user['hits']['hits'][0]['_id'] == user_ids[n]
+        session_id = str(uuid.uuid4())
+        store.index('sessions', session_id, {'session_id': session_id,
+                                             'user_id': user_ids[n], 'is_active': True})
+
+    def package_list(i):
+        user_id = user_ids[(i * 7919) % users]
+        should = [{'term': {'job_id': job_id}} for job_id in jobs[user_id]]
+        should.append({'term': {'user_id': user_id}})
+        result = store.search('travel_packages', {'bool': {'should': should}}, 100,
+                              sort=[{'created_at': {'order': 'desc'}}])
+        assert len(result['hits']['hits']) == JOBS_PER_USER * PACKAGES_PER_JOB
+
+    def get_by_id(i):
+        store.get('users', user_ids[(i * 7919) % users])
+
+    def update(i):
+        store.update('users', user_ids[(i * 7919) % users], {'last_login': str(i)})
+
+    print(f"\n{name}  (load {sum(len(d) for d in data.values())} docs: {load:.2f} s)")
+    for label, fn in (('login', login), ('package list', package_list),
+                      ('get by id', get_by_id), ('update', update)):
+        mean, p95 = timed(fn, iterations)
+        print(f"  {label:<14} mean {mean:8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(os.getenv('BENCH_ITERATIONS', 500))
+    user_ids, jobs, data = build_dataset(users)
+    keyword_fields = keyword_fields_from_mappings(INDEX_MAPPINGS)
+    print(f"{users} users, {len(data['sessions'])} sessions, "
+          f"{len(data['travel_packages'])} packages; {iterations} iterations per operation")
+
+    run('MemoryStore', MemoryStore(keyword_fields=keyword_fields),
+        user_ids, jobs, data, iterations)
+
+    with tempfile.TemporaryDirectory() as directory:
+        run('SQLiteStore', SQLiteStore(os.path.join(directory, 'bench.sqlite3'),
+                                       keyword_fields=keyword_fields),
+            user_ids, jobs, data, iterations)
+
+    client = connect_opensearch()
+    if client:
+        bench = OpenSearchBench(client)
+        bench.setup()
+        try:
+            run('OpenSearch', bench, user_ids, jobs, data, iterations)
+        finally:
+            bench.teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark: bare requests calls vs the pooled TravelAPIClient.
+
+Starts a local HTTP/1.1 stand-in for the external travel API and times the
+same status request issued with a fresh connection per call (what the
+routes used to do) and through the shared keep-alive pool.
+
+    cd backend && python benchmarks/bench_travel_api_client.py [calls]
+
+Loopback TCP handshakes are cheap, so the saving measured here is a lower
+bound: against the real API every new connection also pays a TLS
+handshake and a network round trip.
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections open like a real API
+    disable_nagle_algorithm = True  # as production servers do
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._reply({'access_token': 'bench-token', 'expires_in': 3600})
+
+    def do_GET(self):
+        self._reply({'job_id': 'bench', 'status': 'PROCESSING'})
+
+
+def timed(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    print(f"{name:<22} mean {statistics.mean(samples):7.3f} ms  "
+          f"p50 {samples[len(samples) // 2]:7.3f} ms  "
+          f"p95 {samples[int(len(samples) * 0.95)]:7.3f} ms")
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.environ.update(TRAVEL_API_URL=base_url,
+                      TRAVEL_API_USERNAME='bench',
+                      TRAVEL_API_PASSWORD='bench')
+    from config.travel_api_client import travel_api_client
+
+    status_url = f"{base_url}/api/search/bench"
+
+    def bare_call():
+        requests.get(status_url,
+                     headers={'Authorization': 'Bearer bench-token'},
+                     timeout=30).json()
+
+    def pooled_call():
+        travel_api_client.get('/api/search/bench').json()
+
+    # Warm up: mint the token and open the pooled connection
+    pooled_call()
+    bare_call()
+
+    bare = timed(bare_call, calls)
+    pooled = timed(pooled_call, calls)
+
+    print(f"{calls} status calls against {base_url}")
+    report('requests.get (fresh)', bare)
+    report('TravelAPIClient', pooled)
+    saved = statistics.mean(bare) - statistics.mean(pooled)
+    print(f"saved per call: {saved:.3f} ms "
+          f"({saved / statistics.mean(bare) * 100:.1f}%)")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
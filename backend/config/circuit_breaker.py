@@ -0,0 +1,97 @@
+"""Circuit breaker for calls to an external dependency"""
+import threading
+import logging
+import time
+
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker.
+
+    - closed: calls go through; `failure_threshold` consecutive failures
+      open the circuit.
+    - open: allow_request() returns False without touching the network,
+      until `reset_timeout` seconds have passed.
+    - half-open: up to `half_open_max_calls` trial calls go through; a
+      success closes the circuit, a failure opens it again.
+
+    Callers report outcomes with record_success() / record_failure().
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        metrics.set_gauge(f"{name}.circuit_state", lambda: STATE_VALUES[self.state])
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def allow_request(self):
+        """True if a call may be attempted now"""
+        # Fast path: no lock while closed or while waiting out the timeout
+        if self._state == CLOSED:
+            return True
+        if self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+            metrics.inc(f"{self.name}.short_circuited")
+            return False
+
+        with self._lock:
+            if self._state == OPEN:
+                self._transition(HALF_OPEN)
+            if self._state == CLOSED:
+                return True
+            if self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+        metrics.inc(f"{self.name}.short_circuited")
+        return False
+
+    def record_success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        metrics.inc(f"{self.name}.failures")
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED
+                                             and self._failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def trip(self):
+        """Open the circuit right away (e.g. the dependency is down at startup)"""
+        with self._lock:
+            if self._state != OPEN:
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        previous, self._state = self._state, state
+        self._trial_calls = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        metrics.inc(f"{self.name}.transitions.{state}")
+        log = logger.info if state == CLOSED else logger.warning
+        log(f"🔌 {self.name} circuit {previous} -> {state}")
@@ -0,0 +1,89 @@
+"""Local document stores used instead of (or as a fallback for) OpenSearch.
+
+OpenSearchOperations delegates to a DocumentStore whenever it has no
+cluster to talk to. Which one is chosen by STORAGE_BACKEND:
+
+    opensearch  use the cluster, fall back to an in-memory store (default)
+    memory      in-memory only, lost on restart (development)
+    sqlite      embedded on-disk store shared by every worker process
+"""
+from abc import ABC, abstractmethod
+import os
+
+STORAGE_BACKENDS = ('opensearch', 'memory', 'sqlite')
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'opensearch').strip().lower()
+SQLITE_PATH = os.getenv('STORAGE_SQLITE_PATH',
+                        os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                     'data', 'yookye.sqlite3'))
+
+
+def keyword_fields_from_mappings(mappings):
+    """Map each index to its keyword fields, the ones local stores index"""
+    fields = {}
+    for index, definition in mappings.items():
+        properties = definition.get('mappings', {}).get('properties', {})
+        fields[index] = {name for name, spec in properties.items()
+                         if spec.get('type') in ('keyword', 'boolean', 'ip')}
+    return fields
+
+
+class DocumentStore(ABC):
+    """OpenSearch-shaped document storage.
+
+    Responses mirror the OpenSearch ones the routes read (`_source`,
+    `hits.hits`, `hits.total.value`, ...). index() returns None instead of
+    a response when op_type='create' finds an existing document.
+    """
+
+    @abstractmethod
+    def index(self, index, doc_id, body, op_type=None):
+        pass
+
+    @abstractmethod
+    def bulk_index(self, index, documents):
+        """Store (doc_id, body) pairs, returning how many were written"""
+
+    @abstractmethod
+    def get(self, index, doc_id, source=None):
+        """source: _source filter (see query_dsl.filter_source)"""
+
+    @abstractmethod
+    def update(self, index, doc_id, body):
+        pass
+
+    @abstractmethod
+    def delete(self, index, doc_id):
+        pass
+
+    @abstractmethod
+    def search(self, index, query=None, size=10, sort=None, from_=0, search_after=None,
+               source=None):
+        pass
+
+    @abstractmethod
+    def update_by_query(self, index, query, body):
+        """Merge body into every matching document (see
+        query_dsl.merge_partial), returning their ids"""
+
+    @abstractmethod
+    def delete_by_query(self, index, query):
+        """Delete every matching document, returning their ids"""
+
+    @abstractmethod
+    def count(self, index):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+def create_document_store(keyword_fields, backend=STORAGE_BACKEND):
+    """Build the local store for the configured backend"""
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    if backend == 'sqlite':
+        from config.sqlite_store import SQLiteStore
+        return SQLiteStore(SQLITE_PATH, keyword_fields=keyword_fields)
+    from config.memory_store import MemoryStore
+    return MemoryStore(keyword_fields=keyword_fields)
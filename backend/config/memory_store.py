@@ -0,0 +1,296 @@
+"""In-memory document store used when OpenSearch is unavailable.
+
+Documents live in a dict per index, keyed by id, so get/index/update/delete
+are O(1). Keyword fields get hash postings (value -> ids) that narrow term,
+terms, ids and keyword match queries to candidate documents before the full
+query is evaluated. Indices are guarded by a fixed pool of striped locks.
+Writes replace a document's _source dict instead of mutating it, which lets
+searches evaluate queries on a snapshot outside the lock.
+"""
+from datetime import datetime
+import threading
+
+from config.document_store import DocumentStore
+from config.query_dsl import (matches, sort_hits, search_after_hits, field_values, get_field,
+                              filter_source, merge_partial)
+
+
+class MemoryIndex:
+    """Documents of one index plus their keyword postings"""
+
+    def __init__(self, name, keyword_fields=None):
+        self.name = name
+        self.docs = {}
+        self._seq = 0
+        # Unmapped indices (e.g. blacklisted_tokens) get term postings on demand
+        self.dynamic = keyword_fields is None
+        self.keyword_fields = frozenset(keyword_fields or ())
+        self.postings = {field: {} for field in self.keyword_fields}
+
+    def _postings_add(self, doc_id, source, fields=None):
+        for field in fields or self.postings:
+            postings = self.postings[field]
+            for value in field_values(get_field(source, field)):
+                if isinstance(value, (str, int, float, bool)):
+                    postings.setdefault(value, set()).add(doc_id)
+
+    def _postings_remove(self, doc_id, source):
+        for field, postings in self.postings.items():
+            for value in field_values(get_field(source, field)):
+                if isinstance(value, (str, int, float, bool)):
+                    ids = postings.get(value)
+                    if ids is not None:
+                        ids.discard(doc_id)
+                        if not ids:
+                            del postings[value]
+
+    def put(self, doc_id, source):
+        old = self.docs.pop(doc_id, None)
+        if old is not None:
+            self._postings_remove(doc_id, old['_source'])
+        version = old['_version'] + 1 if old else 1
+        # Rewritten documents move to the end, like a fresh index operation
+        self._seq += 1
+        self.docs[doc_id] = {'_id': doc_id, '_version': version, '_seq': self._seq,
+                             '_source': source}
+        self._postings_add(doc_id, source)
+        return version
+
+    def remove(self, doc_id):
+        old = self.docs.pop(doc_id)
+        self._postings_remove(doc_id, old['_source'])
+        return old
+
+    def _ensure_postings(self, field):
+        """Build postings for a field of an unmapped index the first time it is queried"""
+        if field in self.postings:
+            return True
+        if not self.dynamic:
+            return False
+        self.postings[field] = {}
+        for doc_id, doc in self.docs.items():
+            self._postings_add(doc_id, doc['_source'], fields=[field])
+        return True
+
+    def candidates(self, query):
+        """Ids that may match the query, or None when every doc must be checked.
+
+        The returned set may be a live postings set: read it under the index lock
+        and never modify it.
+        """
+        if not query:
+            return None
+        kind, body = next(iter(query.items()))
+
+        if kind == 'ids':
+            return {i for i in body.get('values', []) if i in self.docs}
+
+        if kind == 'term':
+            field, spec = next(iter(body.items()))
+            value = spec.get('value') if isinstance(spec, dict) else spec
+            if isinstance(value, (str, int, float, bool)) and self._ensure_postings(field):
+                return self.postings[field].get(value, frozenset())
+            return None
+
+        if kind == 'match':
+            # Only keyword-mapped fields match exactly
+            field, spec = next(iter(body.items()))
+            value = spec.get('query') if isinstance(spec, dict) else spec
+            if field in self.keyword_fields and isinstance(value, (str, int, float, bool)):
+                return self.postings[field].get(value, frozenset())
+            return None
+
+        if kind == 'terms':
+            field, values = next(iter(body.items()))
+            if self._ensure_postings(field):
+                ids = set()
+                for value in values:
+                    ids.update(self.postings[field].get(value, ()))
+                return ids
+            return None
+
+        if kind == 'bool':
+            required = body.get('must', []) or []
+            required = required if isinstance(required, list) else [required]
+            filters = body.get('filter', []) or []
+            filters = filters if isinstance(filters, list) else [filters]
+            sets = [ids for ids in (self.candidates(c) for c in required + filters)
+                    if ids is not None]
+            if not sets:
+                return self._should_candidates(body) if not required + filters else None
+            # Intersect starting from the most selective clause
+            sets.sort(key=len)
+            result = sets[0]
+            for ids in sets[1:]:
+                if not result:
+                    break
+                result = {i for i in result if i in ids}
+            return result
+
+        return None
+
+    def _should_candidates(self, body):
+        """Union of the should clauses of a bool that has nothing else to narrow on"""
+        should = body.get('should') or []
+        should = should if isinstance(should, list) else [should]
+        if not should or int(body.get('minimum_should_match', 1)) < 1:
+            return None
+        result = set()
+        for clause in should:
+            ids = self.candidates(clause)
+            if ids is None:
+                return None
+            result |= ids
+        return result
+
+
+class MemoryStore(DocumentStore):
+    """Thread-safe, OpenSearch-shaped document store kept in process memory"""
+
+    def __init__(self, keyword_fields=None, stripes=16):
+        self._keyword_fields = keyword_fields or {}
+        self._indices = {}
+        self._locks = [threading.RLock() for _ in range(stripes)]
+        self._registry_lock = threading.Lock()
+
+    def _lock(self, index):
+        return self._locks[hash(index) % len(self._locks)]
+
+    def _index(self, index, create=False):
+        idx = self._indices.get(index)
+        if idx is None and create:
+            with self._registry_lock:
+                idx = self._indices.get(index)
+                if idx is None:
+                    idx = self._indices[index] = MemoryIndex(index, self._keyword_fields.get(index))
+        return idx
+
+    def _existing(self, index):
+        idx = self._indices.get(index)
+        if idx is None:
+            raise Exception('Index not found')
+        return idx
+
+    def count(self, index):
+        idx = self._indices.get(index)
+        return len(idx.docs) if idx else 0
+
+    def clear(self):
+        with self._registry_lock:
+            self._indices = {}
+
+    def index(self, index, doc_id, body, op_type=None):
+        idx = self._index(index, create=True)
+        source = {**body, '_timestamp': datetime.utcnow().isoformat()}
+        with self._lock(index):
+            exists = doc_id in idx.docs
+            if op_type == 'create' and exists:
+                return None
+            version = idx.put(doc_id, source)
+        return {
+            '_index': index,
+            '_id': doc_id,
+            '_version': version,
+            'result': 'updated' if exists else 'created'
+        }
+
+    def bulk_index(self, index, documents):
+        idx = self._index(index, create=True)
+        timestamp = datetime.utcnow().isoformat()
+        count = 0
+        with self._lock(index):
+            for doc_id, body in documents:
+                idx.put(doc_id, {**body, '_timestamp': timestamp})
+                count += 1
+        return count
+
+    def get(self, index, doc_id, source=None):
+        idx = self._existing(index)
+        doc = idx.docs.get(doc_id)
+        if doc is None:
+            raise Exception('Document not found')
+        return {'_index': index, '_id': doc_id, '_version': doc['_version'],
+                'found': True, '_source': filter_source(doc['_source'], source)}
+
+    def update(self, index, doc_id, body):
+        idx = self._existing(index)
+        with self._lock(index):
+            doc = idx.docs.get(doc_id)
+            if doc is None:
+                raise Exception('Document not found')
+            source = {**merge_partial(doc['_source'], body), '_timestamp': datetime.utcnow().isoformat()}
+            version = idx.put(doc_id, source)
+        return {'_index': index, '_id': doc_id, '_version': version, 'result': 'updated'}
+
+    def delete(self, index, doc_id):
+        idx = self._existing(index)
+        with self._lock(index):
+            if doc_id not in idx.docs:
+                raise Exception('Document not found')
+            old = idx.remove(doc_id)
+        return {'_index': index, '_id': doc_id, '_version': old['_version'] + 1, 'result': 'deleted'}
+
+    @staticmethod
+    def _matching(idx, query):
+        """Documents of an index matching a query, in index order (caller holds the lock)"""
+        ids = idx.candidates(query)
+        if ids is None:
+            docs = list(idx.docs.values())
+        else:
+            # Candidates come from unordered sets: restore index order
+            docs = sorted((idx.docs[i] for i in ids if i in idx.docs), key=lambda d: d['_seq'])
+        return [d for d in docs if matches(query, d['_id'], d['_source'], idx.keyword_fields)]
+
+    def update_by_query(self, index, query, body):
+        idx = self._index(index, create=True)
+        timestamp = datetime.utcnow().isoformat()
+        with self._lock(index):
+            docs = self._matching(idx, query)
+            for doc in docs:
+                idx.put(doc['_id'], {**merge_partial(doc['_source'], body), '_timestamp': timestamp})
+        return [doc['_id'] for doc in docs]
+
+    def delete_by_query(self, index, query):
+        idx = self._index(index, create=True)
+        with self._lock(index):
+            docs = self._matching(idx, query)
+            for doc in docs:
+                idx.remove(doc['_id'])
+        return [doc['_id'] for doc in docs]
+
+    def search(self, index, query=None, size=10, sort=None, from_=0, search_after=None,
+               source=None):
+        idx = self._index(index, create=True)
+        with self._lock(index):
+            ids = idx.candidates(query)
+            if ids is None:
+                docs = list(idx.docs.values())
+            else:
+                docs = [idx.docs[i] for i in ids if i in idx.docs]
+
+        # Candidates came from unordered sets: restore index order
+        if ids is not None:
+            docs.sort(key=lambda d: d['_seq'])
+
+        # Queries are evaluated outside the lock on the _source snapshots
+        hits = [{'_index': index, '_id': d['_id'], '_score': 1.0, '_source': d['_source']}
+                for d in docs if matches(query, d['_id'], d['_source'], idx.keyword_fields)]
+        total = len(hits)
+        if sort:
+            sort_hits(hits, sort)
+            if search_after:
+                hits = search_after_hits(hits, sort, search_after)
+
+        hits = hits[from_:from_ + size]
+        if source is not None:
+            hits = [{**hit, '_source': filter_source(hit['_source'], source)} for hit in hits]
+
+        return {
+            'hits': {
+                'total': {
+                    'value': total,
+                    'relation': 'eq'
+                },
+                'hits': hits
+            }
+        }
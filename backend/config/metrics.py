@@ -0,0 +1,67 @@
+"""Process-wide metrics registry, exported by GET /api/metrics"""
+import threading
+import os
+
+
+class MetricsRegistry:
+    """Counters, gauges and timers of this worker process.
+
+    Gauges may be callables, evaluated when the metrics are read.
+    Collectors are callables returning a dict of values (e.g. an
+    existing `stats` dict) and are exported under their name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timers = {}
+        self._collectors = {}
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Record one duration (seconds) or size sample"""
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = {'count': 0, 'sum': 0.0, 'max': 0.0}
+            timer['count'] += 1
+            timer['sum'] += value
+            timer['max'] = max(timer['max'], value)
+
+    def register_collector(self, name, collector):
+        self._collectors[name] = collector
+
+    def counter(self, name):
+        return self._counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {name: dict(timer) for name, timer in self._timers.items()}
+        gauges = {}
+        for name, value in list(self._gauges.items()):
+            gauges[name] = value() if callable(value) else value
+        collected = {}
+        for name, collector in list(self._collectors.items()):
+            try:
+                collected[name] = collector()
+            except Exception as e:
+                collected[name] = {'error': str(e)}
+        return {
+            'pid': os.getpid(),
+            'counters': counters,
+            'gauges': gauges,
+            'timers': timers,
+            **collected
+        }
+
+
+# Shared registry for the whole worker process
+metrics = MetricsRegistry()
@@ -1,8 +1,20 @@
-from opensearchpy import OpenSearch
+from opensearchpy import OpenSearch, helpers
+from opensearchpy.exceptions import ConflictError, ConnectionError, NotFoundError, TransportError
 import os
 from datetime import datetime
+import threading
 import uuid
 import logging
+import time
+import sys
+
+from config.circuit_breaker import CircuitBreaker, CLOSED
+from config.document_store import (STORAGE_BACKEND, create_document_store,
+                                   keyword_fields_from_mappings)
+from config.metrics import metrics
+from config.query_dsl import aggregate, filter_source
+from config.write_journal import (write_journal, written_at, JOURNAL_ENABLED, REPLAY_CHUNK_SIZE,
+                                  WRITTEN_AT)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -11,13 +23,82 @@ logger = logging.getLogger(__name__)
 # OpenSearch client (will be None if not available)
 opensearch_client = None
 
-# In-memory mockup data storage
-mock_data = {'users': [], 'travels': [], 'preferences': [], 'sessions': []}
+# Calls are skipped (and served by the local store) while the circuit is open.
+# A background probe reconnects once the cluster answers again.
+opensearch_breaker = CircuitBreaker(
+    'opensearch',
+    failure_threshold=int(os.getenv('OPENSEARCH_BREAKER_FAILURES', 5)),
+    reset_timeout=float(os.getenv('OPENSEARCH_BREAKER_RESET_SECONDS', 30)))
+OPENSEARCH_TIMEOUT = float(os.getenv('OPENSEARCH_TIMEOUT', 10))
+PROBE_INTERVAL = float(os.getenv('OPENSEARCH_PROBE_INTERVAL', 5))
+PROBE_TIMEOUT = float(os.getenv('OPENSEARCH_PROBE_TIMEOUT', 2))
+_probe_pid = None
+_indices_ready = False
+
+# Local document store used without a cluster: in-memory mockup by default,
+# SQLite with STORAGE_BACKEND=sqlite (created below, once the mappings are known)
+local_store = None
+
+# Refresh policy applied to writes: 'false', 'wait_for' or 'true'.
+# Documents are always visible to get_document (realtime get); the policy
+# only decides how soon a write shows up in search results. Indices read
+# back by search right after a write use 'wait_for', which waits for the
+# next scheduled refresh instead of forcing a new segment.
+REFRESH_POLICIES = {
+    'users': 'false',
+    'user_emails': 'false',
+    'preferences': 'wait_for',
+    'travel_packages': 'wait_for',
+    'travels': 'false',
+    'sessions': 'false',
+    'blacklisted_tokens': 'false',
+    'job_results': 'false',
+    'response_versions': 'false'
+}
+DEFAULT_REFRESH_POLICY = os.getenv('OPENSEARCH_DEFAULT_REFRESH', 'false')
+
+# Overrides, e.g. OPENSEARCH_REFRESH_POLICY="sessions=wait_for,travels=true"
+for _entry in filter(None, os.getenv('OPENSEARCH_REFRESH_POLICY', '').split(',')):
+    _index, _, _policy = _entry.partition('=')
+    REFRESH_POLICIES[_index.strip()] = _policy.strip()
+
+
+# Painless merge of params.doc into each document of an update by query,
+# recursive like a partial update (and config.query_dsl.merge_partial)
+UPDATE_BY_QUERY_MERGE = (
+    'void merge(Map target, Map doc) { for (entry in doc.entrySet()) { '
+    'def current = target.get(entry.getKey()); '
+    'if (entry.getValue() instanceof Map && current instanceof Map) '
+    '{ merge(current, entry.getValue()); } '
+    'else { target.put(entry.getKey(), entry.getValue()); } } } '
+    'merge(ctx._source, params.doc);'
+)
+
+def refresh_policy(index, refresh=None):
+    """Resolve the refresh parameter for a write (per-call value wins)"""
+    if refresh is None:
+        refresh = REFRESH_POLICIES.get(index, DEFAULT_REFRESH_POLICY)
+    if refresh is True:
+        return 'true'
+    if refresh is False:
+        return 'false'
+    if refresh not in ('true', 'false', 'wait_for'):
+        raise ValueError(f"Invalid refresh policy: {refresh}")
+    return refresh
+
+
+class DocumentConflictError(Exception):
+    """Raised when op_type='create' targets a document that already exists"""
 
 
 def init_opensearch():
     """Initialize OpenSearch client or use mockup"""
-    global opensearch_client
+    global opensearch_client, _indices_ready
+
+    if STORAGE_BACKEND != 'opensearch':
+        logger.info(f"🔧 STORAGE_BACKEND={STORAGE_BACKEND}: using {type(local_store).__name__}")
+        opensearch_client = None
+        return
 
     try:
         # OpenSearch configuration
@@ -34,209 +115,600 @@ def init_opensearch():
                                        http_auth=(username, password),
                                        use_ssl=use_ssl,
                                        verify_certs=False,
-                                       ssl_show_warn=False)
+                                       ssl_show_warn=False,
+                                       timeout=OPENSEARCH_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"⚠️ OpenSearch client could not be created: {e}")
+        logger.info("🔧 Using in-memory mockup data storage")
+        opensearch_client = None
+        return
 
+    try:
         # Test connection
-        info = opensearch_client.info()
+        info = opensearch_client.info(request_timeout=PROBE_TIMEOUT)
         logger.info(f"✅ Connected to OpenSearch: {info['version']['number']}")
 
         # Create indices if they don't exist
         create_indices()
+        _indices_ready = True
 
     except Exception as e:
+        # Keep the client: the health probe reconnects when the cluster is back
         logger.warning(f"⚠️ OpenSearch not available: {e}")
-        logger.info("🔧 Using in-memory mockup data storage")
-        opensearch_client = None
+        logger.info("🔧 Using in-memory mockup data storage until OpenSearch is reachable")
+        opensearch_breaker.trip()
 
+    start_health_probe()
 
-def create_indices():
-    """Create OpenSearch indices if they don't exist"""
-    if not opensearch_client:
+
+def start_health_probe():
+    """Start the background reconnect probe of this process (idempotent, fork-safe)"""
+    global _probe_pid
+    if _probe_pid == os.getpid():
         return
+    _probe_pid = os.getpid()
+    threading.Thread(target=_health_probe_loop, name='opensearch-probe', daemon=True).start()
 
-    indices = {
-        'users': {
-            'mappings': {
-                'properties': {
-                    'id': {
-                        'type': 'keyword'
-                    },
-                    'email': {
-                        'type': 'keyword'
-                    },
-                    'password': {
-                        'type': 'keyword'
-                    },
-                    'name': {
-                        'type': 'text'
-                    },
-                    'username': {
-                        'type': 'keyword'
-                    }
+
+def _health_probe_loop():
+    global _indices_ready
+    while True:
+        time.sleep(PROBE_INTERVAL)
+        if opensearch_client is None:
+            continue
+        if opensearch_breaker.state == CLOSED:
+            # Writes that failed while the circuit stayed closed
+            if write_journal.has_pending():
+                try:
+                    replay_journal()
+                except Exception as e:
+                    _record_error('journal replay', e)
+            continue
+        metrics.inc('opensearch.probes')
+        try:
+            opensearch_client.info(request_timeout=PROBE_TIMEOUT)
+            if not _indices_ready:
+                create_indices()
+                _indices_ready = True
+            # Catch up before traffic returns to the cluster
+            replay_journal()
+        except Exception as e:
+            metrics.inc('opensearch.probe_failures')
+            logger.debug(f"OpenSearch probe failed: {e}")
+            continue
+        logger.info("✅ OpenSearch reachable again")
+        opensearch_breaker.record_success()
+
+
+def replay_journal():
+    """Send the writes journaled during an outage to the cluster in bulk"""
+    return write_journal.replay(
+        lambda actions: OpenSearchOperations._bulk(actions, 'false', REPLAY_CHUNK_SIZE),
+        _existing_docs)
+
+
+def _existing_docs(index, doc_ids, source=None):
+    """{id: doc} of the documents that exist in the cluster"""
+    response = opensearch_client.mget(index=index, body={'ids': doc_ids},
+                                      **_source_params(source))
+    return {doc['_id']: doc for doc in response['docs'] if doc.get('found')}
+
+
+def _stamped(body):
+    """A body sent to the cluster, with the time of the write that journal
+    replay compares against (see write_journal)"""
+    return {**body, WRITTEN_AT: written_at()}
+
+
+def _cluster_available():
+    """True if a call should be sent to OpenSearch (microseconds while open)"""
+    if opensearch_client is None:
+        return False
+    if opensearch_breaker.allow_request():
+        return True
+    if _probe_pid != os.getpid():
+        start_health_probe()
+    return False
+
+
+def _is_outage(error):
+    """Connection failures and 5xx answers count against the circuit, 4xx do not"""
+    if isinstance(error, ConnectionError):
+        return True
+    status = getattr(error, 'status_code', None)
+    return isinstance(error, TransportError) and isinstance(status, int) and status >= 500
+
+
+def _record_error(action, error):
+    """Log a failed call; returns True if the cluster is unreachable"""
+    outage = _is_outage(error)
+    if outage:
+        opensearch_breaker.record_failure()
+    else:
+        opensearch_breaker.record_success()
+    logger.error(f"OpenSearch {action} error: {error}")
+    return outage
+
+
+def _journal(entries):
+    """Record writes served by the local store so they reach the cluster later"""
+    if opensearch_client is not None and JOURNAL_ENABLED:
+        write_journal.append_many(entries)
+
+
+# Index mappings, also used to pick the keyword fields of the fallback stores
+INDEX_MAPPINGS = {
+    'users': {
+        'mappings': {
+            'properties': {
+                'id': {
+                    'type': 'keyword'
+                },
+                'email': {
+                    'type': 'keyword'
+                },
+                'email_normalized': {
+                    'type': 'keyword'
+                },
+                'password': {
+                    'type': 'keyword'
+                },
+                'name': {
+                    'type': 'text'
+                },
+                'username': {
+                    'type': 'keyword'
                 }
             }
-        },
-        'travels': {
-            'mappings': {
-                'properties': {
-                    'user_id': {
-                        'type': 'keyword'
-                    },
-                    'passions': {
-                        'type': 'keyword'
-                    },
-                    'destinations': {
-                        'type': 'text'
-                    },
-                    'travel_pace': {
-                        'type': 'keyword'
-                    },
-                    'accommodation_level': {
-                        'type': 'keyword'
-                    },
-                    'accommodation_type': {
-                        'type': 'keyword'
-                    },
-                    'travelers': {
-                        'type': 'object'
-                    },
-                    'budget': {
-                        'type': 'keyword'
-                    },
-                    'email': {
-                        'type': 'keyword'
-                    },
-                    'created_at': {
-                        'type': 'date'
-                    },
-                    'status': {
-                        'type': 'keyword'
-                    }
+        }
+    },
+    'travels': {
+        'mappings': {
+            'properties': {
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'passions': {
+                    'type': 'keyword'
+                },
+                'destinations': {
+                    'type': 'text'
+                },
+                'travel_pace': {
+                    'type': 'keyword'
+                },
+                'accommodation_level': {
+                    'type': 'keyword'
+                },
+                'accommodation_type': {
+                    'type': 'keyword'
+                },
+                'travelers': {
+                    'type': 'object'
+                },
+                'budget': {
+                    'type': 'keyword'
+                },
+                'email': {
+                    'type': 'keyword'
+                },
+                'created_at': {
+                    'type': 'date'
+                },
+                'status': {
+                    'type': 'keyword'
+                },
+                'external_job_id': {
+                    'type': 'keyword'
+                },
+                'external_job_status': {
+                    'type': 'keyword'
+                },
+                'external_job_status_data': {
+                    'type': 'object',
+                    'enabled': False
+                },
+                'external_job_checked_at': {
+                    'type': 'date'
                 }
             }
-        },
-        'preferences': {
-            'mappings': {
-                'properties': {
-                    'user_id': {
-                        'type': 'keyword'
-                    },
-                    'preferences': {
-                        'type': 'object'
-                    },
-                    'created_at': {
-                        'type': 'date'
-                    },
-                    'updated_at': {
-                        'type': 'date'
-                    }
+        }
+    },
+    'preferences': {
+        'mappings': {
+            'properties': {
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'preferences': {
+                    'type': 'object'
+                },
+                'created_at': {
+                    'type': 'date'
+                },
+                'updated_at': {
+                    'type': 'date'
                 }
             }
-        },
-        'sessions': {
-            'mappings': {
-                'properties': {
-                    'session_id': {
-                        'type': 'keyword'
-                    },
-                    'user_id': {
-                        'type': 'keyword'
-                    },
-                    'access_token_jti': {
-                        'type': 'keyword'
-                    },
-                    'refresh_token_jti': {
-                        'type': 'keyword'
-                    },
-                    'created_at': {
-                        'type': 'date'
-                    },
-                    'expires_at': {
-                        'type': 'date'
-                    },
-                    'last_activity': {
-                        'type': 'date'
-                    },
-                    'ip_address': {
-                        'type': 'ip'
-                    },
-                    'user_agent': {
-                        'type': 'text'
-                    },
-                    'is_active': {
-                        'type': 'boolean'
-                    }
+        }
+    },
+    # Email aliases of users whose id predates ids derived from the email
+    'user_emails': {
+        'mappings': {
+            'properties': {
+                'email_normalized': {
+                    'type': 'keyword'
+                },
+                'user_id': {
+                    'type': 'keyword'
                 }
             }
-        },
-        'travel_packages': {
-            'mappings': {
-                'properties': {
-                    'job_id': {
-                        'type': 'keyword'
-                    },
-                    'user_id': {
-                        'type': 'keyword'
-                    },
-                    'package_id': {
-                        'type': 'keyword'
-                    },
-                    'hotels_selezionati': {
-                        'type': 'object',
-                        'enabled': False
-                    },
-                    'esperienze_selezionate': {
-                        'type': 'object',
-                        'enabled': False
-                    },
-                    'status': {
-                        'type': 'keyword'
-                    },
-                    'created_at': {
-                        'type': 'date'
-                    },
-                    'updated_at': {
-                        'type': 'date'
+        }
+    },
+    'sessions': {
+        'mappings': {
+            'properties': {
+                'session_id': {
+                    'type': 'keyword'
+                },
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'access_token_jti': {
+                    'type': 'keyword'
+                },
+                'refresh_token_jti': {
+                    'type': 'keyword'
+                },
+                'created_at': {
+                    'type': 'date'
+                },
+                'expires_at': {
+                    'type': 'date'
+                },
+                'last_activity': {
+                    'type': 'date'
+                },
+                'ip_address': {
+                    'type': 'ip'
+                },
+                'user_agent': {
+                    'type': 'text'
+                },
+                'is_active': {
+                    'type': 'boolean'
+                }
+            }
+        }
+    },
+    'travel_packages': {
+        'mappings': {
+            'properties': {
+                'job_id': {
+                    'type': 'keyword'
+                },
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'package_id': {
+                    'type': 'keyword'
+                },
+                'position': {
+                    'type': 'integer'
+                },
+                'hotels_selezionati': {
+                    'type': 'object',
+                    'enabled': False
+                },
+                'esperienze_selezionate': {
+                    'type': 'object',
+                    'enabled': False
+                },
+                'status': {
+                    'type': 'keyword'
+                },
+                # Computed from hotels_selezionati at ingest
+                'total_price': {
+                    'type': 'scaled_float',
+                    'scaling_factor': 100
+                },
+                'nights': {
+                    'type': 'integer'
+                },
+                'destinations': {
+                    'type': 'keyword'
+                },
+                'city_costs': {
+                    'properties': {
+                        'city': {
+                            'type': 'keyword'
+                        },
+                        'nights': {
+                            'type': 'integer'
+                        },
+                        'daily_price': {
+                            'type': 'scaled_float',
+                            'scaling_factor': 100
+                        },
+                        'cost': {
+                            'type': 'scaled_float',
+                            'scaling_factor': 100
+                        }
                     }
                 },
-                'dynamic': True
+                # Computed from esperienze_selezionate at ingest
+                'experience_count': {
+                    'type': 'integer'
+                },
+                'experience_cities': {
+                    'type': 'keyword'
+                },
+                'experience_categories': {
+                    'type': 'keyword'
+                },
+                # Summary of the travel request, copied at ingest
+                'request': {
+                    'properties': {
+                        'travel_id': {
+                            'type': 'keyword'
+                        },
+                        'passions': {
+                            'type': 'keyword'
+                        },
+                        'travelers': {
+                            'type': 'object',
+                            'enabled': False
+                        },
+                        'dates': {
+                            'type': 'object',
+                            'enabled': False
+                        }
+                    }
+                },
+                'created_at': {
+                    'type': 'date'
+                },
+                'updated_at': {
+                    'type': 'date'
+                }
+            },
+            'dynamic': True
+        }
+    },
+    'blacklisted_tokens': {
+        'mappings': {
+            'properties': {
+                'jti': {
+                    'type': 'keyword'
+                },
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'token_type': {
+                    'type': 'keyword'
+                },
+                'blacklisted_at': {
+                    'type': 'date'
+                },
+                'expires_at': {
+                    'type': 'date'
+                }
+            }
+        }
+    },
+    'job_results': {
+        'mappings': {
+            'properties': {
+                'job_id': {
+                    'type': 'keyword'
+                },
+                'status': {
+                    'type': 'keyword'
+                },
+                'package_ids': {
+                    'type': 'keyword'
+                },
+                'user_id': {
+                    'type': 'keyword'
+                },
+                'package_count': {
+                    'type': 'integer'
+                },
+                'raw_result': {
+                    'type': 'object',
+                    'enabled': False
+                },
+                'claimed_at': {
+                    'type': 'date'
+                },
+                'stored_at': {
+                    'type': 'date'
+                }
+            }
+        }
+    },
+    # One document per user, changed by every write to its cached responses
+    'response_versions': {
+        'mappings': {
+            'properties': {
+                'version': {
+                    'type': 'keyword'
+                },
+                'changed_at': {
+                    'type': 'date'
+                }
             }
         }
     }
+}
 
-    for index_name, mapping in indices.items():
+
+local_store = create_document_store(keyword_fields_from_mappings(INDEX_MAPPINGS))
+
+
+def create_indices():
+    """Create OpenSearch indices if they don't exist, and add fields
+    introduced since to the mappings of existing ones"""
+    if not opensearch_client:
+        return
+
+    for index_name, mapping in INDEX_MAPPINGS.items():
         try:
             if not opensearch_client.indices.exists(index=index_name):
                 opensearch_client.indices.create(index=index_name,
                                                  body=mapping)
                 logger.info(f"📝 Created index: {index_name}")
+            else:
+                # New fields only: put_mapping never changes existing ones
+                opensearch_client.indices.put_mapping(index=index_name,
+                                                      body=mapping['mappings'])
         except Exception as e:
             logger.error(f"❌ Error creating index {index_name}: {e}")
 
 
+def _source_params(source):
+    """Query string form of a _source filter, for get and mget"""
+    if source is None:
+        return {}
+    if isinstance(source, bool):
+        return {'_source': 'true' if source else 'false'}
+    if not isinstance(source, dict):
+        source = {'includes': source}
+    params = {}
+    for key, param in (('includes', '_source_includes'), ('excludes', '_source_excludes')):
+        patterns = source.get(key)
+        if patterns:
+            params[param] = patterns if isinstance(patterns, str) else ','.join(patterns)
+    return params
+
+
 class OpenSearchOperations:
-    """Wrapper class for OpenSearch operations with mockup fallback"""
+    """Wrapper class for OpenSearch operations with mockup fallback.
+
+    Reads take an optional `source` filter: None or True for the whole
+    document, False for none of it, field patterns to include, or
+    {'includes': [...], 'excludes': [...]}. Only the selected fields
+    are fetched and deserialized.
+    """
 
     @staticmethod
-    def index_document(index, doc_id, body):
-        """Index a document"""
-        if opensearch_client:
+    def index_document(index, doc_id, body, op_type=None, refresh=None):
+        """Index a document (op_type='create' fails if it already exists)"""
+        if _cluster_available():
             try:
+                params = {'op_type': op_type} if op_type else {}
                 response = opensearch_client.index(index=index,
                                                    id=doc_id,
-                                                   body=body,
-                                                   refresh=True)
+                                                   body=_stamped(body),
+                                                   refresh=refresh_policy(index, refresh),
+                                                   **params)
+                opensearch_breaker.record_success()
                 return response
+            except ConflictError:
+                opensearch_breaker.record_success()
+                raise DocumentConflictError(f"Document {doc_id} already exists in {index}")
+            except Exception as e:
+                if _record_error('index', e):
+                    return OpenSearchOperations._offline_index(index, doc_id, body, op_type)
+                return OpenSearchOperations._mock_index(index, doc_id, body, op_type)
+        else:
+            return OpenSearchOperations._offline_index(index, doc_id, body, op_type)
+
+    @staticmethod
+    def bulk_index(index, documents, refresh=None, chunk_size=500, op_type='index'):
+        """Index many documents with bulk requests.
+
+        `documents` is an iterable of (doc_id, body) pairs. The refresh
+        policy applies to the batch as a whole, never to each document.
+        With op_type='create' existing documents are kept and reported as
+        409 errors. Returns {'indexed': count, 'errors': [per-item errors]}.
+        """
+        documents = list(documents)
+        if _cluster_available():
+            try:
+                actions = ({
+                    '_op_type': op_type,
+                    '_index': index,
+                    '_id': doc_id,
+                    '_source': _stamped(body)
+                } for doc_id, body in documents)
+                result = OpenSearchOperations._bulk(actions, refresh_policy(index, refresh),
+                                                    chunk_size, index)
+                opensearch_breaker.record_success()
+                return result
             except Exception as e:
-                logger.error(f"OpenSearch index error: {e}")
-                return OpenSearchOperations._mock_index(index, doc_id, body)
+                if _record_error('bulk', e):
+                    return OpenSearchOperations._offline_bulk_index(index, documents, op_type)
+                return OpenSearchOperations._mock_bulk_index(index, documents, op_type)
         else:
-            return OpenSearchOperations._mock_index(index, doc_id, body)
+            return OpenSearchOperations._offline_bulk_index(index, documents, op_type)
 
     @staticmethod
-    def search_documents(index, query=None, size=10):
-        """Search documents"""
-        if opensearch_client:
+    def bulk_update(index, updates, refresh=None, chunk_size=500):
+        """Apply partial updates to many documents with bulk requests.
+
+        `updates` is an iterable of (doc_id, partial_body) pairs. Returns
+        {'indexed': count, 'errors': [per-item errors]}; documents that no
+        longer exist come back as 404 errors.
+        """
+        updates = list(updates)
+        if _cluster_available():
+            try:
+                actions = ({
+                    '_op_type': 'update',
+                    '_index': index,
+                    '_id': doc_id,
+                    'doc': _stamped(body)
+                } for doc_id, body in updates)
+                result = OpenSearchOperations._bulk(actions, refresh_policy(index, refresh),
+                                                    chunk_size, index)
+                opensearch_breaker.record_success()
+                return result
+            except Exception as e:
+                if _record_error('bulk update', e):
+                    return OpenSearchOperations._offline_bulk_update(index, updates)
+                return OpenSearchOperations._mock_bulk_update(index, updates)
+        else:
+            return OpenSearchOperations._offline_bulk_update(index, updates)
+
+    @staticmethod
+    def _bulk(actions, refresh, chunk_size, index=None):
+        """Run bulk actions (any mix of index/create/update/delete) through
+        streaming_bulk, collecting per-item errors"""
+        succeeded = 0
+        errors = []
+        params = {'refresh': 'wait_for'} if refresh == 'wait_for' else {}
+        for ok, item in helpers.streaming_bulk(opensearch_client,
+                                               actions,
+                                               chunk_size=chunk_size,
+                                               raise_on_error=False,
+                                               **params):
+            if ok:
+                succeeded += 1
+            else:
+                op_type, details = next(iter(item.items()))
+                errors.append({
+                    '_index': details.get('_index'),
+                    '_id': details.get('_id'),
+                    'op_type': op_type,
+                    'status': details.get('status'),
+                    'error': details.get('error')
+                })
+
+        if refresh == 'true' and succeeded and index:
+            opensearch_client.indices.refresh(index=index)
+
+        return {'indexed': succeeded, 'errors': errors}
+
+    @staticmethod
+    def search_documents(index, query=None, size=10, sort=None, search_after=None, aggs=None,
+                         source=None):
+        """Search documents (search_after: sort values of the previous page's last hit).
+
+        With aggs the response also carries the aggregations over every
+        matching document, computed in the same request.
+        """
+        if _cluster_available():
             try:
                 body = {
                     'size': size,
@@ -244,150 +716,440 @@ class OpenSearchOperations:
                         'match_all': {}
                     }
                 }
+                if sort:
+                    body['sort'] = sort
+                if search_after:
+                    body['search_after'] = search_after
+                if aggs:
+                    body['aggs'] = aggs
+                if source is not None:
+                    body['_source'] = source
                 response = opensearch_client.search(index=index, body=body)
+                opensearch_breaker.record_success()
                 return response
             except Exception as e:
-                logger.error(f"OpenSearch search error: {e}")
-                return OpenSearchOperations._mock_search(index, query, size)
+                _record_error('search', e)
+                return OpenSearchOperations._mock_search(index, query, size, sort, search_after,
+                                                         aggs, source)
         else:
-            return OpenSearchOperations._mock_search(index, query, size)
+            return OpenSearchOperations._mock_search(index, query, size, sort, search_after,
+                                                     aggs, source)
 
     @staticmethod
-    def get_document(index, doc_id):
-        """Get a document by ID"""
-        if opensearch_client:
+    def aggregate(index, query, aggs):
+        """Run aggregations over the documents matching a query.
+
+        No hits are returned (size=0): the cost depends on the number of
+        buckets, not of documents. Returns {'total': matching count,
+        'aggregations': {...}} in the OpenSearch response format.
+        """
+        if _cluster_available():
             try:
-                response = opensearch_client.get(index=index, id=doc_id)
+                response = opensearch_client.search(index=index, body={
+                    'size': 0,
+                    'track_total_hits': True,
+                    'query': query or {'match_all': {}},
+                    'aggs': aggs
+                })
+                opensearch_breaker.record_success()
+                return {'total': response['hits']['total']['value'],
+                        'aggregations': response.get('aggregations', {})}
+            except Exception as e:
+                _record_error('aggregate', e)
+                return OpenSearchOperations._mock_aggregate(index, query, aggs)
+        else:
+            return OpenSearchOperations._mock_aggregate(index, query, aggs)
+
+    @staticmethod
+    def iter_documents(index, query=None, page_size=500, keep_alive='1m', sort=None, source=None):
+        """Yield every hit matching a query, one page at a time.
+
+        Pages through a point in time with search_after, so memory stays
+        at one page whatever the number of matches and the results are a
+        consistent snapshot. `sort` must end with a unique field; it
+        defaults to _id. Falls back to a scroll on clusters without point
+        in time support. Once documents have been yielded, a cluster
+        failure is raised instead of restarting from the local store.
+        """
+        query = query or {'match_all': {}}
+        if not _cluster_available():
+            yield from OpenSearchOperations._mock_iter_documents(index, query, sort, source)
+            return
+
+        try:
+            pit_id = opensearch_client.create_pit(index=index, keep_alive=keep_alive)['pit_id']
+        except Exception as e:
+            if _record_error('create pit', e):
+                yield from OpenSearchOperations._mock_iter_documents(index, query, sort, source)
+            else:
+                # Point in time needs OpenSearch 2.4+
+                scan_body = {'query': query, **({'sort': sort} if sort else {}),
+                             **({'_source': source} if source is not None else {})}
+                yield from helpers.scan(opensearch_client, index=index, query=scan_body,
+                                        size=page_size, scroll=keep_alive,
+                                        preserve_order=bool(sort))
+            return
+
+        body = {
+            'size': page_size,
+            'query': query,
+            'pit': {'id': pit_id, 'keep_alive': keep_alive},
+            'sort': sort or [{'_id': 'asc'}]
+        }
+        if source is not None:
+            body['_source'] = source
+        try:
+            while True:
+                response = opensearch_client.search(body=body)
+                opensearch_breaker.record_success()
+                hits = response['hits']['hits']
+                yield from hits
+                if len(hits) < page_size:
+                    return
+                # The point in time id may change between pages
+                body['pit']['id'] = response.get('pit_id', body['pit']['id'])
+                body['search_after'] = hits[-1]['sort']
+        except Exception as e:
+            _record_error('search', e)
+            raise
+        finally:
+            try:
+                opensearch_client.delete_pit(body={'pit_id': [body['pit']['id']]})
+            except Exception as e:
+                logger.warning(f"Failed to delete point in time: {e}")
+
+    @staticmethod
+    def msearch(searches):
+        """Run several searches in one round trip.
+
+        `searches` is a list of (index, body) pairs where body may hold
+        query, size, sort, from, aggs and _source. Returns one search response per
+        search, in order. A search that fails on the cluster is answered
+        from the local store, as search_documents does.
+        """
+        searches = list(searches)
+        if _cluster_available():
+            try:
+                lines = []
+                for index, body in searches:
+                    lines.append({'index': index})
+                    lines.append({'query': {'match_all': {}}, **body})
+                response = opensearch_client.msearch(body=lines)
+                opensearch_breaker.record_success()
+                results = []
+                for (index, body), result in zip(searches, response['responses']):
+                    if 'error' in result:
+                        logger.error(f"❌ OpenSearch msearch error on {index}: {result['error']}")
+                        result = OpenSearchOperations._mock_msearch([(index, body)])[0]
+                    results.append(result)
+                return results
+            except Exception as e:
+                _record_error('msearch', e)
+                return OpenSearchOperations._mock_msearch(searches)
+        else:
+            return OpenSearchOperations._mock_msearch(searches)
+
+    @staticmethod
+    def mget(index, doc_ids, source=None):
+        """Get several documents of an index in one round trip.
+
+        Returns one {'_id', 'found', '_source'} entry per id, in order.
+        """
+        doc_ids = list(doc_ids)
+        if _cluster_available():
+            try:
+                response = opensearch_client.mget(index=index, body={'ids': doc_ids},
+                                                  **_source_params(source))
+                opensearch_breaker.record_success()
+                return response['docs']
+            except Exception as e:
+                _record_error('mget', e)
+                return OpenSearchOperations._mock_mget(index, doc_ids, source)
+        else:
+            return OpenSearchOperations._mock_mget(index, doc_ids, source)
+
+    @staticmethod
+    def get_document(index, doc_id, source=None):
+        """Get a document by ID, or None if it does not exist (realtime: sees
+        writes before any refresh)"""
+        if _cluster_available():
+            try:
+                response = opensearch_client.get(index=index, id=doc_id, **_source_params(source))
+                opensearch_breaker.record_success()
                 return response
+            except NotFoundError:
+                # A missing document is an answer, not a failure
+                opensearch_breaker.record_success()
+                return None
             except Exception as e:
-                logger.error(f"OpenSearch get error: {e}")
-                return OpenSearchOperations._mock_get(index, doc_id)
+                _record_error('get', e)
+                return OpenSearchOperations._mock_get(index, doc_id, source)
         else:
-            return OpenSearchOperations._mock_get(index, doc_id)
+            return OpenSearchOperations._mock_get(index, doc_id, source)
 
     @staticmethod
-    def update_document(index, doc_id, body):
+    def update_document(index, doc_id, body, refresh=None):
         """Update a document"""
-        if opensearch_client:
+        if _cluster_available():
             try:
                 response = opensearch_client.update(index=index,
                                                     id=doc_id,
-                                                    body={'doc': body},
-                                                    refresh=True)
+                                                    body={'doc': _stamped(body)},
+                                                    refresh=refresh_policy(index, refresh))
+                opensearch_breaker.record_success()
                 return response
             except Exception as e:
-                logger.error(f"OpenSearch update error: {e}")
+                if _record_error('update', e):
+                    return OpenSearchOperations._offline_update(index, doc_id, body)
                 return OpenSearchOperations._mock_update(index, doc_id, body)
         else:
-            return OpenSearchOperations._mock_update(index, doc_id, body)
+            return OpenSearchOperations._offline_update(index, doc_id, body)
 
     @staticmethod
-    def delete_document(index, doc_id):
+    def delete_document(index, doc_id, refresh=None):
         """Delete a document"""
-        if opensearch_client:
+        if _cluster_available():
             try:
                 response = opensearch_client.delete(index=index,
                                                     id=doc_id,
-                                                    refresh=True)
+                                                    refresh=refresh_policy(index, refresh))
+                opensearch_breaker.record_success()
                 return response
             except Exception as e:
-                logger.error(f"OpenSearch delete error: {e}")
+                if _record_error('delete', e):
+                    return OpenSearchOperations._offline_delete(index, doc_id)
                 return OpenSearchOperations._mock_delete(index, doc_id)
         else:
-            return OpenSearchOperations._mock_delete(index, doc_id)
+            return OpenSearchOperations._offline_delete(index, doc_id)
+
+    @staticmethod
+    def update_by_query(index, query, body, refresh=None, max_retries=3):
+        """Merge `body` into every document matching `query`, server side.
+
+        One request regardless of how many documents match. Documents
+        changed concurrently (version conflicts) are retried up to
+        max_retries times; the query should exclude already-updated
+        documents for that to be cheap. Returns {'updated': count}.
+        """
+        if _cluster_available():
+            try:
+                updated = 0
+                for _ in range(max_retries + 1):
+                    response = opensearch_client.update_by_query(
+                        index=index,
+                        body={
+                            'query': query,
+                            'script': {
+                                'source': UPDATE_BY_QUERY_MERGE,
+                                'lang': 'painless',
+                                'params': {'doc': _stamped(body)}
+                            }
+                        },
+                        conflicts='proceed',
+                        refresh=refresh_policy(index, refresh) != 'false')
+                    updated += response.get('updated', 0)
+                    if not response.get('version_conflicts'):
+                        break
+                opensearch_breaker.record_success()
+                return {'updated': updated}
+            except Exception as e:
+                if _record_error('update by query', e):
+                    return OpenSearchOperations._offline_update_by_query(index, query, body)
+                return OpenSearchOperations._mock_update_by_query(index, query, body)
+        else:
+            return OpenSearchOperations._offline_update_by_query(index, query, body)
+
+    @staticmethod
+    def delete_by_query(index, query, refresh=None):
+        """Delete every document matching `query` in one request.
+        Returns {'deleted': count}."""
+        if _cluster_available():
+            try:
+                response = opensearch_client.delete_by_query(
+                    index=index,
+                    body={'query': query},
+                    conflicts='proceed',
+                    refresh=refresh_policy(index, refresh) != 'false')
+                opensearch_breaker.record_success()
+                return {'deleted': response.get('deleted', 0)}
+            except Exception as e:
+                if _record_error('delete by query', e):
+                    return OpenSearchOperations._offline_delete_by_query(index, query)
+                return OpenSearchOperations._mock_delete_by_query(index, query)
+        else:
+            return OpenSearchOperations._offline_delete_by_query(index, query)
+
+    # Writes served locally while the cluster is unreachable are journaled
+    @staticmethod
+    def _offline_index(index, doc_id, body, op_type=None):
+        response = OpenSearchOperations._mock_index(index, doc_id, body, op_type)
+        _journal([('create' if op_type == 'create' else 'index', index, doc_id, body)])
+        return response
+
+    @staticmethod
+    def _offline_bulk_index(index, documents, op_type='index'):
+        response = OpenSearchOperations._mock_bulk_index(index, documents, op_type)
+        refused = {error['_id'] for error in response['errors']}
+        _journal([(op_type, index, doc_id, body) for doc_id, body in documents
+                  if doc_id not in refused])
+        return response
+
+    @staticmethod
+    def _offline_bulk_update(index, updates):
+        response = OpenSearchOperations._mock_bulk_update(index, updates)
+        missing = {error['_id'] for error in response['errors']}
+        _journal([('update', index, doc_id, body) for doc_id, body in updates
+                  if doc_id not in missing])
+        return response
+
+    @staticmethod
+    def _offline_update(index, doc_id, body):
+        response = OpenSearchOperations._mock_update(index, doc_id, body)
+        _journal([('update', index, doc_id, body)])
+        return response
+
+    @staticmethod
+    def _offline_delete(index, doc_id):
+        response = OpenSearchOperations._mock_delete(index, doc_id)
+        _journal([('delete', index, doc_id, None)])
+        return response
+
+    @staticmethod
+    def _offline_update_by_query(index, query, body):
+        # Journal the matched documents one by one: the query may match
+        # different documents once replayed against the cluster
+        doc_ids = local_store.update_by_query(index, query, body)
+        _journal([('update', index, doc_id, body) for doc_id in doc_ids])
+        return {'updated': len(doc_ids)}
+
+    @staticmethod
+    def _offline_delete_by_query(index, query):
+        doc_ids = local_store.delete_by_query(index, query)
+        _journal([('delete', index, doc_id, None) for doc_id in doc_ids])
+        return {'deleted': len(doc_ids)}
 
     # Mockup implementations
     @staticmethod
-    def _mock_index(index, doc_id, body):
+    def _mock_index(index, doc_id, body, op_type=None):
         """Mock index operation"""
-        if index not in mock_data:
-            mock_data[index] = []
-
-        doc = {
-            '_id': doc_id,
-            '_source': {
-                **body, '_timestamp': datetime.utcnow().isoformat()
-            }
-        }
+        response = local_store.index(index, doc_id, body, op_type)
+        if response is None:
+            raise DocumentConflictError(f"Document {doc_id} already exists in {index}")
+        return response
 
-        # Remove existing document with same ID
-        mock_data[index] = [d for d in mock_data[index] if d['_id'] != doc_id]
-        mock_data[index].append(doc)
+    @staticmethod
+    def _mock_bulk_index(index, documents, op_type='index'):
+        """Mock bulk index operation"""
+        if op_type != 'create':
+            return {'indexed': local_store.bulk_index(index, documents), 'errors': []}
+        indexed = 0
+        errors = []
+        for doc_id, body in documents:
+            if local_store.index(index, doc_id, body, op_type='create') is None:
+                errors.append({'_index': index, '_id': doc_id, 'op_type': 'create', 'status': 409,
+                               'error': 'version_conflict_engine_exception'})
+            else:
+                indexed += 1
+        return {'indexed': indexed, 'errors': errors}
 
-        return {
-            '_index': index,
-            '_id': doc_id,
-            '_version': 1,
-            'result': 'created'
-        }
+    @staticmethod
+    def _mock_bulk_update(index, updates):
+        """Mock bulk update operation"""
+        updated = 0
+        errors = []
+        for doc_id, body in updates:
+            try:
+                local_store.update(index, doc_id, body)
+                updated += 1
+            except Exception as e:
+                errors.append({'_id': doc_id, 'op_type': 'update', 'status': 404, 'error': str(e)})
+        return {'indexed': updated, 'errors': errors}
 
     @staticmethod
-    def _mock_search(index, query, size):
+    def _mock_search(index, query, size, sort=None, search_after=None, aggs=None, source=None):
         """Mock search operation"""
-        if index not in mock_data:
-            mock_data[index] = []
+        response = local_store.search(index, query, size, sort, search_after=search_after,
+                                      source=source)
+        if aggs:
+            hits = local_store.search(index, query, sys.maxsize)['hits']['hits']
+            response['aggregations'] = aggregate(aggs, (hit['_source'] for hit in hits))
+        return response
 
-        hits = mock_data[index][:size]
+    @staticmethod
+    def _mock_aggregate(index, query, aggs):
+        """Mock aggregation: evaluated over the matching local documents"""
+        hits = local_store.search(index, query, sys.maxsize)['hits']['hits']
+        return {'total': len(hits),
+                'aggregations': aggregate(aggs, (hit['_source'] for hit in hits))}
 
-        return {
-            'hits': {
-                'total': {
-                    'value': len(mock_data[index])
-                },
-                'hits': hits
-            }
-        }
+    @staticmethod
+    def _mock_iter_documents(index, query, sort=None, source=None):
+        """Mock iteration: the local store holds every document in memory anyway"""
+        yield from local_store.search(index, query, sys.maxsize, sort,
+                                      source=source)['hits']['hits']
 
     @staticmethod
-    def _mock_get(index, doc_id):
-        """Mock get operation"""
-        if index not in mock_data:
-            raise Exception('Index not found')
+    def _mock_msearch(searches):
+        """Mock multi search operation"""
+        results = []
+        for index, body in searches:
+            if body.get('aggs'):
+                hits = local_store.search(index, body.get('query'), sys.maxsize,
+                                          body.get('sort'))['hits']
+                start = body.get('from', 0)
+                page = hits['hits'][start:start + body.get('size', 10)]
+                if body.get('_source') is not None:
+                    page = [{**hit, '_source': filter_source(hit['_source'], body['_source'])}
+                            for hit in page]
+                results.append({
+                    'hits': {'total': hits['total'], 'hits': page},
+                    'aggregations': aggregate(body['aggs'],
+                                              (hit['_source'] for hit in hits['hits']))
+                })
+            else:
+                results.append(local_store.search(index, body.get('query'), body.get('size', 10),
+                                                  body.get('sort'), body.get('from', 0),
+                                                  source=body.get('_source')))
+        return results
 
-        for doc in mock_data[index]:
-            if doc['_id'] == doc_id:
-                return doc
+    @staticmethod
+    def _mock_mget(index, doc_ids, source=None):
+        """Mock multi get operation"""
+        docs = []
+        for doc_id in doc_ids:
+            try:
+                docs.append({**local_store.get(index, doc_id, source), 'found': True})
+            except Exception:
+                docs.append({'_index': index, '_id': doc_id, 'found': False})
+        return docs
 
-        raise Exception('Document not found')
+    @staticmethod
+    def _mock_get(index, doc_id, source=None):
+        """Mock get operation"""
+        try:
+            return local_store.get(index, doc_id, source)
+        except Exception:
+            return None
 
     @staticmethod
     def _mock_update(index, doc_id, body):
         """Mock update operation"""
-        if index not in mock_data:
-            raise Exception('Index not found')
-
-        for i, doc in enumerate(mock_data[index]):
-            if doc['_id'] == doc_id:
-                mock_data[index][i]['_source'].update(body)
-                mock_data[index][i]['_source']['_timestamp'] = datetime.utcnow(
-                ).isoformat()
-                return {
-                    '_index': index,
-                    '_id': doc_id,
-                    '_version': 2,
-                    'result': 'updated'
-                }
-
-        raise Exception('Document not found')
+        return local_store.update(index, doc_id, body)
 
     @staticmethod
     def _mock_delete(index, doc_id):
         """Mock delete operation"""
-        if index not in mock_data:
-            raise Exception('Index not found')
-
-        original_length = len(mock_data[index])
-        mock_data[index] = [d for d in mock_data[index] if d['_id'] != doc_id]
+        return local_store.delete(index, doc_id)
 
-        if len(mock_data[index]) == original_length:
-            raise Exception('Document not found')
+    @staticmethod
+    def _mock_update_by_query(index, query, body):
+        """Mock update by query operation"""
+        return {'updated': len(local_store.update_by_query(index, query, body))}
 
-        return {
-            '_index': index,
-            '_id': doc_id,
-            '_version': 1,
-            'result': 'deleted'
-        }
+    @staticmethod
+    def _mock_delete_by_query(index, query):
+        """Mock delete by query operation"""
+        return {'deleted': len(local_store.delete_by_query(index, query))}
 
     @staticmethod
     def ensure_index_exists(index_name, mapping=None):
@@ -0,0 +1,368 @@
+"""Evaluator for the subset of the OpenSearch query DSL used by the app.
+
+Used by the fallback stores so that, without a cluster, queries still
+return what OpenSearch would: term, terms, ids, match, match_all, exists,
+range and bool (must / filter / should / must_not), plus sort,
+terms / range / value_count aggregations, _source filtering and the
+merge of partial updates.
+"""
+from fnmatch import fnmatchcase
+import re
+
+MISSING = object()
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_field(source, path):
+    """Return the value at a dotted path of a document, or MISSING.
+
+    Arrays of objects are flattened like OpenSearch does: the path
+    `city_costs.city` yields the city of every element.
+    """
+    value = source
+    parts = path.split('.')
+    for position, part in enumerate(parts):
+        if isinstance(value, list):
+            rest = '.'.join(parts[position:])
+            values = []
+            for item in value:
+                found = get_field(item, rest)
+                if found is not MISSING:
+                    values.extend(found if isinstance(found, list) else [found])
+            return values or MISSING
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return MISSING
+    return value
+
+
+def field_values(value):
+    """Flatten a field value into the list of values OpenSearch would index"""
+    if value is MISSING or value is None:
+        return []
+    if isinstance(value, list):
+        return [v for v in value if v is not None]
+    return [value]
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def _clause(query):
+    """Split a single-key query clause into (type, body)"""
+    if not isinstance(query, dict) or len(query) != 1:
+        raise ValueError(f"Unsupported query clause: {query}")
+    return next(iter(query.items()))
+
+
+def _field_and_value(body, key):
+    """Unpack {'field': value} or {'field': {key: value, ...}}"""
+    field, spec = next(iter(body.items()))
+    if isinstance(spec, dict) and key in spec:
+        return field, spec[key], spec
+    return field, spec, {}
+
+
+def _as_list(clauses):
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+
+def _comparable(a, b):
+    """Coerce two values so that range comparisons behave like OpenSearch"""
+    if isinstance(a, (int, float)) and not isinstance(a, bool):
+        try:
+            return a, float(b)
+        except (TypeError, ValueError):
+            return str(a), str(b)
+    return str(a), str(b)
+
+
+def _in_range(value, spec):
+    for op, bound in spec.items():
+        if op not in ('gt', 'gte', 'lt', 'lte'):
+            continue
+        v, b = _comparable(value, bound)
+        if op == 'gt' and not v > b:
+            return False
+        if op == 'gte' and not v >= b:
+            return False
+        if op == 'lt' and not v < b:
+            return False
+        if op == 'lte' and not v <= b:
+            return False
+    return True
+
+
+def matches(query, doc_id, source, keyword_fields=()):
+    """Return True if a document matches the query.
+
+    keyword_fields lists the fields mapped as keyword: `match` on them is
+    exact like in OpenSearch, while other fields are matched by token.
+    """
+    if not query:
+        return True
+
+    kind, body = _clause(query)
+
+    if kind == 'match_all':
+        return True
+
+    if kind == 'ids':
+        return doc_id in body.get('values', [])
+
+    if kind == 'term':
+        field, value, _ = _field_and_value(body, 'value')
+        return value in field_values(get_field(source, field))
+
+    if kind == 'terms':
+        field, values = next(iter(body.items()))
+        wanted = set(values)
+        return any(v in wanted for v in field_values(get_field(source, field)))
+
+    if kind == 'match':
+        field, text, spec = _field_and_value(body, 'query')
+        values = field_values(get_field(source, field))
+        if field in keyword_fields:
+            return text in values
+        wanted = tokenize(text)
+        present = set()
+        for v in values:
+            present.update(tokenize(v))
+        if spec.get('operator', 'or').lower() == 'and':
+            return all(t in present for t in wanted)
+        return any(t in present for t in wanted)
+
+    if kind == 'exists':
+        return bool(field_values(get_field(source, body['field'])))
+
+    if kind == 'range':
+        field, spec = next(iter(body.items()))
+        return any(_in_range(v, spec) for v in field_values(get_field(source, field)))
+
+    if kind == 'bool':
+        required = _as_list(body.get('must')) + _as_list(body.get('filter'))
+        if not all(matches(q, doc_id, source, keyword_fields) for q in required):
+            return False
+        if any(matches(q, doc_id, source, keyword_fields) for q in _as_list(body.get('must_not'))):
+            return False
+        should = _as_list(body.get('should'))
+        if should:
+            minimum = body.get('minimum_should_match', 0 if required else 1)
+            hits = sum(1 for q in should if matches(q, doc_id, source, keyword_fields))
+            return hits >= int(minimum)
+        return True
+
+    raise ValueError(f"Unsupported query type: {kind}")
+
+
+def normalize_sort(sort):
+    """Turn any accepted sort syntax into [(field, descending)]"""
+    normalized = []
+    for entry in _as_list(sort):
+        if isinstance(entry, str):
+            normalized.append((entry, False))
+            continue
+        field, spec = next(iter(entry.items()))
+        order = spec.get('order', 'asc') if isinstance(spec, dict) else spec
+        normalized.append((field, str(order).lower() == 'desc'))
+    return normalized
+
+
+def sort_value(hit, field):
+    """Sort key of a hit for one field (first value of multi-valued fields)"""
+    if field == '_id':
+        return hit['_id']
+    values = field_values(get_field(hit['_source'], field))
+    return values[0] if values else None
+
+
+def sort_hits(hits, sort):
+    """Sort hits in place like OpenSearch: missing values always last.
+
+    Each hit gets a 'sort' list with its sort values, as search_after needs.
+    """
+    fields = normalize_sort(sort)
+    for hit in hits:
+        hit['sort'] = [sort_value(hit, field) for field, _ in fields]
+    # Stable sorts from the last key to the first give a multi-key ordering
+    for position in reversed(range(len(fields))):
+        descending = fields[position][1]
+        present = [h for h in hits if h['sort'][position] is not None]
+        missing = [h for h in hits if h['sort'][position] is None]
+        present.sort(key=lambda h: h['sort'][position], reverse=descending)
+        hits[:] = present + missing
+    return hits
+
+
+def _compare(a, b, descending):
+    """Compare two sort values like OpenSearch: missing values always last"""
+    if a == b:
+        return 0
+    if a is None:
+        return 1
+    if b is None:
+        return -1
+    a, b = _comparable(a, b)
+    if a == b:
+        return 0
+    return (1 if a > b else -1) * (-1 if descending else 1)
+
+
+def search_after_hits(hits, sort, search_after):
+    """Hits of a sorted list that come strictly after the search_after values"""
+    fields = normalize_sort(sort)
+
+    def after(hit):
+        for (_, descending), value, cursor in zip(fields, hit['sort'], search_after):
+            order = _compare(value, cursor, descending)
+            if order:
+                return order > 0
+        return False
+
+    return [hit for hit in hits if after(hit)]
+
+
+def _source_patterns(patterns):
+    if patterns is None:
+        return []
+    return [patterns] if isinstance(patterns, str) else list(patterns)
+
+
+def _filter_value(value, path, includes, excludes, included):
+    if isinstance(value, dict):
+        result = {}
+        for key, child in value.items():
+            child_path = f"{path}.{key}" if path else key
+            if any(fnmatchcase(child_path, pattern) for pattern in excludes):
+                continue
+            child_included = included or any(fnmatchcase(child_path, p) for p in includes)
+            # Objects are entered while an include may still match below them
+            if not child_included and not isinstance(child, (dict, list)):
+                continue
+            filtered = _filter_value(child, child_path, includes, excludes, child_included)
+            if child_included or filtered:
+                result[key] = filtered
+        return result
+    if isinstance(value, list):
+        items = [_filter_value(item, path, includes, excludes, included) for item in value]
+        return [item for item in items if included or item]
+    return value if included else None
+
+
+def filter_source(source, spec):
+    """Apply a _source filter to a document like OpenSearch does.
+
+    spec is None or True (whole document), False (no fields), a field
+    pattern or list of patterns to include, or a dict with `includes`
+    and `excludes`. Patterns are dotted paths and may contain `*`.
+    """
+    if spec is None or spec is True:
+        return source
+    if spec is False:
+        return {}
+    if isinstance(spec, dict):
+        includes = _source_patterns(spec.get('includes', spec.get('include')))
+        excludes = _source_patterns(spec.get('excludes', spec.get('exclude')))
+    else:
+        includes, excludes = _source_patterns(spec), []
+    if not excludes and not includes:
+        return source
+    return _filter_value(source, '', includes, excludes, not includes)
+
+
+def merge_partial(source, doc):
+    """Apply a partial update to a document like OpenSearch does: objects
+    merge recursively, any other value (arrays included) replaces the old one"""
+    merged = dict(source or {})
+    for field, value in (doc or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(field), dict):
+            merged[field] = merge_partial(merged[field], value)
+        else:
+            merged[field] = value
+    return merged
+
+
+def _key_order(group):
+    # Numbers before strings, so that mixed keys still sort
+    return isinstance(group[0], str), group[0]
+
+
+def _range_key(bound):
+    return '*' if bound is None else str(float(bound))
+
+
+def _range_buckets(body, sources, nested):
+    """Buckets of a range aggregation: from is inclusive, to exclusive"""
+    buckets = []
+    for spec in body['ranges']:
+        low, high = spec.get('from'), spec.get('to')
+        members = [s for s in sources
+                   if any(_in_range(v, {**({'gte': low} if low is not None else {}),
+                                        **({'lt': high} if high is not None else {})})
+                          for v in field_values(get_field(s, body['field'])))]
+        bucket = {'key': spec.get('key', f"{_range_key(low)}-{_range_key(high)}"),
+                  'doc_count': len(members)}
+        if low is not None:
+            bucket['from'] = float(low)
+        if high is not None:
+            bucket['to'] = float(high)
+        if nested:
+            bucket.update(aggregate(nested, members))
+        buckets.append(bucket)
+    return buckets
+
+
+def aggregate(aggs, sources):
+    """Evaluate aggregations over the _source of the matching documents.
+
+    Supports terms (field, size, missing, order by _count or _key, nested
+    aggs), range (keyed buckets are not supported) and value_count.
+    Returns the `aggregations` part of a response.
+    """
+    sources = list(sources)
+    result = {}
+    for name, spec in (aggs or {}).items():
+        nested = spec.get('aggs') or spec.get('aggregations')
+        kind, body = next((k, v) for k, v in spec.items() if k not in ('aggs', 'aggregations'))
+        if kind == 'value_count':
+            result[name] = {'value': sum(len(field_values(get_field(s, body['field'])))
+                                         for s in sources)}
+        elif kind == 'terms':
+            groups = {}
+            for source in sources:
+                values = field_values(get_field(source, body['field']))
+                if not values and 'missing' in body:
+                    values = [body['missing']]
+                # A document counts once per distinct value
+                for value in dict.fromkeys(values):
+                    groups.setdefault(value, []).append(source)
+            order = body.get('order', {'_count': 'desc'})
+            (order_by, direction), = order.items() if isinstance(order, dict) else order[0].items()
+            if order_by == '_key':
+                ranked = sorted(groups.items(), key=_key_order, reverse=direction == 'desc')
+            else:
+                # Ties on the count are broken by ascending key
+                ranked = sorted(groups.items(), key=_key_order)
+                ranked.sort(key=lambda g: len(g[1]), reverse=direction == 'desc')
+            size = body.get('size', 10)
+            buckets = []
+            for key, members in ranked[:size]:
+                bucket = {'key': key, 'doc_count': len(members)}
+                if nested:
+                    bucket.update(aggregate(nested, members))
+                buckets.append(bucket)
+            result[name] = {
+                'doc_count_error_upper_bound': 0,
+                'sum_other_doc_count': sum(len(m) for _, m in ranked[size:]),
+                'buckets': buckets
+            }
+        elif kind == 'range':
+            result[name] = {'buckets': _range_buckets(body, sources, nested)}
+        else:
+            raise ValueError(f"Unsupported aggregation type: {kind}")
+    return result
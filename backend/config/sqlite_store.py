@@ -0,0 +1,339 @@
+"""Embedded on-disk document store backed by SQLite.
+
+Meant for small deployments (edge, staging) that run without an OpenSearch
+cluster but must keep users, sessions and packages across restarts.
+
+- One `documents` table holds every index: (idx, id) primary key, a
+  version and the JSON `_source`.
+- Keyword fields (taken from INDEX_MAPPINGS; every top-level scalar for
+  unmapped indices) are written to a `keywords` table indexed on
+  (idx, field, value). An expression index on json_extract() would not
+  cover array fields such as `passions` or `package_ids`; a row per
+  value does.
+- term / terms / ids / keyword match clauses, including those nested in
+  bool must / filter or in a bool made only of should clauses, are
+  translated to SQL to select candidate rows. The complete query and
+  the sort are then evaluated in Python by the same evaluator as the
+  in-memory store, so both backends answer alike.
+- The database runs in WAL mode: readers never block the writer, and
+  writes from every gunicorn worker process are serialized by SQLite
+  (BEGIN IMMEDIATE plus a busy timeout). Each thread of each process
+  opens its own connection.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import sqlite3
+import json
+import os
+
+from config.document_store import DocumentStore
+from config.query_dsl import (matches, sort_hits, search_after_hits, field_values, get_field,
+                              filter_source, merge_partial)
+
+BUSY_TIMEOUT_MS = int(os.getenv('STORAGE_SQLITE_BUSY_TIMEOUT_MS', 10000))
+SYNCHRONOUS = os.getenv('STORAGE_SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    idx TEXT NOT NULL,
+    id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (idx, id)
+);
+CREATE TABLE IF NOT EXISTS keywords (
+    idx TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value,
+    id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS keywords_lookup ON keywords (idx, field, value);
+CREATE INDEX IF NOT EXISTS keywords_document ON keywords (idx, id);
+"""
+
+# SQLite caps bound parameters per statement; keep IN lists well below it
+MAX_IN_PARAMS = 900
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+class SQLiteStore(DocumentStore):
+    """Document store in a single SQLite database file"""
+
+    def __init__(self, path, keyword_fields=None):
+        self.path = path
+        self._keyword_fields = keyword_fields or {}
+        self._local = threading.local()
+        self._schema_pid = None
+        self._schema_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    # Connections
+    def _connection(self):
+        """Connection of the calling thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        if self._schema_pid == os.getpid():
+            return
+        with self._schema_lock:
+            if self._schema_pid != os.getpid():
+                conn.executescript(SCHEMA)
+                self._schema_pid = os.getpid()
+
+    @contextmanager
+    def _write(self):
+        """Write transaction, taking SQLite's write lock up front"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    # Keyword postings
+    def _keyword_rows(self, index, doc_id, source):
+        fields = self._keyword_fields.get(index)
+        if fields is None:
+            fields = [f for f, v in source.items() if f != '_timestamp' and _is_scalar(v)]
+        rows = []
+        for field in fields:
+            for value in field_values(get_field(source, field)):
+                if _is_scalar(value):
+                    rows.append((index, field, value, doc_id))
+        return rows
+
+    def _is_indexed(self, index, field):
+        fields = self._keyword_fields.get(index)
+        if fields is None:
+            return '.' not in field
+        return field in fields
+
+    def _put(self, conn, index, doc_id, source, version):
+        # REPLACE gives the row a new rowid: rewritten documents move to the
+        # end of the index order, as in the in-memory store
+        conn.execute('INSERT OR REPLACE INTO documents (idx, id, version, source) '
+                     'VALUES (?, ?, ?, ?)',
+                     (index, doc_id, version, json.dumps(source, default=str)))
+        conn.execute('DELETE FROM keywords WHERE idx = ? AND id = ?', (index, doc_id))
+        conn.executemany('INSERT INTO keywords (idx, field, value, id) VALUES (?, ?, ?, ?)',
+                         self._keyword_rows(index, doc_id, source))
+
+    @staticmethod
+    def _current(conn, index, doc_id):
+        return conn.execute('SELECT version, source FROM documents WHERE idx = ? AND id = ?',
+                            (index, doc_id)).fetchone()
+
+    # Writes
+    def index(self, index, doc_id, body, op_type=None):
+        source = {**body, '_timestamp': datetime.utcnow().isoformat()}
+        with self._write() as conn:
+            row = self._current(conn, index, doc_id)
+            if op_type == 'create' and row:
+                return None
+            version = row[0] + 1 if row else 1
+            self._put(conn, index, doc_id, source, version)
+        return {
+            '_index': index,
+            '_id': doc_id,
+            '_version': version,
+            'result': 'updated' if row else 'created'
+        }
+
+    def bulk_index(self, index, documents):
+        timestamp = datetime.utcnow().isoformat()
+        count = 0
+        with self._write() as conn:
+            for doc_id, body in documents:
+                row = self._current(conn, index, doc_id)
+                self._put(conn, index, doc_id, {**body, '_timestamp': timestamp},
+                          row[0] + 1 if row else 1)
+                count += 1
+        return count
+
+    def update(self, index, doc_id, body):
+        with self._write() as conn:
+            row = self._current(conn, index, doc_id)
+            if row is None:
+                raise Exception('Document not found')
+            source = {**merge_partial(json.loads(row[1]), body),
+                      '_timestamp': datetime.utcnow().isoformat()}
+            version = row[0] + 1
+            self._put(conn, index, doc_id, source, version)
+        return {'_index': index, '_id': doc_id, '_version': version, 'result': 'updated'}
+
+    def delete(self, index, doc_id):
+        with self._write() as conn:
+            row = self._current(conn, index, doc_id)
+            if row is None:
+                raise Exception('Document not found')
+            conn.execute('DELETE FROM documents WHERE idx = ? AND id = ?', (index, doc_id))
+            conn.execute('DELETE FROM keywords WHERE idx = ? AND id = ?', (index, doc_id))
+        return {'_index': index, '_id': doc_id, '_version': row[0] + 1, 'result': 'deleted'}
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM documents')
+            conn.execute('DELETE FROM keywords')
+
+    # Reads
+    def get(self, index, doc_id, source=None):
+        row = self._current(self._connection(), index, doc_id)
+        if row is None:
+            raise Exception('Document not found')
+        return {'_index': index, '_id': doc_id, '_version': row[0],
+                'found': True, '_source': filter_source(json.loads(row[1]), source)}
+
+    def count(self, index):
+        return self._connection().execute('SELECT COUNT(*) FROM documents WHERE idx = ?',
+                                          (index,)).fetchone()[0]
+
+    def _keyword_ids(self, index, field, values):
+        values = [v for v in values if _is_scalar(v)]
+        if len(values) > MAX_IN_PARAMS:
+            return None
+        if not values:
+            return 'SELECT id FROM keywords WHERE 0', []
+        marks = ', '.join('?' * len(values))
+        return (f"SELECT id FROM keywords WHERE idx = ? AND field = ? AND value IN ({marks})",
+                [index, field, *values])
+
+    @staticmethod
+    def _compound(operator, selects):
+        sql = f" {operator} ".join(f"SELECT id FROM ({select})" for select, _ in selects)
+        return sql, [p for _, params in selects for p in params]
+
+    def _candidates(self, index, query):
+        """SELECT of the ids that may match the query, or None to scan the index"""
+        if not query:
+            return None
+        kind, body = next(iter(query.items()))
+
+        if kind == 'ids':
+            ids = list(body.get('values', []))
+            if len(ids) > MAX_IN_PARAMS:
+                return None
+            if not ids:
+                return 'SELECT id FROM documents WHERE 0', []
+            return (f"SELECT id FROM documents WHERE idx = ? AND id IN ({', '.join('?' * len(ids))})",
+                    [index, *ids])
+
+        if kind in ('term', 'match'):
+            field, spec = next(iter(body.items()))
+            key = 'value' if kind == 'term' else 'query'
+            value = spec.get(key) if isinstance(spec, dict) else spec
+            # match is only exact on keyword-mapped fields
+            if kind == 'match' and field not in self._keyword_fields.get(index, ()):
+                return None
+            if self._is_indexed(index, field):
+                return self._keyword_ids(index, field, [value])
+            return None
+
+        if kind == 'terms':
+            field, values = next(iter(body.items()))
+            if self._is_indexed(index, field):
+                return self._keyword_ids(index, field, values)
+            return None
+
+        if kind == 'bool':
+            clauses = []
+            for key in ('must', 'filter'):
+                value = body.get(key) or []
+                clauses.extend(value if isinstance(value, list) else [value])
+            selects = [c for c in (self._candidates(index, clause) for clause in clauses)
+                       if c is not None]
+            if selects:
+                return selects[0] if len(selects) == 1 else self._compound('INTERSECT', selects)
+            if clauses:
+                return None
+
+            # Only should clauses: the union of their candidates
+            should = body.get('should') or []
+            should = should if isinstance(should, list) else [should]
+            if not should or int(body.get('minimum_should_match', 1)) < 1:
+                return None
+            for clause in should:
+                candidate = self._candidates(index, clause)
+                if candidate is None:
+                    return None
+                selects.append(candidate)
+            return selects[0] if len(selects) == 1 else self._compound('UNION', selects)
+
+        return None
+
+    def _matching(self, conn, index, query):
+        """(id, version, source) of the documents matching a query, in index order"""
+        sql = 'SELECT id, version, source FROM documents WHERE idx = ?'
+        params = [index]
+        candidate = self._candidates(index, query)
+        if candidate is not None:
+            sql += f" AND id IN ({candidate[0]})"
+            params.extend(candidate[1])
+        rows = conn.execute(sql + ' ORDER BY rowid', params).fetchall()
+
+        keyword_fields = self._keyword_fields.get(index, ())
+        matching = []
+        for doc_id, version, raw in rows:
+            source = json.loads(raw)
+            if matches(query, doc_id, source, keyword_fields):
+                matching.append((doc_id, version, source))
+        return matching
+
+    def update_by_query(self, index, query, body):
+        timestamp = datetime.utcnow().isoformat()
+        with self._write() as conn:
+            docs = self._matching(conn, index, query)
+            for doc_id, version, source in docs:
+                self._put(conn, index, doc_id,
+                          {**merge_partial(source, body), '_timestamp': timestamp}, version + 1)
+        return [doc_id for doc_id, _, _ in docs]
+
+    def delete_by_query(self, index, query):
+        with self._write() as conn:
+            docs = self._matching(conn, index, query)
+            for doc_id, _, _ in docs:
+                conn.execute('DELETE FROM documents WHERE idx = ? AND id = ?', (index, doc_id))
+                conn.execute('DELETE FROM keywords WHERE idx = ? AND id = ?', (index, doc_id))
+        return [doc_id for doc_id, _, _ in docs]
+
+    def search(self, index, query=None, size=10, sort=None, from_=0, search_after=None,
+               source=None):
+        hits = [{'_index': index, '_id': doc_id, '_score': 1.0, '_source': doc}
+                for doc_id, _, doc in self._matching(self._connection(), index, query)]
+        total = len(hits)
+        if sort:
+            sort_hits(hits, sort)
+            if search_after:
+                hits = search_after_hits(hits, sort, search_after)
+
+        hits = hits[from_:from_ + size]
+        if source is not None:
+            hits = [{**hit, '_source': filter_source(hit['_source'], source)} for hit in hits]
+
+        return {
+            'hits': {
+                'total': {
+                    'value': total,
+                    'relation': 'eq'
+                },
+                'hits': hits
+            }
+        }
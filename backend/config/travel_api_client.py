@@ -0,0 +1,287 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+import threading
+import socket
+import base64
+import json
+import time
+import os
+import logging
+
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings for the external travel API
+POOL_SIZE = int(os.getenv('TRAVEL_API_POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.getenv('TRAVEL_API_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('TRAVEL_API_READ_TIMEOUT', 30))
+TCP_KEEPALIVE = os.getenv('TRAVEL_API_TCP_KEEPALIVE', 'true').lower() == 'true'
+TCP_KEEPALIVE_IDLE = int(os.getenv('TRAVEL_API_TCP_KEEPALIVE_IDLE', 60))
+
+# Token lifetime assumed when the auth endpoint does not tell us (seconds)
+DEFAULT_TOKEN_TTL = int(os.getenv('TRAVEL_API_TOKEN_TTL', 900))
+
+# Refresh the token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = int(os.getenv('TRAVEL_API_TOKEN_REFRESH_MARGIN', 60))
+
+
+def get_travel_api_url():
+    """Return the configured external travel API base URL"""
+    api_url = os.getenv('TRAVEL_API_URL')
+    if not api_url:
+        raise Exception("External API URL not configured")
+    return api_url.rstrip('/')
+
+
+def get_travel_api_verify():
+    """Return the SSL verification setting for the external travel API"""
+    ca_bundle = os.getenv('TRAVEL_API_CA_BUNDLE')
+    if ca_bundle:
+        return ca_bundle
+    verify = os.getenv('TRAVEL_API_VERIFY_SSL')
+    if verify is not None:
+        return verify.lower() == 'true'
+    # SSL verification disabled for local development endpoints
+    return not get_travel_api_url().startswith('https://localhost')
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on pooled sockets"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        if TCP_KEEPALIVE:
+            options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE))
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class TravelAPIClient:
+    """Pooled, keep-alive HTTP client for the external travel API.
+
+    Each worker process owns one requests.Session whose urllib3 pool keeps
+    connections open between calls, so only the first request per
+    connection pays for the TCP and TLS handshakes. The session is rebuilt
+    after a fork so gunicorn workers never share sockets.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        """Return the pooled session for the current process"""
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = _KeepAliveAdapter(pool_connections=1,
+                                                pool_maxsize=self.pool_size,
+                                                max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Connection': 'keep-alive'})
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def request(self, method, path, authenticated=True, timeout=None, **kwargs):
+        """Send a request to the external API, adding the bearer token"""
+        url = f"{get_travel_api_url()}{path}"
+        kwargs.setdefault('verify', get_travel_api_verify())
+        kwargs['timeout'] = timeout or self.timeout
+        session = self.session()
+
+        if not authenticated:
+            return session.request(method, url, **kwargs)
+
+        headers = kwargs.pop('headers', {})
+
+        def send(token):
+            return session.request(method, url,
+                                   headers={**headers, 'Authorization': f'Bearer {token}'},
+                                   **kwargs)
+
+        return travel_api_tokens.call(send)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+
+def _token_ttl(token_data, access_token):
+    """Work out how long a freshly minted token stays valid"""
+    expires_in = token_data.get('expires_in')
+    if isinstance(expires_in, (int, float)) and expires_in > 0:
+        return float(expires_in)
+
+    # Fall back to the JWT 'exp' claim (no signature check, we only need the time)
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        exp = claims.get('exp')
+        if exp:
+            return max(float(exp) - time.time(), 0.0)
+    except Exception:
+        pass
+
+    return float(DEFAULT_TOKEN_TTL)
+
+
+def request_external_api_token():
+    """Mint a new token on the external travel API, return (token, ttl)"""
+    api_username = os.getenv('TRAVEL_API_USERNAME')
+    api_password = os.getenv('TRAVEL_API_PASSWORD')
+
+    if not all([os.getenv('TRAVEL_API_URL'), api_username, api_password]):
+        raise Exception("External API configuration is missing")
+
+    auth_url = f"{get_travel_api_url()}/api/auth/token"
+    logger.info(f"🔑 Requesting external API token from {auth_url}")
+
+    try:
+        response = travel_api_client.post(
+            '/api/auth/token',
+            authenticated=False,
+            data={'username': api_username, 'password': api_password},  # OAuth2PasswordRequestForm expects form data
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=(travel_api_client.timeout[0], 10))
+    except requests.exceptions.ConnectTimeout:
+        raise Exception(f"Connection timeout to external API: {auth_url}")
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Failed to connect to external API: {str(e)}")
+
+    if response.status_code == 401:
+        raise Exception("Invalid credentials for external API")
+
+    if not response.ok:
+        raise Exception(
+            f"External API authentication failed: {response.status_code}")
+
+    try:
+        token_data = response.json()
+    except ValueError as e:
+        raise Exception(f"Invalid JSON response from external API: {str(e)}")
+
+    access_token = token_data.get('access_token')
+    if not access_token:
+        raise Exception("No access token returned from external API")
+
+    return access_token, _token_ttl(token_data, access_token)
+
+
+class TravelAPITokenManager:
+    """Process-wide cache for the external travel API bearer token.
+
+    The token is reused until shortly before it expires. Inside the refresh
+    margin the cached token is still handed out while a single background
+    thread mints the next one; once it has expired, callers block on one
+    shared refresh instead of each hitting the auth endpoint.
+    """
+
+    def __init__(self, fetch_token=request_external_api_token,
+                 refresh_margin=TOKEN_REFRESH_MARGIN):
+        self._fetch_token = fetch_token
+        self._refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._margin = 0.0
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._background_refresh = False
+        self.stats = {'hits': 0, 'refreshes': 0, 'refresh_errors': 0, 'retries_on_401': 0}
+
+    def get_token(self):
+        """Return a valid token, minting one only when needed"""
+        token, expires_at = self._token, self._expires_at
+        now = time.monotonic()
+
+        if token and now < expires_at - self._margin:
+            self.stats['hits'] += 1
+            return token
+
+        if token and now < expires_at:
+            # Still valid: serve it and refresh ahead of expiry
+            self.stats['hits'] += 1
+            self._refresh_in_background(token)
+            return token
+
+        return self._refresh(stale_token=token)
+
+    def invalidate(self, token):
+        """Drop a token the upstream rejected (no-op if already replaced)"""
+        with self._refresh_lock:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0
+
+    def call(self, send):
+        """Run send(token) and retry once with a fresh token on HTTP 401"""
+        token = self.get_token()
+        response = send(token)
+        if response.status_code == 401:
+            logger.info("🔑 External API rejected cached token, retrying with a fresh one")
+            self.stats['retries_on_401'] += 1
+            self.invalidate(token)
+            response = send(self.get_token())
+        return response
+
+    def _refresh(self, stale_token=None):
+        with self._refresh_lock:
+            # Another thread may have refreshed while we were waiting
+            if (self._token and self._token != stale_token
+                    and time.monotonic() < self._expires_at):
+                return self._token
+
+            try:
+                token, ttl = self._fetch_token()
+            except Exception:
+                self.stats['refresh_errors'] += 1
+                raise
+
+            self._token = token
+            self._expires_at = time.monotonic() + ttl
+            # Never spend more than half of a short-lived token's life refreshing
+            self._margin = min(self._refresh_margin, ttl / 2)
+            self.stats['refreshes'] += 1
+            logger.info(f"🔑 External API token refreshed, valid for {int(ttl)}s")
+            return token
+
+    def _refresh_in_background(self, stale_token):
+        with self._state_lock:
+            if self._background_refresh:
+                return
+            self._background_refresh = True
+
+        def run():
+            try:
+                self._refresh(stale_token=stale_token)
+            except Exception as e:
+                logger.warning(f"⚠️ Background token refresh failed: {e}")
+            finally:
+                with self._state_lock:
+                    self._background_refresh = False
+
+        threading.Thread(target=run, name='travel-api-token-refresh', daemon=True).start()
+
+
+# Shared instances for the whole worker process
+travel_api_client = TravelAPIClient()
+travel_api_tokens = TravelAPITokenManager()
+metrics.register_collector('travel_api_tokens', lambda: dict(travel_api_tokens.stats))
@@ -0,0 +1,395 @@
+"""Write-ahead journal for writes that could not reach OpenSearch.
+
+While the cluster is unreachable, OpenSearchOperations serves writes from
+the local store and appends them here, so that they can be sent to the
+cluster once it is back instead of living only in one worker's memory.
+
+- Each process appends to its own file, `<pid>.active.ndjson`, and holds
+  an exclusive flock on it while it is alive.
+- Appends are group-committed: a writer thread fsyncs every
+  JOURNAL_FSYNC_INTERVAL seconds (or as soon as JOURNAL_FSYNC_BATCH
+  entries are waiting). append() returns once its entry is on disk, so
+  a user who registers during an outage is not lost on a crash.
+- replay() rotates the active file and sends every journal file it can
+  lock to the cluster with bulk requests, merged in timestamp order.
+  That includes the files of dead processes.
+- Writes fail over one by one, so while some are journaled others still
+  reach the cluster directly. Every document written to the cluster is
+  stamped with WRITTEN_AT, and replay skips the entries older than the
+  document they target and makes the others conditional on its
+  seq_no: a journaled write never undoes a newer one. This also makes
+  entries idempotent, and delete treats 404 as done. A create refused
+  with 409 is done if the existing document is the journaled one;
+  otherwise it is a conflict, kept in a conflicts file instead of being
+  dropped. A replay interrupted halfway can therefore simply start over.
+"""
+import threading
+import logging
+import itertools
+import heapq
+import json
+import glob
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config.metrics import metrics
+from config.query_dsl import merge_partial
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', 'true').lower() == 'true'
+JOURNAL_DIR = os.getenv('JOURNAL_DIR',
+                        os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                     'data', 'journal'))
+FSYNC_INTERVAL = float(os.getenv('JOURNAL_FSYNC_INTERVAL', 0.02))
+FSYNC_BATCH = int(os.getenv('JOURNAL_FSYNC_BATCH', 256))
+SYNC_TIMEOUT = float(os.getenv('JOURNAL_SYNC_TIMEOUT', 2))
+REPLAY_CHUNK_SIZE = int(os.getenv('JOURNAL_REPLAY_CHUNK_SIZE', 500))
+
+# Per-item bulk statuses that mean the entry is already applied (a create
+# refused with 409 is checked against the existing document instead)
+ALREADY_APPLIED = {('create', 409), ('delete', 404)}
+
+# Field stamped on every document written to the cluster: the time of the
+# write in microseconds, which replay compares the journal entries against
+WRITTEN_AT = 'written_at'
+
+
+def _lock(fd):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class WriteJournal:
+    """Append-only, fsync-batched log of writes pending for the cluster"""
+
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._replay_lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._written_seq = 0
+        self._synced_seq = 0
+        metrics.set_gauge('journal.pending_files', self.pending_files)
+
+    @property
+    def active_path(self):
+        return os.path.join(self.directory, f"{os.getpid()}.active.ndjson")
+
+    def _open(self):
+        """Open this process's journal file (again after a fork)"""
+        if self._pid == os.getpid() and self._file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.active_path, 'a', encoding='utf-8')
+        _lock(self._file.fileno())
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._written_seq = self._synced_seq = 0
+            threading.Thread(target=self._sync_loop, name='write-journal', daemon=True).start()
+
+    def append(self, op, index, doc_id, body=None):
+        self.append_many([(op, index, doc_id, body)])
+
+    def append_many(self, entries):
+        """Append (op, index, doc_id, body) entries and wait until they are fsynced"""
+        with self._lock:
+            self._open()
+            # Taken under the lock, so that each file is in timestamp order
+            timestamp = time.time()
+            for op, index, doc_id, body in entries:
+                self._file.write(json.dumps({'op': op, 'index': index, 'id': doc_id,
+                                             'body': body, 'ts': timestamp},
+                                            default=str) + '\n')
+                self._written_seq += 1
+            seq = self._written_seq
+            if seq - self._synced_seq >= FSYNC_BATCH:
+                self._wakeup.set()
+            self._synced.wait_for(lambda: self._synced_seq >= seq or self._pid != os.getpid(),
+                                  timeout=SYNC_TIMEOUT)
+        metrics.inc('journal.appended', len(entries))
+
+    def _sync_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wakeup.wait(FSYNC_INTERVAL)
+            self._wakeup.clear()
+            with self._lock:
+                if self._written_seq == self._synced_seq or self._file is None:
+                    continue
+                seq = self._written_seq
+                self._file.flush()
+                fd = self._file.fileno()
+            try:
+                started = time.perf_counter()
+                os.fsync(fd)
+                metrics.observe('journal.fsync_seconds', time.perf_counter() - started)
+            except OSError as e:
+                logger.error(f"Journal fsync failed: {e}")
+            with self._lock:
+                self._synced_seq = max(self._synced_seq, seq)
+                self._synced.notify_all()
+
+    def _rotate(self):
+        """Move the active file aside so it can be replayed while new writes continue"""
+        with self._lock:
+            if self._pid != os.getpid() or self._file is None or self._file.tell() == 0:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced_seq = self._written_seq
+            self._synced.notify_all()
+            os.replace(self.active_path,
+                       os.path.join(self.directory, f"{os.getpid()}.{time.time_ns()}.ndjson"))
+            self._file.close()
+            self._file = None
+            self._open()
+
+    def pending_files(self):
+        return len(glob.glob(os.path.join(self.directory, '*.ndjson')))
+
+    def has_pending(self):
+        """True if any journal file other than an empty active one exists"""
+        for path in glob.glob(os.path.join(self.directory, '*.ndjson')):
+            if path != self.active_path or os.path.getsize(path) > 0:
+                return True
+        return False
+
+    def replay(self, send_bulk, get_docs):
+        """Replay every journal file this process can lock.
+
+        The entries of all files are merged by timestamp, so writes of
+        different workers reach the cluster in the order they were made.
+        `send_bulk(actions)` takes OpenSearch bulk actions and returns
+        {'indexed': n, 'errors': [...]}; `get_docs(index, ids, source)`
+        returns {id: doc} ('_source', '_seq_no', '_primary_term') of the
+        documents that exist. Both raise if the cluster is unreachable,
+        which stops the replay with the files left in place. Returns the
+        number of entries applied.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._rotate()
+            handles = []
+            for path in sorted(glob.glob(os.path.join(self.directory, '*.ndjson'))):
+                if path == self.active_path:
+                    continue
+                try:
+                    handle = open(path, 'r', encoding='utf-8')
+                except FileNotFoundError:
+                    continue
+                if _lock(handle.fileno()):
+                    handles.append(handle)
+                else:
+                    handle.close()  # still owned by a live process, or replayed by another one
+            try:
+                return self._replay_files(handles, send_bulk, get_docs)
+            finally:
+                for handle in handles:
+                    handle.close()
+        finally:
+            self._replay_lock.release()
+
+    def _replay_files(self, handles, send_bulk, get_docs):
+        if not handles:
+            return 0
+        started = time.perf_counter()
+        count = skipped = rejected = 0
+        dropped = []
+        create_errors = []
+        # State each created document should have after the replay, to tell
+        # a create that is already applied from one that hit another document
+        expected = {}
+
+        # Stream the files: an outage of hours must not be loaded in memory at once
+        entries = (entry for _, _, _, entry in heapq.merge(
+            *(_read_entries(handle, number) for number, handle in enumerate(handles))))
+        while True:
+            chunk = list(itertools.islice(entries, REPLAY_CHUNK_SIZE))
+            if not chunk:
+                break
+            count += len(chunk)
+            for entry in chunk:
+                key = (entry['index'], entry['id'])
+                if entry['op'] == 'create':
+                    expected[key] = entry['body']
+                elif key in expected:
+                    if entry['op'] == 'index':
+                        expected[key] = entry['body']
+                    elif entry['op'] == 'update':
+                        expected[key] = merge_partial(expected[key], entry['body'])
+                    else:
+                        del expected[key]
+
+            actions, folded, guarded, older = _guarded_actions(chunk, get_docs)
+            skipped += older
+            result = send_bulk(actions)
+            for error in result['errors']:
+                key = (error.get('_index'), error['_id'])
+                if error['status'] == 409 and key in guarded:
+                    # Written live while the replay ran: newer than the journal
+                    skipped += folded[key]
+                elif (error['op_type'], error['status']) == ('create', 409):
+                    create_errors.append(error)
+                elif (error['op_type'], error['status']) not in ALREADY_APPLIED:
+                    dropped.append(error)
+                    rejected += folded.get(key, 1)
+
+        for error in dropped:
+            logger.error(f"Journal entry {error['op_type']} {error['_id']} rejected: "
+                         f"{error['status']} {error['error']}")
+        conflicts = self._create_conflicts(create_errors, expected, get_docs)
+        for handle in handles:
+            os.remove(handle.name)
+        if not count:
+            return 0
+
+        elapsed = time.perf_counter() - started
+        applied = count - rejected - len(conflicts) - skipped
+        metrics.inc('journal.replayed', applied)
+        metrics.inc('journal.dropped', rejected)
+        metrics.inc('journal.conflicts', len(conflicts))
+        metrics.inc('journal.skipped', skipped)
+        metrics.observe('journal.replay_seconds', elapsed)
+        metrics.set_gauge('journal.last_replay_docs_per_second',
+                          round(count / elapsed, 1) if elapsed else count)
+        logger.info(f"📼 Replayed {applied} journaled writes from {len(handles)} files "
+                    f"in {elapsed:.2f}s ({rejected} rejected, {len(conflicts)} conflicts, "
+                    f"{skipped} already applied or superseded)")
+        return applied
+
+    def _create_conflicts(self, errors, expected, get_docs):
+        """Creates refused with 409 whose document is not the journaled one.
+
+        They are written to a conflicts-<ns>.jsonl file next to the journal
+        (never replayed) with both versions, for manual resolution.
+        """
+        refused = {}
+        for error in errors:
+            key = (error.get('_index'), error['_id'])
+            if key in expected:
+                refused.setdefault(key[0], []).append(key[1])
+        conflicts = []
+        for index, ids in refused.items():
+            docs = get_docs(index, ids, None)
+            for doc_id in ids:
+                journaled = json.loads(json.dumps(expected[(index, doc_id)], default=str))
+                existing = docs[doc_id]['_source'] if doc_id in docs else None
+                if existing is not None:
+                    existing = {k: v for k, v in existing.items() if k != WRITTEN_AT}
+                if existing != journaled:
+                    conflicts.append({'index': index, 'id': doc_id, 'journaled': journaled,
+                                      'existing': existing})
+        if conflicts:
+            path = os.path.join(self.directory, f"conflicts-{time.time_ns()}.jsonl")
+            with open(path, 'w', encoding='utf-8') as handle:
+                for conflict in conflicts:
+                    handle.write(json.dumps(conflict, default=str) + '\n')
+                    logger.error(f"Journaled create of {conflict['index']}/{conflict['id']} "
+                                 f"conflicts with an existing document, kept in {path}")
+        return conflicts
+
+
+def _read_entries(handle, number):
+    """(ts, file number, line number, entry) of a journal file, in file order"""
+    for line_number, line in enumerate(handle):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A torn last line from a crash mid-write was never acknowledged
+            logger.warning(f"Skipping unreadable journal line in {handle.name}")
+            continue
+        yield entry.get('ts', 0), number, line_number, entry
+
+
+def written_at(ts=None):
+    """WRITTEN_AT value of a write made at `ts` (epoch seconds, default now)"""
+    return int((time.time() if ts is None else ts) * 1_000_000)
+
+
+def _fold(entries):
+    """(op, body) with the effect of several entries on one document"""
+    op, body = None, None
+    for entry in entries:
+        if entry['op'] in ('index', 'create', 'delete'):
+            op, body = entry['op'], entry['body']
+        elif op in ('index', 'create'):
+            body = merge_partial(body, entry['body'])
+        elif op != 'delete':  # updating a deleted document would fail
+            op, body = 'update', merge_partial(body, entry['body'])
+    return op, body
+
+
+def _guarded_actions(chunk, get_docs):
+    """Bulk actions replaying a chunk of entries without undoing newer writes.
+
+    Every write sent to the cluster carries WRITTEN_AT. Entries older than
+    the document's WRITTEN_AT are skipped; the others are folded into one
+    action per document, conditional on the document not changing in the
+    meantime (if_seq_no/if_primary_term, or a create for an index of a
+    missing document), so a 409 means a live write won. Returns (actions,
+    {key: entries folded}, keys of the conditional actions, entries skipped).
+    """
+    by_key = {}
+    for entry in chunk:
+        by_key.setdefault((entry['index'], entry['id']), []).append(entry)
+    ids = {}
+    for index, doc_id in by_key:
+        ids.setdefault(index, []).append(doc_id)
+    current = {}
+    for index, doc_ids in ids.items():
+        for doc_id, doc in get_docs(index, doc_ids, [WRITTEN_AT]).items():
+            current[(index, doc_id)] = doc
+
+    actions = []
+    folded = {}
+    guarded = set()
+    skipped = 0
+    for key, entries in by_key.items():
+        doc = current.get(key)
+        stamp = doc['_source'].get(WRITTEN_AT) if doc else None
+        fresh = [e for e in entries
+                 if e['op'] == 'create' or stamp is None or written_at(e.get('ts', 0)) > stamp]
+        skipped += len(entries) - len(fresh)
+        if not fresh:
+            continue
+        op, body = _fold(fresh)
+        stamped = written_at(fresh[-1].get('ts', 0))
+        action = {'_op_type': op, '_index': key[0], '_id': key[1]}
+        if op == 'delete':
+            if doc is None:
+                continue  # already gone
+        elif op == 'update':
+            action['doc'] = {**body, WRITTEN_AT: stamped}
+        else:
+            action['_source'] = {**body, WRITTEN_AT: stamped}
+            if op == 'index' and doc is None:
+                action['_op_type'] = 'create'
+                guarded.add(key)
+        if doc is not None and op != 'create':
+            action['if_seq_no'] = doc['_seq_no']
+            action['if_primary_term'] = doc['_primary_term']
+            guarded.add(key)
+        folded[key] = len(fresh)
+        actions.append(action)
+    return actions, folded, guarded, skipped
+
+
+# Shared instance for the whole worker process
+write_journal = WriteJournal()
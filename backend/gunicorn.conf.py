@@ -0,0 +1,22 @@
+# Gunicorn configuration for the Yookye backend
+#
+#   gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# Job status streams (/api/travel/jobs/<job_id>/events) stay open while a
+# search runs. With the default "sync" worker class every open stream would
+# occupy a whole worker process, so threaded workers are used instead: a
+# stream costs one mostly idle thread blocked on the job tracker. For very
+# large numbers of concurrent streams set GUNICORN_WORKER_CLASS=gevent
+# (requires `pip install gevent`).
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 3001)}"
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 64))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Streams send a heartbeat every SSE_HEARTBEAT_INTERVAL seconds and close
+# after SSE_MAX_STREAM_SECONDS, so the timeout only has to cover one of them.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
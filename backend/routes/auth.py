@@ -1,29 +1,29 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
-from flask_bcrypt import check_password_hash, generate_password_hash
 from marshmallow import Schema, fields, ValidationError
 from email_validator import validate_email, EmailNotValidError
 import uuid
 from datetime import datetime, timedelta
 
-from config.opensearch_client import opensearch_ops, OpenSearchOperations
+from config.opensearch_client import opensearch_ops, DocumentConflictError
+from services.token_revocation import revocation_cache
+from services.activity_buffer import activity_buffer
+from services.users import create_user, find_user_by_email
+from services.password_hasher import password_hasher, HasherBusyError, MAX_PASSWORD_BYTES
+from services.sessions import get_active_session, end_session, revoke_user_sessions
+from services.response_cache import response_cache
 
 auth_bp = Blueprint('auth', __name__)
 
 # JWT blacklist checker
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload['jti']
-    try:
-        # Check if token is in blacklist
-        opensearch_ops.get_document('blacklisted_tokens', jti)
-        return True  # Token is blacklisted
-    except:
-        return False  # Token is not blacklisted
+    return revocation_cache.is_revoked(jwt_payload['jti'])
 
 # Validation schemas
 class RegisterSchema(Schema):
     email = fields.Email(required=True)
-    password = fields.Str(required=True, validate=lambda x: len(x) >= 6)
+    password = fields.Str(required=True, validate=lambda x: (
+        6 <= len(x) and len(x.encode('utf-8')) <= MAX_PASSWORD_BYTES))
     name = fields.Str(required=True, validate=lambda x: len(x.strip()) > 0)
     username = fields.Str(required=True, validate=lambda x: len(x.strip()) > 0)
 
@@ -42,31 +42,14 @@ def register():
         return jsonify({'error': 'Validation error', 'details': err.messages}), 400
 
     try:
-        # Check if user already exists
-        search_result = opensearch_ops.search_documents(
-            'users',
-            query={'term': {'email': data['email']}},
-            size=1
-        )
-
-        if search_result['hits']['total']['value'] > 0:
+        # Create new user: the id derives from the normalized email and the
+        # write is an atomic create, so no existence check is needed
+        password_hash = password_hasher.hash_password(data['password'])
+        try:
+            user_id, _ = create_user(data['email'], password_hash, data['name'], data['username'])
+        except DocumentConflictError:
             return jsonify({'error': 'User already exists'}), 409
 
-        # Create new user
-        user_id = str(uuid.uuid4())
-        password_hash = generate_password_hash(data['password']).decode('utf-8')
-
-        user_data = {
-            'id': user_id,
-            'email': data['email'],
-            'password': password_hash,
-            'name': data['name'],
-            'username': data['username']
-        }
-
-        # Store user in OpenSearch
-        opensearch_ops.index_document('users', user_id, user_data)
-
         # Create tokens
         access_token = create_access_token(identity=user_id)
         refresh_token = create_refresh_token(identity=user_id)
@@ -83,6 +66,10 @@ def register():
             'refresh_token': refresh_token
         }), 201
 
+    except HasherBusyError as e:
+        response = jsonify({'error': 'Too many registration attempts, retry shortly'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
     except Exception as e:
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
 
@@ -100,28 +87,12 @@ def login():
         print(f"=== LOGIN ATTEMPT ===")
         print(f"Email provided: {data['email']}")
 
-        # Find user - try exact term search first
-        search_result = opensearch_ops.search_documents(
-            'users',
-            query={'term': {'email': data['email']}},
-            size=1
-        )
-
-        # If not found, try with match query (case insensitive)
-        if search_result['hits']['total']['value'] == 0:
-            print("Trying case-insensitive search...")
-            search_result = opensearch_ops.search_documents(
-                'users',
-                query={'match': {'email': data['email']}},
-                size=1
-            )
-
-
-        if search_result['hits']['total']['value'] == 0:
+        # Find user: a realtime get by the id derived from the email
+        user_doc = find_user_by_email(data['email'])
+        if user_doc is None:
             print("User not found!")
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        user_doc = search_result['hits']['hits'][0]
         user_id = user_doc['_id']
         user_data = user_doc['_source']
 
@@ -131,13 +102,20 @@ def login():
 
 
         # Try password verification
-        password_valid = check_password_hash(stored_hash, provided_password)
+        password_valid = password_hasher.check_password(stored_hash, provided_password)
         print(f"Password verification result: {password_valid}")
 
         if not password_valid:
             print("Password verification failed!")
             return jsonify({'error': 'Invalid credentials'}), 401
 
+        # Upgrade hashes made with another bcrypt cost, off the request path
+        if password_hasher.needs_rehash(stored_hash):
+            password_hasher.rehash_in_background(
+                provided_password,
+                lambda new_hash: opensearch_ops.update_document('users', user_id,
+                                                                {'password': new_hash}))
+
         # Create tokens with custom claims
         access_jti = str(uuid.uuid4())
         refresh_jti = str(uuid.uuid4())
@@ -151,8 +129,9 @@ def login():
             additional_claims={'jti': refresh_jti}
         )
 
-        # Create session record
-        session_id = str(uuid.uuid4())
+        # Create session record, keyed by the access token's jti so that
+        # validating it is a single get
+        session_id = access_jti
         session_data = {
             'session_id': session_id,
             'user_id': user_id,
@@ -166,6 +145,7 @@ def login():
             'is_active': True
         }
 
+        # Validation is a realtime get by id, so no refresh is needed here
         opensearch_ops.index_document('sessions', session_id, session_data)
 
         return jsonify({
@@ -181,6 +161,10 @@ def login():
             'session_id': session_id
         }), 200
 
+    except HasherBusyError as e:
+        response = jsonify({'error': 'Too many login attempts, retry shortly'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
     except Exception as e:
         print(f"Login exception: {e}")
         print(f"Exception type: {type(e)}")
@@ -194,7 +178,8 @@ def refresh():
         current_user_id = get_jwt_identity()
 
         # Verify user still exists
-        user_doc = opensearch_ops.get_document('users', current_user_id)
+        if opensearch_ops.get_document('users', current_user_id) is None:
+            return jsonify({'error': 'User not found'}), 404
 
         # Create new access token
         access_token = create_access_token(identity=current_user_id)
@@ -218,51 +203,23 @@ def get_profile():
         print(f"User ID: {current_user_id}")
         print(f"JWT Claims: {jwt_claims}")
 
-        # Check if token is blacklisted
+        # Revoked tokens are already rejected by @jwt_required (revocation cache)
         jti = jwt_claims.get('jti')
-        if jti:
-            try:
-                blacklist_doc = opensearch_ops.get_document('blacklisted_tokens', jti)
-                print(f"Token {jti} is blacklisted!")
-                return jsonify({'error': 'Invalid token'}), 401
-            except Exception as e:
-                # If index doesn't exist or token not found, it's not blacklisted
-                if "index_not_found_exception" in str(e) or "NotFoundError" in str(e):
-                    print(f"Token {jti} is not blacklisted (index may not exist yet)")
-                else:
-                    print(f"Error checking blacklist: {e}")
-                    print(f"Token {jti} is not blacklisted")
 
         # Validate session is still active
         if jti:
-            session_search = opensearch_ops.search_documents(
-                'sessions',
-                query={
-                    'bool': {
-                        'must': [
-                            {'term': {'access_token_jti': jti}},
-                            {'term': {'is_active': True}}
-                        ]
-                    }
-                },
-                size=1
-            )
-
-            print(f"Active sessions found: {session_search['hits']['total']['value']}")
-
-            if session_search['hits']['total']['value'] == 0:
+            session_doc = get_active_session(jti)
+            if session_doc is None:
                 print("No active session found!")
                 return jsonify({'error': 'Session expired or invalid'}), 401
 
-            # Update last activity
-            session_doc = session_search['hits']['hits'][0]
-            session_id = session_doc['_id']
-            opensearch_ops.update_document('sessions', session_id, {
-                'last_activity': datetime.utcnow().isoformat()
-            })
+            # Update last activity (written behind, in bulk)
+            activity_buffer.touch(session_doc['_id'], session_doc['_source'].get('last_activity'))
 
         # Get user data
         user_doc = opensearch_ops.get_document('users', current_user_id)
+        if user_doc is None:
+            return jsonify({'error': 'User not found'}), 404
         user_data = user_doc['_source']
 
         return jsonify({
@@ -295,9 +252,12 @@ def update_profile():
 
         # Update user
         opensearch_ops.update_document('users', current_user_id, update_data)
+        response_cache.invalidate(current_user_id)
 
         # Get updated user data
         user_doc = opensearch_ops.get_document('users', current_user_id)
+        if user_doc is None:
+            return jsonify({'error': 'User not found'}), 404
         user_data = user_doc['_source']
 
         return jsonify({
@@ -325,38 +285,13 @@ def logout():
         print(f"User ID: {current_user_id}")
         print(f"JWT ID: {jti}")
 
-        # Ensure blacklisted_tokens index exists
-        OpenSearchOperations.ensure_index_exists('blacklisted_tokens')
-        
-        # Add token to blacklist in OpenSearch
-        opensearch_ops.index_document('blacklisted_tokens', jti, {
-            'jti': jti,
-            'user_id': current_user_id,
-            'blacklisted_at': datetime.utcnow().isoformat()
-        })
-
-        # Deactivate user session
-        session_query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"user_id": current_user_id}},
-                        {"term": {"is_active": True}}
-                    ]
-                }
-            }
-        }
+        # Add token to blacklist in OpenSearch and in this worker's cache
+        revocation_cache.revoke(jti, current_user_id,
+                                expires_at=datetime.utcfromtimestamp(get_jwt()['exp']))
 
-        sessions_response = opensearch_ops.search_documents('sessions', session_query)
-        print(f"Active sessions found: {len(sessions_response['hits']['hits'])}")
-
-        for hit in sessions_response['hits']['hits']:
-            session_id = hit['_id']
-            print(f"Deactivating session: {session_id}")
-            opensearch_ops.update_document('sessions', session_id, {
-                'is_active': False,
-                'logout_at': datetime.utcnow().isoformat()
-            })
+        # Deactivate all of the user's sessions in one update by query
+        revoked = revoke_user_sessions(current_user_id)
+        print(f"Sessions deactivated: {revoked['sessions']}")
 
         print("Logout completed successfully")
         return jsonify({'message': 'Logged out successfully'}), 200
@@ -365,7 +300,25 @@ def logout():
         print(f"Logout error: {str(e)}")
         return jsonify({'error': 'Logout failed', 'details': str(e)}), 500
 
+@auth_bp.route('/logout-all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    """Log out everywhere: revoke every session of the user and its tokens"""
+    try:
+        current_user_id = get_jwt_identity()
+        jti = get_jwt()['jti']
+
+        revocation_cache.revoke(jti, current_user_id,
+                                expires_at=datetime.utcfromtimestamp(get_jwt()['exp']))
+        revoked = revoke_user_sessions(current_user_id, revoke_tokens=True)
 
+        return jsonify({
+            'message': 'Logged out from all sessions',
+            'revoked_sessions': revoked['sessions']
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': 'Logout failed', 'details': str(e)}), 500
 
 @auth_bp.route('/sessions', methods=['GET'])
 @jwt_required()
@@ -394,7 +347,7 @@ def get_active_sessions():
             sessions.append({
                 'session_id': session_data['session_id'],
                 'created_at': session_data['created_at'],
-                'last_activity': session_data['last_activity'],
+                'last_activity': activity_buffer.latest(hit['_id'], session_data['last_activity']),
                 'ip_address': session_data['ip_address'],
                 'user_agent': session_data.get('user_agent', '')[:100] + '...' if len(session_data.get('user_agent', '')) > 100 else session_data.get('user_agent', '')
             })
@@ -409,22 +362,20 @@ def get_active_sessions():
 
 @auth_bp.route('/sessions/<session_id>', methods=['DELETE'])
 @jwt_required()
-def revoke_session():
+def revoke_session(session_id):
     """Revoke a specific session"""
     try:
         current_user_id = get_jwt_identity()
-        session_id = request.view_args['session_id']
 
         # Verify session belongs to current user
         session_doc = opensearch_ops.get_document('sessions', session_id)
+        if session_doc is None:
+            return jsonify({'error': 'Session not found'}), 404
         if session_doc['_source']['user_id'] != current_user_id:
             return jsonify({'error': 'Unauthorized'}), 403
 
-        # Deactivate session
-        opensearch_ops.update_document('sessions', session_id, {
-            'is_active': False,
-            'revoked_at': datetime.utcnow().isoformat()
-        })
+        # Deactivate session and revoke its tokens
+        end_session(session_doc)
 
         return jsonify({'message': 'Session revoked successfully'}), 200
 
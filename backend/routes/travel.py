@@ -1,18 +1,89 @@
 import requests
 from datetime import datetime
 from marshmallow import Schema, fields, ValidationError
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import urllib3
+import binascii
+import base64
 import ssl
 import os
+import json
+import time
 import uuid
 
 from config.opensearch_client import opensearch_ops
+from config.travel_api_client import travel_api_client, travel_api_tokens
+from services.job_tracker import job_tracker, job_status_of, JobNotFoundError, TERMINAL_STATUSES
+from services.job_results import package_pricing
+from services.fieldsets import FieldSet
+from services.response_cache import cached_response, response_cache
 
 # Disable SSL warnings for development
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Server-Sent Events: heartbeat period and maximum stream lifetime (seconds).
+# Browsers reconnect automatically when a stream ends before the job does.
+SSE_HEARTBEAT_INTERVAL = int(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+
+# /my-packages page size: default when ?limit= is missing, and upper bound
+PACKAGES_PAGE_SIZE = int(os.getenv('PACKAGES_PAGE_SIZE', 50))
+PACKAGES_MAX_PAGE_SIZE = int(os.getenv('PACKAGES_MAX_PAGE_SIZE', 100))
+
+# /my-packages orders; job_id and position break ties between packages of one result
+_PACKAGE_TIEBREAK = [{'job_id': {'order': 'asc'}}, {'position': {'order': 'asc'}}]
+PACKAGE_SORTS = {
+    'recent': [{'created_at': {'order': 'desc'}}] + _PACKAGE_TIEBREAK,
+    'price_asc': [{'total_price': {'order': 'asc'}}, {'created_at': {'order': 'desc'}}] + _PACKAGE_TIEBREAK,
+    'price_desc': [{'total_price': {'order': 'desc'}}, {'created_at': {'order': 'desc'}}] + _PACKAGE_TIEBREAK
+}
+
+# Travel fields returned by /my-travels (?fields=, ?view=)
+TRAVEL_FIELDS = FieldSet({
+    'id': [],
+    'status': ['status'],
+    'created_at': ['created_at'],
+    'passions': ['passions'],
+    'travelers': ['travelers'],
+    'budget': ['budget'],
+    'contact_email': ['contact_email']
+}, summary=['id', 'status', 'created_at', 'passions'])
+
+# Package fields returned by /my-packages and /packages/search (?fields=, ?view=)
+PACKAGE_FIELDS = FieldSet({
+    'id': [],
+    'package_id': ['package_id'],
+    'job_id': ['job_id'],
+    'travel_id': ['request.travel_id'],
+    'destinations': ['destinations'],
+    'hotels': ['hotels_selezionati'],
+    'experiences': ['esperienze_selezionate'],
+    'total_price': ['total_price'],
+    'nights': ['nights'],
+    'city_costs': ['city_costs'],
+    'status': ['status'],
+    'created_at': ['created_at'],
+    'original_request': ['request.passions', 'request.travelers', 'request.dates']
+}, summary=['id', 'package_id', 'job_id', 'travel_id', 'destinations', 'total_price',
+            'nights', 'status', 'created_at'])
+
+# User ids allowed to search every package (/packages/search?scope=all)
+PACKAGE_SEARCH_ADMINS = {user_id.strip() for user_id in os.getenv('PACKAGE_SEARCH_ADMINS', '').split(',')
+                         if user_id.strip()}
+
+# Facet counts returned by /packages/search
+PACKAGE_FACETS = {
+    'destinations': {'terms': {'field': 'destinations', 'size': 50}},
+    'experience_categories': {'terms': {'field': 'experience_categories', 'size': 50}},
+    'price': {'range': {'field': 'total_price', 'ranges': [
+        {'to': 500}, {'from': 500, 'to': 1000}, {'from': 1000, 'to': 2000}, {'from': 2000}
+    ]}},
+    'nights': {'range': {'field': 'nights', 'ranges': [
+        {'to': 4}, {'from': 4, 'to': 8}, {'from': 8, 'to': 15}, {'from': 15}
+    ]}}
+}
+
 travel_bp = Blueprint('travel', __name__)
 
 
@@ -139,208 +210,26 @@ def map_form_data_to_external_format(form_data):
     }
 
 
-def save_travel_packages(job_id, packages_data, user_id=None):
-    """Save travel packages received from external API to database"""
-    try:
-        packages_saved = 0
-        
-        for package in packages_data:
-            package_id = str(uuid.uuid4())
-            
-            # Prepare package data for storage
-            package_doc = {
-                'job_id': job_id,
-                'user_id': user_id,
-                'package_id': package.get('id_pacchetto', f'package_{packages_saved + 1}'),
-                'hotels_selezionati': package.get('hotels_selezionati', {}),
-                'esperienze_selezionate': package.get('esperienze_selezionate', {}),
-                'status': 'available',
-                'created_at': datetime.utcnow().isoformat(),
-                'updated_at': datetime.utcnow().isoformat()
-            }
-            
-            # Store package in OpenSearch
-            opensearch_ops.index_document('travel_packages', package_id, package_doc)
-            packages_saved += 1
-            
-            print(f"[DEBUG] Saved package {package_doc['package_id']} with ID {package_id} for user {user_id}")
-        
-        return packages_saved
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to save travel packages: {str(e)}")
-        return 0
-
-    # Map passions to interests
-    passions = form_data.get('passions', [])
-    interessi = {
-        "storia_e_arte": {
-            "musei_e_gallerie": "Musei e gallerie" in passions,
-            "siti_archeologici": "Siti archeologici" in passions,
-            "monumenti_e_architettura": "Monumenti e architetture" in passions
-        },
-        "Food_&_wine": {
-            "visite_alle_cantine":
-            "Visite alle cantine" in passions,
-            "corsi_di_cucina":
-            "Corsi di cucina" in passions,
-            "soggiorni_nella_wine_country":
-            "Soggiorni nella Wine Country" in passions
-        },
-        "vacanze_attive": {
-            "trekking_di_piu_giorni": "Trekking tour" in passions,
-            "tour_in_e_bike_di_piu_giorni": "Tour in e-bike" in passions,
-            "sci_snowboard_di_piu_giorni": "Sci/snowboard" in passions
-        },
-        "vita_locale": "Local Life" in passions,
-        "salute_e_benessere": "Salute & Benessere" in passions
-    }
-
-    # Map traveler type
-    traveler_type = form_data.get('traveler_type', '')
-    tipologia_viaggiatore = {
-        "family": traveler_type == 'famiglia',
-        "amici": traveler_type == 'amici',
-        "coppia": traveler_type == 'coppia',
-        "single": False  # Not explicitly in our form
-    }
-
-    # Map travel pace
-    pace = form_data.get('travel_pace', '')
-    ritmo_ideale = {
-        "veloce": pace == 'fast',
-        "moderato": pace == 'moderate',
-        "rilassato": pace == 'relaxed'
-    }
-
-    return {
-        "trasporti": trasporti,
-        "luoghi_da_non_perdere": luoghi_da_non_perdere,
-        "viaggiatori": viaggiatori,
-        "date": date,
-        "budget_per_persona_giorno": budget_per_persona_giorno,
-        "sistemazione": sistemazione,
-        "esigenze_particolari": form_data.get('special_services', ''),
-        "interessi": interessi,
-        "tipologia_viaggiatore": tipologia_viaggiatore,
-        "ritmo_ideale": ritmo_ideale
-    }
-
-
 def authenticate_external_api():
-    """Authenticate with external travel API and return access token"""
+    """Return a bearer token for the external travel API (cached per process)"""
     try:
-        # Get configuration from environment
-        api_url = os.getenv('TRAVEL_API_URL')
-        api_username = os.getenv('TRAVEL_API_USERNAME')
-        api_password = os.getenv('TRAVEL_API_PASSWORD')
-
-        print(f"[DEBUG] External API Configuration:")
-        print(f"[DEBUG] API URL: {api_url}")
-        print(f"[DEBUG] API Username: {api_username}")
+        access_token = travel_api_tokens.get_token()
         print(
-            f"[DEBUG] API Password: {'*' * len(api_password) if api_password else 'None'}"
+            f"[DEBUG] External API token: {'***' + access_token[-10:] if access_token else 'None'}"
         )
-
-        if not all([api_url, api_username, api_password]):
-            raise Exception("External API configuration is missing")
-
-        # Prepare authentication data
-        auth_data = {'username': api_username, 'password': api_password}
-
-        # Make authentication request
-        auth_url = f"{api_url}/api/auth/token"
-
-        # Make authentication request with SSL verification disabled for development
-        # In production, you should use proper SSL certificates
-        verify_ssl = not api_url.startswith('https://localhost')
-
-        print(f"[DEBUG] Making authentication request to: {auth_url}")
-        print(f"[DEBUG] Request method: POST")
-        print(
-            f"[DEBUG] Request headers: {{'Content-Type': 'application/x-www-form-urlencoded'}}"
-        )
-        print(
-            f"[DEBUG] Request data: {{'username': '{api_username}', 'password': '***'}}"
-        )
-        print(f"[DEBUG] SSL verification: {verify_ssl}")
-        print(f"[DEBUG] Timeout: 10 seconds")
-
-        response = requests.post(
-            auth_url,
-            data=auth_data,  # OAuth2PasswordRequestForm expects form data
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            timeout=10,
-            verify=verify_ssl)
-
-        print(f"[DEBUG] Response received:")
-        print(f"[DEBUG] Status code: {response.status_code}")
-        print(f"[DEBUG] Response headers: {dict(response.headers)}")
-        print(f"[DEBUG] Response content: {response.text}")
-
-        if response.status_code == 401:
-            print(f"[DEBUG] Authentication failed: Invalid credentials")
-            raise Exception("Invalid credentials for external API")
-
-        if not response.ok:
-            print(
-                f"[DEBUG] Authentication failed: HTTP {response.status_code}")
-            raise Exception(
-                f"External API authentication failed: {response.status_code}")
-
-        try:
-            token_data = response.json()
-            print(f"[DEBUG] Token data received: {token_data}")
-            access_token = token_data.get('access_token')
-            print(
-                f"[DEBUG] Access token extracted: {'***' + access_token[-10:] if access_token else 'None'}"
-            )
-            return access_token
-        except ValueError as e:
-            print(f"[DEBUG] Failed to parse JSON response: {str(e)}")
-            raise Exception(
-                f"Invalid JSON response from external API: {str(e)}")
-
-    except requests.exceptions.ConnectTimeout:
-        print(f"[DEBUG] Connection timeout to {auth_url}")
-        raise Exception(f"Connection timeout to external API: {auth_url}")
-    except requests.exceptions.ConnectionError as e:
-        print(f"[DEBUG] Connection error: {str(e)}")
-        raise Exception(f"Failed to connect to external API: {str(e)}")
-    except requests.exceptions.RequestException as e:
-        print(f"[DEBUG] Request exception: {str(e)}")
-        raise Exception(f"Failed to connect to external API: {str(e)}")
+        return access_token
     except Exception as e:
-        print(f"[DEBUG] Unexpected error: {str(e)}")
+        print(f"[DEBUG] External API authentication error: {str(e)}")
         raise Exception(f"External API authentication error: {str(e)}")
 
 
-def send_search_request_to_external_api(access_token, search_data):
+def send_search_request_to_external_api(search_data):
     """Send search request to external API and return job ID"""
     try:
-        api_url = os.getenv('TRAVEL_API_URL')
-        if not api_url:
-            raise Exception("External API URL not configured")
-
-        search_url = f"{api_url}/api/search"
-
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-
-        print(f"[DEBUG] Sending search request to: {search_url}")
-        print(f"[DEBUG] Request headers: {headers}")
+        print(f"[DEBUG] Sending search request to: /api/search")
         print(f"[DEBUG] Request body: {search_data}")
 
-        # Make search request with SSL verification disabled for development
-        verify_ssl = not api_url.startswith('https://localhost')
-
-        response = requests.post(search_url,
-                                 json=search_data,
-                                 headers=headers,
-                                 timeout=30,
-                                 verify=verify_ssl)
+        response = travel_api_client.post('/api/search', json=search_data)
 
         print(f"[DEBUG] Search response status: {response.status_code}")
         print(f"[DEBUG] Search response content: {response.text}")
@@ -370,7 +259,7 @@ def send_search_request_to_external_api(access_token, search_data):
             raise Exception(f"Invalid JSON response from search API: {str(e)}")
 
     except requests.exceptions.ConnectTimeout:
-        print(f"[DEBUG] Search request timeout to {search_url}")
+        print(f"[DEBUG] Search request timeout")
         raise Exception(f"Search request timeout to external API")
     except requests.exceptions.ConnectionError as e:
         print(f"[DEBUG] Search request connection error: {str(e)}")
@@ -443,7 +332,7 @@ def submit_travel_form():
         print(f"[DEBUG] Sending search request to external API...")
         try:
             job_id = send_search_request_to_external_api(
-                external_token, external_search_data)
+                external_search_data)
             print(f"[DEBUG] Search job started successfully with ID: {job_id}")
         except Exception as e:
             print(f"[DEBUG] External search request failed: {str(e)}")
@@ -501,8 +390,13 @@ def submit_travel_form():
             'updated_at': datetime.utcnow().isoformat()
         }
 
-        # Store in OpenSearch
-        opensearch_ops.index_document('travels', travel_id, travel_data)
+        # Store in OpenSearch, searchable before the client polls the job
+        # (job ids are only followed once they are found in travels)
+        opensearch_ops.index_document('travels', travel_id, travel_data, refresh='wait_for')
+        response_cache.invalidate(user_id)
+
+        # Start following the external job in the background
+        job_tracker.track(job_id, travel_id)
 
         # TODO: In a real application, you would:
         # 1. Send email notification to local experts
@@ -533,29 +427,36 @@ def submit_travel_form():
 
 @travel_bp.route('/my-travels', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_user_travels():
-    """Get user's travel requests"""
+    """Get user's travel requests (?fields= or ?view=summary|full select
+    the fields of each travel)"""
     try:
         user_id = get_jwt_identity()
 
-        # Search for user's travels
+        try:
+            selected = TRAVEL_FIELDS.selected(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Search for user's travels, without the stored external request
         search_result = opensearch_ops.search_documents(
             'travels', query={'term': {
                 'user_id': user_id
-            }}, size=50)
+            }}, size=50, source=TRAVEL_FIELDS.source(selected))
 
         travels = []
         for hit in search_result['hits']['hits']:
             travel_data = hit['_source']
-            travels.append({
+            travels.append(TRAVEL_FIELDS.project({
                 'id': hit['_id'],
-                'status': travel_data['status'],
-                'created_at': travel_data['created_at'],
-                'passions': travel_data['passions'],
-                'travelers': travel_data['travelers'],
+                'status': travel_data.get('status'),
+                'created_at': travel_data.get('created_at'),
+                'passions': travel_data.get('passions'),
+                'travelers': travel_data.get('travelers'),
                 'budget': travel_data.get('budget'),
-                'contact_email': travel_data['contact_email']
-            })
+                'contact_email': travel_data.get('contact_email')
+            }, selected))
 
         return jsonify({'travels': travels, 'total': len(travels)}), 200
 
@@ -575,6 +476,8 @@ def get_travel_details(travel_id):
 
         # Get travel document
         travel_doc = opensearch_ops.get_document('travels', travel_id)
+        if travel_doc is None:
+            return jsonify({'error': 'Travel request not found'}), 404
         travel_data = travel_doc['_source']
 
         # Check if user owns this travel request
@@ -584,8 +487,6 @@ def get_travel_details(travel_id):
         return jsonify({'travel': {'id': travel_id, **travel_data}}), 200
 
     except Exception as e:
-        if 'not found' in str(e).lower():
-            return jsonify({'error': 'Travel request not found'}), 404
         return jsonify({
             'error': 'Failed to get travel details',
             'details': str(e)
@@ -613,6 +514,8 @@ def update_travel_status(travel_id):
 
         # Get travel document
         travel_doc = opensearch_ops.get_document('travels', travel_id)
+        if travel_doc is None:
+            return jsonify({'error': 'Travel request not found'}), 404
         travel_data = travel_doc['_source']
 
         # Update status
@@ -622,6 +525,7 @@ def update_travel_status(travel_id):
                 'updated_at': datetime.utcnow().isoformat(),
                 'updated_by': user_id
             })
+        response_cache.invalidate(travel_data.get('user_id'))
 
         return jsonify({
             'message': 'Travel status updated successfully',
@@ -630,8 +534,6 @@ def update_travel_status(travel_id):
         }), 200
 
     except Exception as e:
-        if 'not found' in str(e).lower():
-            return jsonify({'error': 'Travel request not found'}), 404
         return jsonify({
             'error': 'Failed to update travel status',
             'details': str(e)
@@ -640,32 +542,25 @@ def update_travel_status(travel_id):
 
 @travel_bp.route('/statistics', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_travel_statistics():
     """Get travel statistics (for dashboard)"""
     try:
         user_id = get_jwt_identity()
 
-        # Get user's travels
-        search_result = opensearch_ops.search_documents(
-            'travels', query={'term': {
-                'user_id': user_id
-            }}, size=100)
-
-        travels = [hit['_source'] for hit in search_result['hits']['hits']]
-
-        # Calculate statistics
-        total_travels = len(travels)
-        status_counts = {}
-
-        for travel in travels:
-            status = travel.get('status', 'unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
-
-        # Most popular passions
-        passion_counts = {}
-        for travel in travels:
-            for passion in travel.get('passions', []):
-                passion_counts[passion] = passion_counts.get(passion, 0) + 1
+        # Counted by the index: no travel documents are transferred
+        result = opensearch_ops.aggregate(
+            'travels',
+            query={'term': {'user_id': user_id}},
+            aggs={
+                'statuses': {'terms': {'field': 'status', 'missing': 'unknown', 'size': 50}},
+                'passions': {'terms': {'field': 'passions', 'size': 5}}
+            })
+        total_travels = result['total']
+        status_counts = {bucket['key']: bucket['doc_count']
+                         for bucket in result['aggregations']['statuses']['buckets']}
+        passion_counts = {bucket['key']: bucket['doc_count']
+                          for bucket in result['aggregations']['passions']['buckets']}
 
         return jsonify({
             'statistics': {
@@ -674,10 +569,7 @@ def get_travel_statistics():
                 'status_breakdown':
                 status_counts,
                 'popular_passions':
-                dict(
-                    sorted(passion_counts.items(),
-                           key=lambda x: x[1],
-                           reverse=True)[:5])
+                passion_counts
             }
         }), 200
 
@@ -690,49 +582,21 @@ def get_travel_statistics():
 
 @travel_bp.route('/poll-job/<job_id>', methods=['GET'])
 def poll_job_status(job_id):
-    """Poll external API for job status"""
+    """Return the latest known job status from the background job tracker"""
     try:
-        # Get fresh token for the request
-        external_token = authenticate_external_api()
-        
-        api_url = os.getenv('TRAVEL_API_URL')
-        if not api_url:
-            raise Exception("External API URL not configured")
-
-        status_url = f"{api_url}/api/search/{job_id}"
-        
-        headers = {
-            'Authorization': f'Bearer {external_token}',
-            'Content-Type': 'application/json'
-        }
-
-        print(f"[DEBUG] Polling job status for job_id: {job_id}")
-        print(f"[DEBUG] Status URL: {status_url}")
-
-        # Make status request with SSL verification disabled for development
-        verify_ssl = not api_url.startswith('https://localhost')
-
-        response = requests.get(status_url,
-                                headers=headers,
-                                timeout=30,
-                                verify=verify_ssl)
-
-        print(f"[DEBUG] Status response: {response.status_code}")
-        print(f"[DEBUG] Status content: {response.text}")
+        if job_tracker.track(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        status_data, retry_after, error = job_tracker.get_status(job_id)
 
-        if response.status_code == 401:
-            raise Exception("Authentication failed for status request")
-
-        if not response.ok:
-            raise Exception(f"Status request failed: {response.status_code} - {response.text}")
+        if status_data is None:
+            if error:
+                raise Exception(error)
+            # Not polled yet: tell the client to come back shortly
+            status_data = {'job_id': job_id, 'status': 'PENDING'}
 
-        try:
-            status_data = response.json()
-            return jsonify(status_data), 200
-
-        except ValueError as e:
-            print(f"[DEBUG] Failed to parse status response JSON: {str(e)}")
-            raise Exception(f"Invalid JSON response from status API: {str(e)}")
+        response = jsonify(status_data)
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 200
 
     except Exception as e:
         print(f"[DEBUG] Job status polling error: {str(e)}")
@@ -742,79 +606,61 @@ def poll_job_status(job_id):
         }), 500
 
 
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@travel_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream job status transitions and the final result (Server-Sent Events)"""
+    if job_tracker.track(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        version, status_data = -1, None
+
+        while time.monotonic() < deadline:
+            new_version, new_status = job_tracker.wait_for_change(
+                job_id, version, timeout=SSE_HEARTBEAT_INTERVAL)
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version, status_data = new_version, new_status
+            if status_data is not None:
+                yield sse_event('status', status_data)
+            if job_status_of(status_data) in TERMINAL_STATUSES:
+                break
+        else:
+            return  # stream lifetime exceeded, the browser will reconnect
+
+        if job_status_of(status_data) == 'COMPLETED':
+            try:
+                yield sse_event('result', job_tracker.get_result(job_id))
+            except Exception as e:
+                yield sse_event('failure', {'error': 'Failed to get job result', 'details': str(e)})
+        else:
+            yield sse_event('failure', {'error': 'Job failed', 'details': status_data})
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # disable proxy buffering (nginx)
+    })
+
+
 @travel_bp.route('/get-job-result/<job_id>', methods=['GET'])
 def get_job_result(job_id):
     """Get job result from external API when completed"""
     try:
-        # Get fresh token for the request
-        external_token = authenticate_external_api()
-        
-        api_url = os.getenv('TRAVEL_API_URL')
-        if not api_url:
-            raise Exception("External API URL not configured")
-
-        result_url = f"{api_url}/api/search/{job_id}/result"
-        
-        headers = {
-            'Authorization': f'Bearer {external_token}',
-            'Content-Type': 'application/json'
-        }
-
         print(f"[DEBUG] Getting job result for job_id: {job_id}")
-        print(f"[DEBUG] Result URL: {result_url}")
-
-        # Make result request with SSL verification disabled for development
-        verify_ssl = not api_url.startswith('https://localhost')
 
-        response = requests.get(result_url,
-                                headers=headers,
-                                timeout=30,
-                                verify=verify_ssl)
-
-        print(f"[DEBUG] Result response: {response.status_code}")
-        print(f"[DEBUG] Result content: {response.text}")
-
-        if response.status_code == 401:
-            raise Exception("Authentication failed for result request")
-
-        if not response.ok:
-            raise Exception(f"Result request failed: {response.status_code} - {response.text}")
-
-        try:
-            result_data = response.json()
-            
-            # Log the result as requested
-            print(f"[INFO] JOB RESULT RECEIVED:")
-            print(f"[INFO] Job ID: {job_id}")
-            print(f"[INFO] Result Data: {result_data}")
-            
-            # Get user_id from the travel request associated with this job
-            user_id = None
-            try:
-                # Find the travel request with this external_job_id
-                travels_result = opensearch_ops.search_documents(
-                    'travels',
-                    query={'term': {'external_job_id': job_id}},
-                    size=1
-                )
-                if travels_result['hits']['total']['value'] > 0:
-                    travel_data = travels_result['hits']['hits'][0]['_source']
-                    user_id = travel_data.get('user_id')
-                    print(f"[DEBUG] Found user_id {user_id} for job {job_id}")
-            except Exception as e:
-                print(f"[ERROR] Failed to find user for job {job_id}: {str(e)}")
-            
-            # Save travel packages to database
-            if isinstance(result_data, list) and result_data:
-                packages_saved = save_travel_packages(job_id, result_data, user_id)
-                print(f"[INFO] Saved {packages_saved} travel packages for job {job_id} and user {user_id}")
-            
-            return jsonify(result_data), 200
-
-        except ValueError as e:
-            print(f"[DEBUG] Failed to parse result response JSON: {str(e)}")
-            raise Exception(f"Invalid JSON response from result API: {str(e)}")
+        result_data = job_tracker.get_result(job_id)
+        return jsonify(result_data), 200
 
+    except JobNotFoundError:
+        return jsonify({'error': 'Job not found'}), 404
     except Exception as e:
         print(f"[DEBUG] Job result retrieval error: {str(e)}")
         return jsonify({
@@ -910,85 +756,46 @@ def get_destinations():
 
 @travel_bp.route('/my-packages', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_user_packages():
-    """Get user's travel packages"""
+    """Get user's travel packages, most recent first.
+
+    One query on travel_packages filtered by user_id: the summary of the
+    originating request and the price fields are stored on every package
+    at ingest. ?sort=price_asc|price_desc orders by total price and
+    ?destination= keeps the packages that visit a city. Pages are chained
+    with the opaque next_cursor returned with each full page. ?fields= or
+    ?view=summary|full select the fields of each package.
+    """
     try:
         user_id = get_jwt_identity()
 
-        # Get user's travels to find associated job IDs
-        travels_result = opensearch_ops.search_documents(
-            'travels', 
-            query={'term': {'user_id': user_id}}, 
-            size=100
-        )
+        try:
+            sort, limit, search_after = package_page_args()
+            selected = PACKAGE_FIELDS.selected(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        job_ids = []
-        travels_map = {}
-        for hit in travels_result['hits']['hits']:
-            travel_data = hit['_source']
-            external_job_id = travel_data.get('external_job_id')
-            if external_job_id:
-                job_ids.append(external_job_id)
-                travels_map[external_job_id] = {
-                    'travel_id': hit['_id'],
-                    'travel_data': travel_data
-                }
-
-        if not job_ids:
-            return jsonify({'packages': [], 'total': 0}), 200
-
-        # Search for packages associated with user's job IDs or directly with user_id
-        should_clauses = [{'term': {'job_id': job_id}} for job_id in job_ids]
-        should_clauses.append({'term': {'user_id': user_id}})
-        
-        packages_query = {
-            'bool': {
-                'should': should_clauses
-            }
-        }
+        filters = [{'term': {'user_id': user_id}}]
+        destination = request.args.get('destination')
+        if destination:
+            filters.append({'term': {'destinations': destination}})
 
         packages_result = opensearch_ops.search_documents(
             'travel_packages',
-            query=packages_query,
-            size=100
+            query={'bool': {'filter': filters}},
+            size=limit,
+            sort=sort,
+            search_after=search_after,
+            source=PACKAGE_FIELDS.source(selected)
         )
 
-        packages = []
-        for hit in packages_result['hits']['hits']:
-            package_data = hit['_source']
-            job_id = package_data['job_id']
-            
-            # Get associated travel info
-            travel_info = travels_map.get(job_id, {})
-            
-            # Calculate total price
-            total_price = calculate_package_price(package_data)
-            
-            # Get destinations from hotels
-            destinations = list(package_data.get('hotels_selezionati', {}).keys())
-            
-            packages.append({
-                'id': hit['_id'],
-                'package_id': package_data['package_id'],
-                'job_id': job_id,
-                'travel_id': travel_info.get('travel_id'),
-                'destinations': destinations,
-                'hotels': package_data.get('hotels_selezionati', {}),
-                'experiences': package_data.get('esperienze_selezionate', {}),
-                'total_price': total_price,
-                'status': package_data.get('status', 'available'),
-                'created_at': package_data.get('created_at'),
-                'original_request': {
-                    'passions': travel_info.get('travel_data', {}).get('passions', []),
-                    'travelers': travel_info.get('travel_data', {}).get('travelers', {}),
-                    'dates': travel_info.get('travel_data', {}).get('dates', {})
-                }
-            })
-
-        # Sort by creation date (most recent first)
-        packages.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-
-        return jsonify({'packages': packages, 'total': len(packages)}), 200
+        hits = packages_result['hits']['hits']
+        return jsonify({
+            'packages': [package_response(hit, selected) for hit in hits],
+            'total': packages_result['hits']['total']['value'],
+            'next_cursor': next_cursor(hits, limit)
+        }), 200
 
     except Exception as e:
         return jsonify({
@@ -997,36 +804,166 @@ def get_user_packages():
         }), 500
 
 
-def calculate_package_price(package_data):
-    """Calculate total price for a travel package"""
+@travel_bp.route('/packages/search', methods=['GET'])
+@jwt_required()
+def search_packages():
+    """Search travel packages with filters and facet counts.
+
+    Filters (all optional, repeatable ones are ORed): destination,
+    category (experience category), min_price / max_price, min_nights /
+    max_nights. The facets count the matching packages per destination,
+    experience category, price range and nights range, computed in the
+    same request as the page. Users search their own packages; users in
+    PACKAGE_SEARCH_ADMINS may pass ?scope=all to search every package.
+    Sorting, pagination and field selection work like /my-packages.
+    """
     try:
-        total_price = 0
-        
-        # Sum hotel prices
-        hotels = package_data.get('hotels_selezionati', {})
-        for city, hotel in hotels.items():
-            daily_price = hotel.get('daily_prices', 0)
-            if isinstance(daily_price, (int, float)):
-                # Calculate nights between check-in and check-out
-                checkin = hotel.get('checkin', '')
-                checkout = hotel.get('checkout', '')
-                
-                if checkin and checkout:
-                    try:
-                        from datetime import datetime
-                        checkin_date = datetime.strptime(checkin, '%d/%m/%Y')
-                        checkout_date = datetime.strptime(checkout, '%d/%m/%Y')
-                        nights = (checkout_date - checkin_date).days
-                        total_price += daily_price * nights
-                    except:
-                        # Default to 1 night if date parsing fails
-                        total_price += daily_price
-                else:
-                    total_price += daily_price
-        
-        return round(total_price, 2)
-        
+        user_id = get_jwt_identity()
+
+        if request.args.get('scope', 'own') not in ('own', 'all'):
+            return jsonify({'error': 'Invalid scope, expected own or all'}), 400
+        search_all = request.args.get('scope') == 'all'
+        if search_all and user_id not in PACKAGE_SEARCH_ADMINS:
+            return jsonify({'error': 'Not allowed to search every package'}), 403
+
+        try:
+            sort, limit, search_after = package_page_args()
+            selected = PACKAGE_FIELDS.selected(request.args)
+            filters = package_search_filters()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not search_all:
+            filters.insert(0, {'term': {'user_id': user_id}})
+
+        packages_result = opensearch_ops.search_documents(
+            'travel_packages',
+            query={'bool': {'filter': filters}},
+            size=limit,
+            sort=sort,
+            search_after=search_after,
+            aggs=PACKAGE_FACETS,
+            source=PACKAGE_FIELDS.source(selected)
+        )
+
+        hits = packages_result['hits']['hits']
+        aggregations = packages_result.get('aggregations', {})
+        facets = {}
+        for name, aggregation in aggregations.items():
+            facets[name] = [{
+                'value': bucket['key'],
+                'count': bucket['doc_count'],
+                **{bound: bucket[bound] for bound in ('from', 'to') if bound in bucket}
+            } for bucket in aggregation['buckets']]
+
+        return jsonify({
+            'packages': [package_response(hit, selected) for hit in hits],
+            'total': packages_result['hits']['total']['value'],
+            'next_cursor': next_cursor(hits, limit),
+            'facets': facets
+        }), 200
+
     except Exception as e:
-        print(f"[ERROR] Failed to calculate package price: {str(e)}")
-        return 0
+        return jsonify({
+            'error': 'Failed to search travel packages',
+            'details': str(e)
+        }), 500
 
+
+def package_page_args():
+    """(sort, limit, search_after) of a package listing request.
+    Raises ValueError for invalid parameters."""
+    sort_by = request.args.get('sort', 'recent')
+    if sort_by not in PACKAGE_SORTS:
+        raise ValueError(f"Invalid sort, expected one of {', '.join(PACKAGE_SORTS)}")
+    sort = PACKAGE_SORTS[sort_by]
+    try:
+        limit = min(max(int(request.args.get('limit', PACKAGES_PAGE_SIZE)), 1),
+                    PACKAGES_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('Invalid limit')
+    search_after = decode_cursor(request.args.get('cursor'))
+    if search_after is not None and len(search_after) != len(sort):
+        raise ValueError('Cursor does not match the sort')
+    return sort, limit, search_after
+
+
+def package_search_filters():
+    """Filter clauses of a package search request. Raises ValueError for
+    invalid numbers."""
+    filters = []
+    for param, field in (('destination', 'destinations'), ('category', 'experience_categories')):
+        values = [v for v in request.args.getlist(param) if v]
+        if param == 'category':
+            values = [v.strip().lower() for v in values]
+        if values:
+            filters.append({'terms': {field: values}})
+    for field, low, high in (('total_price', 'min_price', 'max_price'),
+                             ('nights', 'min_nights', 'max_nights')):
+        bounds = {}
+        for param, op in ((low, 'gte'), (high, 'lte')):
+            if request.args.get(param):
+                try:
+                    bounds[op] = float(request.args[param])
+                except ValueError:
+                    raise ValueError(f"Invalid {param}")
+        if bounds:
+            filters.append({'range': {field: bounds}})
+    return filters
+
+
+def package_response(hit, selected):
+    """Package as returned by the listing endpoints, with the selected fields
+    (hit holds only the _source fields they need)"""
+    package_data = hit['_source']
+    original_request = package_data.get('request') or {}
+    hotels = package_data.get('hotels_selezionati', {})
+
+    # Packages saved before the price fields existed, when hotels were fetched
+    if package_data.get('total_price') is None and 'hotels_selezionati' in package_data:
+        package_data = {**package_data, **package_pricing(hotels)}
+
+    return PACKAGE_FIELDS.project({
+        'id': hit['_id'],
+        'package_id': package_data.get('package_id'),
+        'job_id': package_data.get('job_id'),
+        'travel_id': original_request.get('travel_id'),
+        'destinations': package_data.get('destinations', []),
+        'hotels': hotels,
+        'experiences': package_data.get('esperienze_selezionate', {}),
+        'total_price': package_data.get('total_price'),
+        'nights': package_data.get('nights'),
+        'city_costs': package_data.get('city_costs', []),
+        'status': package_data.get('status', 'available'),
+        'created_at': package_data.get('created_at'),
+        'original_request': {
+            'passions': original_request.get('passions', []),
+            'travelers': original_request.get('travelers', {}),
+            'dates': original_request.get('dates', {})
+        }
+    }, selected)
+
+
+def next_cursor(hits, limit):
+    """Cursor of the next page, None after the last one"""
+    if len(hits) == limit and 'sort' in hits[-1]:
+        return encode_cursor(hits[-1]['sort'])
+    return None
+
+
+def encode_cursor(sort_values):
+    """Opaque pagination cursor for the sort values of the last hit"""
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Sort values of a cursor from encode_cursor, None without a cursor.
+    Raises ValueError for a malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (UnicodeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(sort_values, list):
+        raise ValueError("Invalid cursor")
+    return sort_values
@@ -1,12 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import Schema, fields, ValidationError
 from datetime import datetime
+import json
+import zlib
 
 from config.opensearch_client import opensearch_ops
+from services.fieldsets import FieldSet
+from services.response_cache import cached_response, response_cache
+from services.user_export import iter_user_export
 
 user_bp = Blueprint('user', __name__)
 
+# Fields the dashboard reads from each index
+DASHBOARD_USER_SOURCE = ['email', 'name', 'username', 'first_name', 'last_name', 'created_at']
+DASHBOARD_TRAVEL_SOURCE = ['status', 'created_at', 'passions', 'places_to_visit']
+
+# Activity fields returned by /activity (?fields=, ?view=)
+ACTIVITY_FIELDS = FieldSet({
+    'type': [],
+    'travel_id': [],
+    'status': ['status'],
+    'date': ['created_at'],
+    'description': ['passions'],
+    'details': ['passions', 'travelers.adults', 'travelers.children']
+}, summary=['type', 'travel_id', 'status', 'date', 'description'])
+
 # Validation schemas
 class PreferencesSchema(Schema):
     travel_style = fields.Str(required=False)
@@ -16,8 +35,31 @@ class PreferencesSchema(Schema):
     dietary_restrictions = fields.List(fields.Str(), required=False)
     accessibility_needs = fields.Str(required=False)
 
+def _fetch_user_data(user_id, travels_size):
+    """Profile, travels and preferences of a user, in a single msearch"""
+    user_result, travels_result, prefs_result = opensearch_ops.msearch([
+        ('users', {'query': {'ids': {'values': [user_id]}}, 'size': 1,
+                   '_source': DASHBOARD_USER_SOURCE}),
+        ('travels', {'query': {'term': {'user_id': user_id}},
+                     'size': travels_size,
+                     'sort': [{'created_at': {'order': 'desc'}}],
+                     'aggs': {'statuses': {'terms': {'field': 'status', 'size': 50}}},
+                     '_source': DASHBOARD_TRAVEL_SOURCE}),
+        ('preferences', {'query': {'term': {'user_id': user_id}}, 'size': 1,
+                         '_source': ['preferences']})
+    ])
+    user_hits = user_result['hits']['hits']
+    if user_hits:
+        return user_hits[0]['_source'], travels_result, prefs_result
+
+    # Search is near-realtime: a user registered within the last refresh
+    # interval is only visible to a get
+    user_doc = opensearch_ops.get_document('users', user_id, source=DASHBOARD_USER_SOURCE)
+    return (user_doc['_source'] if user_doc else None), travels_result, prefs_result
+
 @user_bp.route('/preferences', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_user_preferences():
     """Get user preferences"""
     try:
@@ -81,6 +123,7 @@ def save_user_preferences():
             prefs_id = str(uuid.uuid4())
             opensearch_ops.index_document('preferences', prefs_id, prefs_data)
             message = 'Preferences saved successfully'
+        response_cache.invalidate(user_id)
 
         return jsonify({
             'message': message,
@@ -94,56 +137,47 @@ def save_user_preferences():
 
 @user_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_user_dashboard():
     """Get user dashboard data"""
     try:
         user_id = get_jwt_identity()
 
-        # Get user profile
-        user_doc = opensearch_ops.get_document('users', user_id)
-        user_data = user_doc['_source']
-
-        # Get user's recent travels
-        travels_result = opensearch_ops.search_documents(
-            'travels',
-            query={'term': {'user_id': user_id}},
-            size=5
-        )
+        # Profile, recent travels and preferences in one round trip
+        user_data, travels_result, prefs_result = _fetch_user_data(user_id, 5)
+        if user_data is None:
+            return jsonify({'error': 'User not found'}), 404
 
         recent_travels = []
         for hit in travels_result['hits']['hits']:
             travel_data = hit['_source']
             recent_travels.append({
                 'id': hit['_id'],
-                'status': travel_data['status'],
-                'created_at': travel_data['created_at'],
-                'passions': travel_data['passions'][:3],  # First 3 passions
+                'status': travel_data.get('status'),
+                'created_at': travel_data.get('created_at'),
+                'passions': travel_data.get('passions', [])[:3],  # First 3 passions
                 'destination_summary': travel_data.get('places_to_visit', 'Italia')
             })
 
-        # Get user preferences
-        prefs_result = opensearch_ops.search_documents(
-            'preferences',
-            query={'term': {'user_id': user_id}},
-            size=1
-        )
-
         preferences = {}
-        if prefs_result['hits']['total']['value'] > 0:
+        if prefs_result['hits']['hits']:
             preferences = prefs_result['hits']['hits'][0]['_source'].get('preferences', {})
 
         # Calculate some basic stats
         total_travels = travels_result['hits']['total']['value']
-        completed_travels = len([t for t in [hit['_source'] for hit in travels_result['hits']['hits']]
-                                if t.get('status') == 'completed'])
+        completed_travels = next((bucket['doc_count']
+                                  for bucket in travels_result['aggregations']['statuses']['buckets']
+                                  if bucket['key'] == 'completed'), 0)
 
         return jsonify({
             'user': {
                 'id': user_id,
-                'email': user_data['email'],
-                'first_name': user_data['first_name'],
-                'last_name': user_data['last_name'],
-                'member_since': user_data['created_at']
+                'email': user_data.get('email'),
+                'name': user_data.get('name'),
+                'username': user_data.get('username'),
+                'first_name': user_data.get('first_name'),
+                'last_name': user_data.get('last_name'),
+                'member_since': user_data.get('created_at')
             },
             'statistics': {
                 'total_travels': total_travels,
@@ -160,34 +194,41 @@ def get_user_dashboard():
 @user_bp.route('/activity', methods=['GET'])
 @jwt_required()
 def get_user_activity():
-    """Get user activity log"""
+    """Get user activity log (?fields= or ?view=summary|full select the
+    fields of each activity)"""
     try:
         user_id = get_jwt_identity()
 
-        # Get user's travels with more details for activity feed
+        try:
+            selected = ACTIVITY_FIELDS.selected(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Get user's most recent travels for the activity feed
         travels_result = opensearch_ops.search_documents(
             'travels',
             query={'term': {'user_id': user_id}},
-            size=20
+            size=20,
+            sort=[{'created_at': {'order': 'desc'}}],
+            source=ACTIVITY_FIELDS.source(selected)
         )
 
         activities = []
         for hit in travels_result['hits']['hits']:
             travel_data = hit['_source']
-            activities.append({
+            passions = travel_data.get('passions', [])
+            travelers = travel_data.get('travelers', {})
+            activities.append(ACTIVITY_FIELDS.project({
                 'type': 'travel_request',
                 'travel_id': hit['_id'],
-                'status': travel_data['status'],
-                'date': travel_data['created_at'],
-                'description': f"Richiesta viaggio per {', '.join(travel_data['passions'][:2])}",
+                'status': travel_data.get('status'),
+                'date': travel_data.get('created_at'),
+                'description': f"Richiesta viaggio per {', '.join(passions[:2])}",
                 'details': {
-                    'passions': travel_data['passions'],
-                    'travelers_count': travel_data['travelers']['adults'] + travel_data['travelers']['children']
+                    'passions': passions,
+                    'travelers_count': travelers.get('adults', 0) + travelers.get('children', 0)
                 }
-            })
-
-        # Sort by date (most recent first)
-        activities.sort(key=lambda x: x['date'], reverse=True)
+            }, selected))
 
         return jsonify({
             'activities': activities,
@@ -226,52 +267,50 @@ def delete_user_account():
 @user_bp.route('/export-data', methods=['GET'])
 @jwt_required()
 def export_user_data():
-    """Export user data (GDPR compliance)"""
-    try:
-        user_id = get_jwt_identity()
-
-        # Get user profile
-        user_doc = opensearch_ops.get_document('users', user_id)
-        user_data = user_doc['_source']
-
-        # Get user travels
-        travels_result = opensearch_ops.search_documents(
-            'travels',
-            query={'term': {'user_id': user_id}},
-            size=100
-        )
-
-        travels = [hit['_source'] for hit in travels_result['hits']['hits']]
-
-        # Get user preferences
-        prefs_result = opensearch_ops.search_documents(
-            'preferences',
-            query={'term': {'user_id': user_id}},
-            size=1
-        )
-
-        preferences = {}
-        if prefs_result['hits']['total']['value'] > 0:
-            preferences = prefs_result['hits']['hits'][0]['_source']
-
-        # Prepare export data
-        export_data = {
-            'user_profile': {
-                'email': user_data['email'],
-                'first_name': user_data['first_name'],
-                'last_name': user_data['last_name'],
-                'created_at': user_data['created_at'],
-                'last_login': user_data.get('last_login')
-            },
-            'travel_requests': travels,
-            'preferences': preferences,
-            'export_date': datetime.utcnow().isoformat()
-        }
-
-        return jsonify({
-            'message': 'Data export completed',
-            'data': export_data
-        }), 200
-
-    except Exception as e:
-        return jsonify({'error': 'Failed to export data', 'details': str(e)}), 500
+    """Export user data (GDPR compliance) as NDJSON, one document per line.
+
+    The export is streamed while the indices are walked, so it starts
+    right away and is never held in memory. ?compress=gzip returns it
+    gzipped.
+    """
+    user_id = get_jwt_identity()
+    user_doc = opensearch_ops.get_document('users', user_id)
+    if user_doc is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    compress = request.args.get('compress') == 'gzip'
+
+    def generate():
+        try:
+            for record in iter_user_export(user_id, user_doc):
+                yield json.dumps(record, default=str) + '\n'
+        except Exception as e:
+            # Headers are gone already: report the failure in the stream
+            print(f"[DEBUG] Export of user {user_id} failed: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': 'Failed to export data',
+                              'details': str(e)}) + '\n'
+
+    def generate_gzip():
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        pending = 0
+        for line in generate():
+            chunk = compressor.compress(line.encode('utf-8'))
+            pending += len(line)
+            # Flush regularly so the download progresses
+            if pending >= 64 * 1024:
+                chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    filename = f"yookye-export-{datetime.utcnow():%Y%m%d}.ndjson"
+    if compress:
+        body, mimetype, filename = generate_gzip(), 'application/gzip', filename + '.gz'
+    else:
+        body, mimetype = generate(), 'application/x-ndjson'
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'  # disable proxy buffering (nginx)
+    })
@@ -0,0 +1,64 @@
+"""Backfill: search fields on existing travel packages.
+
+Packages now store fields computed at ingest from their unindexed hotel
+and experience objects, so that listings and package search can sort
+and filter in the index:
+
+- total_price, nights, destinations and city_costs (hotels_selezionati)
+- experience_count, experience_cities and experience_categories
+  (esperienze_selezionate)
+
+This script computes them for the packages saved before. It is
+idempotent and can run while the app is serving traffic.
+
+    cd backend && python scripts/backfill_package_fields.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+import config.opensearch_client as opensearch  # noqa: E402
+from services.job_results import package_pricing, package_experiences  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def main(dry_run=False):
+    opensearch.init_opensearch()
+    if opensearch.opensearch_client is not None:
+        opensearch.create_indices()  # adds the search fields to the travel_packages mapping
+
+    # Collected first: updating while paging would move the cursor.
+    # experience_count is always set, even for packages without experiences.
+    updates = []
+    query = {
+        'bool': {
+            'should': [
+                {'bool': {'must_not': [{'exists': {'field': 'total_price'}}]}},
+                {'bool': {'must_not': [{'exists': {'field': 'experience_count'}}]}}
+            ]
+        }
+    }
+    for hit in opensearch.opensearch_ops.iter_documents('travel_packages', query,
+                                                        page_size=BATCH_SIZE):
+        package = hit['_source']
+        updates.append((hit['_id'], {
+            **package_pricing(package.get('hotels_selezionati')),
+            **package_experiences(package.get('esperienze_selezionate'))
+        }))
+
+    print(f"Packages to backfill: {len(updates)}")
+    if dry_run:
+        return
+    for start in range(0, len(updates), BATCH_SIZE):
+        opensearch.opensearch_ops.bulk_update('travel_packages', updates[start:start + BATCH_SIZE])
+    print("Backfill completed")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv[1:])
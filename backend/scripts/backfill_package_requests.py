@@ -0,0 +1,80 @@
+"""Backfill: owner and request summary on existing travel packages.
+
+Packages are now listed with a single query filtered by user_id, and
+carry a `request` summary of the travel that produced them. Packages
+saved before that have neither and do not show up in /my-packages.
+This script finds them, looks up their travels by external_job_id and
+sets `user_id` and `request`. It is idempotent and can run while the
+app is serving traffic.
+
+    cd backend && python scripts/backfill_package_requests.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+import config.opensearch_client as opensearch  # noqa: E402
+from services.job_results import request_summary, TRAVEL_SUMMARY_SOURCE  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def iter_batches():
+    """Pages of packages without a request summary"""
+    batch = []
+    query = {'bool': {'must_not': [{'exists': {'field': 'request'}}]}}
+    for hit in opensearch.opensearch_ops.iter_documents('travel_packages', query,
+                                                        page_size=BATCH_SIZE):
+        batch.append(hit)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def travels_by_job(job_ids):
+    """external_job_id -> (travel_id, travel_data)"""
+    result = opensearch.opensearch_ops.search_documents(
+        'travels', query={'terms': {'external_job_id': sorted(job_ids)}}, size=len(job_ids),
+        source=TRAVEL_SUMMARY_SOURCE)
+    return {hit['_source']['external_job_id']: (hit['_id'], hit['_source'])
+            for hit in result['hits']['hits']}
+
+
+def main(dry_run=False):
+    opensearch.init_opensearch()
+    if opensearch.opensearch_client is not None:
+        opensearch.create_indices()  # adds request to the travel_packages mapping
+
+    # Collected first: updating while paging would move the cursor
+    updates = []
+    orphans = 0
+    for batch in iter_batches():
+        travels = travels_by_job({hit['_source']['job_id'] for hit in batch
+                                  if hit['_source'].get('job_id')})
+        for hit in batch:
+            travel_id, travel_data = travels.get(hit['_source'].get('job_id'), (None, None))
+            if travel_data is None:
+                orphans += 1
+                continue
+            updates.append((hit['_id'], {
+                'user_id': travel_data.get('user_id'),
+                'request': request_summary(travel_id, travel_data)
+            }))
+
+    print(f"Packages to backfill: {len(updates)}, without a travel: {orphans}")
+    if dry_run:
+        return
+    for start in range(0, len(updates), BATCH_SIZE):
+        opensearch.opensearch_ops.bulk_update('travel_packages', updates[start:start + BATCH_SIZE])
+    print("Backfill completed")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv[1:])
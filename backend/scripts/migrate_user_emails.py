@@ -0,0 +1,109 @@
+"""Migration: normalized emails for existing users.
+
+New users get an id derived from their normalized email, so login is a
+single get. Users created before keep their random id, which travels,
+sessions and preferences refer to. This script:
+
+- sets `email_normalized` on every user that lacks it
+- writes a `user_emails/<normalized email>` alias for every user whose
+  id is not the derived one, so that login finds them with gets only and
+  registration refuses their address. Aliases are created with
+  op_type=create, so the ones registrations wrote meanwhile are kept
+- reports emails shared by several accounts (e.g. differing in case);
+  the alias points at the first one found, the others need manual review
+
+It is idempotent and can run while the app is serving traffic.
+
+    cd backend && python scripts/migrate_user_emails.py [--dry-run]
+
+Until it has run, set USER_EMAIL_SEARCH_FALLBACK=true so that legacy users
+can log in; unset it afterwards so failed logins no longer search the users
+index.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from opensearchpy import helpers  # noqa: E402
+
+import config.opensearch_client as opensearch  # noqa: E402
+from services.users import normalize_email, user_id_for_email  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def iter_users():
+    """(id, source) of every user, from the cluster or the local store"""
+    if opensearch._cluster_available():
+        for hit in helpers.scan(opensearch.opensearch_client, index='users',
+                                query={'query': {'match_all': {}}}, size=BATCH_SIZE):
+            yield hit['_id'], hit['_source']
+    else:
+        result = opensearch.local_store.search('users', None, size=sys.maxsize)
+        for hit in result['hits']['hits']:
+            yield hit['_id'], hit['_source']
+
+
+def main(dry_run=False):
+    opensearch.init_opensearch()
+    if opensearch.opensearch_client is not None:
+        opensearch.create_indices()  # adds email_normalized to the users mapping
+
+    updates = []
+    aliases = {}
+    owners = {}
+    duplicates = []
+    users = 0
+    for user_id, user in iter_users():
+        email = user.get('email')
+        if not email:
+            continue
+        users += 1
+        normalized = normalize_email(email)
+        if user.get('email_normalized') != normalized:
+            updates.append((user_id, {'email_normalized': normalized}))
+
+        if normalized in owners:
+            duplicates.append((normalized, owners[normalized], user_id))
+            # An account with the derived id is the one login finds first
+            if user_id != user_id_for_email(email):
+                continue
+        owners[normalized] = user_id
+        if user_id != user_id_for_email(email):
+            aliases[normalized] = (user_id, {'email_normalized': normalized,
+                                             'user_id': user_id})
+        else:
+            aliases.pop(normalized, None)
+
+    print(f"Users: {users}, missing email_normalized: {len(updates)}, "
+          f"aliases to write: {len(aliases)}")
+    for normalized, kept, other in duplicates:
+        print(f"⚠️  {normalized} is shared by users {kept} and {other}")
+
+    if dry_run:
+        return
+    for start in range(0, len(updates), BATCH_SIZE):
+        opensearch.opensearch_ops.bulk_update('users', updates[start:start + BATCH_SIZE])
+    alias_docs = [(normalized, doc) for normalized, (_, doc) in aliases.items()]
+    for start in range(0, len(alias_docs), BATCH_SIZE):
+        batch = alias_docs[start:start + BATCH_SIZE]
+        result = opensearch.opensearch_ops.bulk_index('user_emails', batch, op_type='create')
+        existing = [error['_id'] for error in result['errors'] if error['status'] == 409]
+        if not existing:
+            continue
+        # Written by a previous run, or by a registration since the scan
+        for doc in opensearch.opensearch_ops.mget('user_emails', existing):
+            owner = doc['_source'].get('user_id') if doc.get('found') else None
+            if owner != aliases[doc['_id']][0]:
+                print(f"⚠️  {doc['_id']} already belongs to user {owner}, "
+                      f"not {aliases[doc['_id']][0]}")
+    print("Migration completed")
+
+
+if __name__ == '__main__':
+    main(dry_run='--dry-run' in sys.argv[1:])
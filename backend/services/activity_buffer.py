@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+import threading
+import logging
+import atexit
+import os
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops
+
+logger = logging.getLogger(__name__)
+
+# Buffered activity is written at least this often (seconds)...
+FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 30))
+# ...or as soon as this many sessions are waiting
+FLUSH_SIZE = int(os.getenv('ACTIVITY_FLUSH_SIZE', 500))
+# Activity within this many seconds of the stored last_activity is not written at all
+STALENESS = timedelta(seconds=float(os.getenv('ACTIVITY_STALENESS_SECONDS', 60)))
+
+
+class ActivityBuffer:
+    """Write-behind buffer for session `last_activity`.
+
+    Requests only record the latest activity per session in memory. A
+    background thread writes all buffered sessions with one bulk update
+    every FLUSH_INTERVAL seconds, or earlier once FLUSH_SIZE sessions
+    are waiting, and once more when the process exits.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self.stats = {'touches': 0, 'skipped': 0, 'flushes': 0, 'flushed_sessions': 0,
+                      'flush_errors': 0}
+
+    def start(self):
+        """Start the flush thread of this process (idempotent, fork-safe)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # A forked child must not write its parent's buffer a second time
+            self._pending = {}
+            threading.Thread(target=self._run, name='activity-buffer', daemon=True).start()
+
+    def touch(self, session_id, stored_activity=None, when=None):
+        """Record activity on a session.
+
+        stored_activity is the last_activity currently in the index: when
+        it is more recent than STALENESS nothing needs to be written.
+        """
+        self.start()
+        when = when or datetime.utcnow()
+        self.stats['touches'] += 1
+        if session_id not in self._pending and stored_activity:
+            try:
+                if when - datetime.fromisoformat(stored_activity) < STALENESS:
+                    self.stats['skipped'] += 1
+                    return
+            except (TypeError, ValueError):
+                pass
+        with self._lock:
+            self._pending[session_id] = when.isoformat()
+            full = len(self._pending) >= FLUSH_SIZE
+        if full:
+            self._wakeup.set()
+
+    def latest(self, session_id, default=None):
+        """Buffered last_activity of a session, if newer than what is stored"""
+        return self._pending.get(session_id, default)
+
+    def discard(self, session_id):
+        """Forget buffered activity, e.g. for a session that was just deleted"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+
+    def flush(self):
+        """Write every buffered session with a single bulk update"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            result = opensearch_ops.bulk_update(
+                'sessions',
+                ((session_id, {'last_activity': last_activity})
+                 for session_id, last_activity in pending.items()))
+        except Exception as e:
+            # Put the activity back unless newer activity arrived meanwhile
+            with self._lock:
+                for session_id, last_activity in pending.items():
+                    self._pending.setdefault(session_id, last_activity)
+            self.stats['flush_errors'] += 1
+            logger.error(f"Failed to flush session activity: {e}")
+            return 0
+
+        self.stats['flushes'] += 1
+        self.stats['flushed_sessions'] += result['indexed']
+        metrics.observe('activity_buffer.flush_size', len(pending))
+        return result['indexed']
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+
+# Shared instance for the whole worker process
+activity_buffer = ActivityBuffer()
+atexit.register(activity_buffer.flush)
+metrics.register_collector('activity_buffer', lambda: {
+    **activity_buffer.stats,
+    'pending_sessions': len(activity_buffer._pending)
+})
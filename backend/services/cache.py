@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    With a `weigher` (value -> size) the cache also keeps the total size
+    of its values under `maxweight`, evicting the least recently used.
+    """
+
+    def __init__(self, maxsize=10000, ttl=30, weigher=None, maxweight=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher
+        self.maxweight = maxweight
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _weigh(self, value):
+        return self.weigher(value) if self.weigher else 0
+
+    def _remove(self, key):
+        """Drop an entry (caller holds the lock)"""
+        _, value = self._data.pop(key)
+        self.weight -= self._weigh(value)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value)
+            self.weight += self._weigh(value)
+            while self._data and (len(self._data) > self.maxsize or
+                                  (self.maxweight is not None and self.weight > self.maxweight)):
+                self._remove(next(iter(self._data)))
+                self.stats['evictions'] += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def evict(self, predicate):
+        """Drop every entry whose value matches predicate, returning how many"""
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
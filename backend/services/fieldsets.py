@@ -0,0 +1,42 @@
+"""Sparse fieldsets for the list endpoints.
+
+Each list endpoint declares the fields of its items and the _source
+fields every one of them is built from. ?fields=a,b picks response
+fields, ?view=summary|full a predefined set (full by default). Only the
+_source fields the selection needs are fetched, so payload size and
+serialization time follow what the client renders.
+"""
+
+
+class FieldSet:
+    """Response fields of a list endpoint: {field: [_source paths it needs]}"""
+
+    def __init__(self, fields, summary):
+        self.fields = fields
+        self.summary = list(summary)
+
+    def selected(self, args):
+        """Response fields asked for by the request args (?fields= wins over
+        ?view=). Raises ValueError for unknown fields or views."""
+        if args.get('fields'):
+            names = list(dict.fromkeys(n.strip() for n in args['fields'].split(',') if n.strip()))
+            unknown = [n for n in names if n not in self.fields]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            return names
+        view = args.get('view', 'full')
+        if view == 'summary':
+            return list(self.summary)
+        if view == 'full':
+            return list(self.fields)
+        raise ValueError('Invalid view, expected summary or full')
+
+    def source(self, selected, always=()):
+        """_source filter for the selected fields (plus the `always` paths)"""
+        paths = sorted({path for name in selected for path in self.fields[name]} | set(always))
+        # An empty includes list would fetch the whole document
+        return {'includes': paths} if paths else False
+
+    @staticmethod
+    def project(item, selected):
+        return {name: item[name] for name in selected if name in item}
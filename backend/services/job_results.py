@@ -0,0 +1,320 @@
+from datetime import datetime
+import time
+import os
+
+from config.opensearch_client import opensearch_ops, DocumentConflictError
+from config.travel_api_client import travel_api_client
+from services.response_cache import response_cache
+
+# Seconds after which an unfinished result ingestion may be taken over
+INGEST_CLAIM_TIMEOUT = int(os.getenv('JOB_RESULT_CLAIM_TIMEOUT', 60))
+
+# Seconds a request waits for another request's ingestion of the same job
+INGEST_WAIT_TIMEOUT = int(os.getenv('JOB_RESULT_WAIT_TIMEOUT', 30))
+
+
+def fetch_job_result(job_id):
+    """Fetch the result of a completed search job from the external API"""
+    response = travel_api_client.get(f"/api/search/{job_id}/result")
+
+    print(f"[DEBUG] Result response: {response.status_code}")
+
+    if response.status_code == 401:
+        raise Exception("Authentication failed for result request")
+
+    if not response.ok:
+        raise Exception(f"Result request failed: {response.status_code} - {response.text}")
+
+    try:
+        return response.json()
+    except ValueError as e:
+        print(f"[DEBUG] Failed to parse result response JSON: {str(e)}")
+        raise Exception(f"Invalid JSON response from result API: {str(e)}")
+
+
+# Fields of a travel request that its packages copy (see request_summary)
+TRAVEL_SUMMARY_SOURCE = ['user_id', 'external_job_id', 'passions', 'travelers', 'dates']
+# Package fields a stored job result is rebuilt from
+STORED_RESULT_SOURCE = ['package_id', 'hotels_selezionati', 'esperienze_selezionate']
+
+
+def find_job_travel(job_id):
+    """Return (travel_id, travel_data) of the travel request that started a job"""
+    try:
+        # Find the travel request with this external_job_id
+        travels_result = opensearch_ops.search_documents(
+            'travels',
+            query={'term': {'external_job_id': job_id}},
+            size=1,
+            source=TRAVEL_SUMMARY_SOURCE
+        )
+        if travels_result['hits']['total']['value'] > 0:
+            hit = travels_result['hits']['hits'][0]
+            print(f"[DEBUG] Found travel {hit['_id']} of user {hit['_source'].get('user_id')} for job {job_id}")
+            return hit['_id'], hit['_source']
+    except Exception as e:
+        print(f"[ERROR] Failed to find travel for job {job_id}: {str(e)}")
+    return None, None
+
+
+def request_summary(travel_id, travel_data):
+    """Compact copy of a travel request, stored on each of its packages so
+    that listing packages needs no join with travels"""
+    travel_data = travel_data or {}
+    return {
+        'travel_id': travel_id,
+        'passions': travel_data.get('passions', []),
+        'travelers': travel_data.get('travelers', {}),
+        'dates': travel_data.get('dates', {})
+    }
+
+
+def _hotel_nights(hotel):
+    """Nights between check-in and check-out (dd/mm/yyyy), 1 when unknown"""
+    try:
+        checkin = datetime.strptime(hotel.get('checkin', ''), '%d/%m/%Y')
+        checkout = datetime.strptime(hotel.get('checkout', ''), '%d/%m/%Y')
+        return (checkout - checkin).days
+    except (TypeError, ValueError):
+        return 1
+
+
+def package_pricing(hotels):
+    """Price fields of a package, computed from its hotels_selezionati.
+
+    hotels_selezionati is stored unindexed, so these are stored next to
+    it at ingest and listings can filter and sort on them: total_price,
+    nights, destinations (the cities) and city_costs, one entry per city.
+    Hotels without a numeric daily price cost nothing.
+    """
+    city_costs = []
+    for city, hotel in (hotels or {}).items():
+        hotel = hotel if isinstance(hotel, dict) else {}
+        nights = _hotel_nights(hotel)
+        daily_price = hotel.get('daily_prices', 0)
+        if not isinstance(daily_price, (int, float)) or isinstance(daily_price, bool):
+            daily_price = 0
+        city_costs.append({
+            'city': city,
+            'nights': nights,
+            'daily_price': daily_price,
+            'cost': round(daily_price * nights, 2)
+        })
+    return {
+        'total_price': round(sum(c['cost'] for c in city_costs), 2),
+        'nights': sum(c['nights'] for c in city_costs),
+        'destinations': [c['city'] for c in city_costs],
+        'city_costs': city_costs
+    }
+
+
+# Keys of an experience that may hold its category, as a string or a list
+EXPERIENCE_CATEGORY_KEYS = ('categoria', 'categorie', 'category', 'categories')
+
+
+def package_experiences(experiences):
+    """Search fields of a package, from its esperienze_selezionate.
+
+    esperienze_selezionate maps each city to an experience and is stored
+    unindexed: experience_cities and experience_categories are the
+    keyword fields package search filters on.
+    """
+    cities = []
+    categories = []
+    for city, experience in (experiences or {}).items():
+        cities.append(city)
+        experience = experience if isinstance(experience, dict) else {}
+        for key in EXPERIENCE_CATEGORY_KEYS:
+            values = experience.get(key)
+            for value in values if isinstance(values, list) else [values]:
+                if isinstance(value, str) and value.strip():
+                    categories.append(value.strip().lower())
+    return {
+        'experience_count': len(cities),
+        'experience_cities': cities,
+        'experience_categories': list(dict.fromkeys(categories))
+    }
+
+
+def package_doc_id(job_id, package_key):
+    """Deterministic travel_packages document id for one package of a job"""
+    return f"{job_id}:{package_key}"
+
+
+def save_travel_packages(job_id, packages_data, user_id=None, request=None):
+    """Save travel packages received from external API to database.
+
+    Document ids are derived from job_id and id_pacchetto, so saving the
+    same result again overwrites the packages instead of duplicating them.
+    Every package carries the owner's user_id, the request summary and
+    its search fields (see package_pricing and package_experiences).
+    Returns the stored document ids in result order.
+    """
+    documents = []
+
+    for position, package in enumerate(packages_data):
+        package_key = package.get('id_pacchetto') or f'package_{position + 1}'
+        package_id = package_doc_id(job_id, package_key)
+
+        # Prepare package data for storage
+        package_doc = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'package_id': package_key,
+            'position': position,
+            'hotels_selezionati': package.get('hotels_selezionati', {}),
+            'esperienze_selezionate': package.get('esperienze_selezionate', {}),
+            'status': 'available',
+            'request': request or request_summary(None, None),
+            **package_pricing(package.get('hotels_selezionati', {})),
+            **package_experiences(package.get('esperienze_selezionate', {})),
+            'created_at': datetime.utcnow().isoformat(),
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        documents.append((package_id, package_doc))
+
+    # Store all packages in one bulk request
+    response = opensearch_ops.bulk_index('travel_packages', documents)
+    if response['errors']:
+        print(f"[ERROR] Failed to save {len(response['errors'])} packages: {response['errors']}")
+        raise Exception(f"Failed to save {len(response['errors'])} of {len(documents)} travel packages")
+
+    print(f"[DEBUG] Saved {response['indexed']} packages for job {job_id} and user {user_id}")
+    response_cache.invalidate(user_id)
+    return [package_id for package_id, _ in documents]
+
+
+def get_result_marker(job_id):
+    """Return the job_results marker of a job, or None"""
+    doc = opensearch_ops.get_document('job_results', job_id)
+    return doc['_source'] if doc else None
+
+
+def stored_job_result(marker):
+    """Rebuild a job result from the packages stored for it"""
+    if 'raw_result' in marker:
+        return marker['raw_result']
+
+    package_ids = marker.get('package_ids', [])
+    if not package_ids:
+        return []
+    # One round trip for all the packages of the job
+    docs = opensearch_ops.mget('travel_packages', package_ids, source=STORED_RESULT_SOURCE)
+    result = []
+    for doc in docs:
+        if not doc.get('found'):
+            raise Exception(f"Stored package {doc['_id']} of job {marker.get('job_id')} not found")
+        package = doc['_source']
+        result.append({
+            'id_pacchetto': package['package_id'],
+            'hotels_selezionati': package.get('hotels_selezionati', {}),
+            'esperienze_selezionate': package.get('esperienze_selezionate', {})
+        })
+    return result
+
+
+def claim_is_stale(marker):
+    try:
+        claimed_at = datetime.fromisoformat(marker['claimed_at'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return (datetime.utcnow() - claimed_at).total_seconds() > INGEST_CLAIM_TIMEOUT
+
+
+def is_final_result(result_data, completed):
+    """Whether a job result may be stored: a package list, or any body once
+    the job is known to be COMPLETED (anything else may be an interim reply)"""
+    return isinstance(result_data, list) or completed
+
+
+def ingest_job_result(job_id, completed=False):
+    """Fetch a job result from the external API and store its packages.
+
+    A result that is not final (see is_final_result) is returned without
+    being stored, and the claim is released so a later call fetches again.
+    """
+    try:
+        result_data = fetch_job_result(job_id)
+
+        print(f"[INFO] JOB RESULT RECEIVED:")
+        print(f"[INFO] Job ID: {job_id}")
+        print(f"[INFO] Result Data: {result_data}")
+
+        if not is_final_result(result_data, completed):
+            release_claim(job_id)
+            return result_data
+
+        package_ids = []
+        user_id = None
+        if isinstance(result_data, list) and result_data:
+            travel_id, travel_data = find_job_travel(job_id)
+            user_id = (travel_data or {}).get('user_id')
+            package_ids = save_travel_packages(job_id, result_data, user_id,
+                                               request_summary(travel_id, travel_data))
+            print(f"[INFO] Saved {len(package_ids)} travel packages for job {job_id} and user {user_id}")
+
+        marker = {
+            'status': 'stored',
+            'user_id': user_id,
+            'package_ids': package_ids,
+            'package_count': len(package_ids),
+            'stored_at': datetime.utcnow().isoformat()
+        }
+        if not isinstance(result_data, list):
+            marker['raw_result'] = result_data
+        opensearch_ops.update_document('job_results', job_id, marker)
+        return result_data
+
+    except Exception:
+        # Release the claim so the next request can retry
+        release_claim(job_id)
+        raise
+
+
+def release_claim(job_id):
+    """Delete the job_results marker of a job, ignoring failures"""
+    try:
+        opensearch_ops.delete_document('job_results', job_id)
+    except Exception:
+        pass
+
+
+def load_job_result(job_id, completed=False):
+    """Return a job result, ingesting it from the external API only once.
+
+    The first caller claims the job with an op_type=create marker in
+    job_results and ingests the result; concurrent callers wait for the
+    marker to turn 'stored' and every later call is served from the stored
+    packages without contacting the external API. completed tells that
+    the job is known to be COMPLETED (see is_final_result).
+    """
+    deadline = time.monotonic() + INGEST_WAIT_TIMEOUT
+
+    while True:
+        marker = get_result_marker(job_id)
+
+        if marker and marker.get('status') == 'stored':
+            return stored_job_result(marker)
+
+        if marker is None:
+            try:
+                opensearch_ops.index_document('job_results', job_id, {
+                    'job_id': job_id,
+                    'status': 'ingesting',
+                    'claimed_at': datetime.utcnow().isoformat()
+                }, op_type='create')
+                return ingest_job_result(job_id, completed)
+            except DocumentConflictError:
+                continue  # claimed by someone else in the meantime
+
+        if claim_is_stale(marker):
+            # The previous claimer died; re-ingesting is safe because ids are deterministic
+            print(f"[INFO] Taking over stale result ingestion for job {job_id}")
+            opensearch_ops.update_document('job_results', job_id, {
+                'claimed_at': datetime.utcnow().isoformat()
+            })
+            return ingest_job_result(job_id, completed)
+
+        if time.monotonic() > deadline:
+            raise Exception(f"Timed out waiting for result of job {job_id}")
+        time.sleep(0.25)
@@ -0,0 +1,419 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import tempfile
+import logging
+import math
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops
+from config.travel_api_client import travel_api_client
+from services.cache import TTLCache
+from services.job_results import load_job_result, is_final_result
+
+logger = logging.getLogger(__name__)
+
+# Upstream job states after which no further polling is needed
+TERMINAL_STATUSES = {'COMPLETED', 'FAILED', 'ERROR'}
+
+# Adaptive polling: start fast, slow down while nothing changes
+MIN_POLL_INTERVAL = float(os.getenv('JOB_TRACKER_MIN_INTERVAL', 1))
+MAX_POLL_INTERVAL = float(os.getenv('JOB_TRACKER_MAX_INTERVAL', 15))
+BACKOFF_FACTOR = float(os.getenv('JOB_TRACKER_BACKOFF', 1.5))
+
+# How often in-flight jobs are (re)loaded from the travels index
+SYNC_INTERVAL = float(os.getenv('JOB_TRACKER_SYNC_INTERVAL', 2))
+
+# Jobs older than this are no longer polled
+MAX_JOB_AGE = timedelta(minutes=int(os.getenv('JOB_TRACKER_MAX_AGE_MINUTES', 120)))
+
+# Upper bound of the jobs followed by one process
+MAX_TRACKED_JOBS = int(os.getenv('JOB_TRACKER_MAX_JOBS', 10000))
+
+POLL_WORKERS = int(os.getenv('JOB_TRACKER_WORKERS', 4))
+LOCK_FILE = os.getenv('JOB_TRACKER_LOCK_FILE',
+                      os.path.join(tempfile.gettempdir(), 'yookye-job-tracker.lock'))
+
+
+class JobNotFoundError(Exception):
+    """The job is unknown, to the travels index or to the external API"""
+
+
+def not_found_status(job_id):
+    """Terminal status reported for a job the external API does not know"""
+    return {'job_id': job_id, 'status': 'ERROR', 'error': 'Job not found'}
+
+
+def fetch_job_status(job_id):
+    """Fetch the current status of a search job from the external API"""
+    response = travel_api_client.get(f"/api/search/{job_id}")
+
+    if response.status_code == 401:
+        raise Exception("Authentication failed for status request")
+
+    if response.status_code == 404:
+        raise JobNotFoundError(f"Job {job_id} not found")
+
+    if not response.ok:
+        raise Exception(f"Status request failed: {response.status_code} - {response.text}")
+
+    try:
+        return response.json()
+    except ValueError as e:
+        raise Exception(f"Invalid JSON response from status API: {str(e)}")
+
+
+def job_status_of(status_data):
+    """Extract the upstream status string from a status payload"""
+    if not status_data:
+        return None
+    return status_data.get('status') or status_data.get('state')
+
+
+class TrackedJob:
+    """Latest known state of one external search job"""
+
+    __slots__ = ('job_id', 'travel_id', 'status_data', 'interval', 'next_poll_at',
+                 'registered_at', 'error', 'polling', 'version', 'changed',
+                 'result_data', 'result_lock')
+
+    def __init__(self, job_id, travel_id=None):
+        self.job_id = job_id
+        self.travel_id = travel_id
+        self.status_data = None
+        self.interval = MIN_POLL_INTERVAL
+        self.next_poll_at = time.monotonic()
+        self.registered_at = time.monotonic()
+        self.error = None
+        self.polling = False
+        # Bumped on every status change; subscribers wait on `changed`
+        self.version = 0
+        self.changed = threading.Condition()
+        self.result_data = None
+        self.result_lock = threading.Lock()
+
+    @property
+    def status(self):
+        return job_status_of(self.status_data)
+
+    @property
+    def finished(self):
+        return self.status in TERMINAL_STATUSES
+
+
+class JobTracker:
+    """Background owner of upstream polling for in-flight search jobs.
+
+    One worker process holds an advisory file lock and polls the external
+    API once per job, backing off while the status does not change, and
+    writes every transition to the job's travels document. The other
+    workers only mirror those statuses from the travels index, so
+    `poll-job` is answered from memory no matter how many tabs or workers
+    are asking. Only jobs of a travel request are followed, at most
+    MAX_TRACKED_JOBS of them, and a job the external API does not know
+    fails on its first poll.
+    """
+
+    def __init__(self, lock_file=LOCK_FILE):
+        self._lock_file = lock_file
+        self._lock_fd = None
+        self._jobs = {}
+        # Job ids recently found in no travel request
+        self._unknown = TTLCache(maxsize=MAX_TRACKED_JOBS, ttl=SYNC_INTERVAL)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._executor = None
+        self._last_sync = 0.0
+        self._wakeup = threading.Event()
+        self.stats = {'upstream_polls': 0, 'upstream_errors': 0, 'transitions': 0,
+                      'result_fetches': 0, 'unknown_jobs': 0, 'evictions': 0}
+
+    @property
+    def is_leader(self):
+        return self._lock_fd is not None
+
+    def start(self):
+        """Start the background loop for this process (idempotent, fork-safe)"""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            # A forked child inherits neither the thread nor the leadership
+            if self._lock_fd not in (None, -1):
+                os.close(self._lock_fd)
+            self._pid = os.getpid()
+            self._lock_fd = None
+            self._executor = ThreadPoolExecutor(max_workers=POLL_WORKERS,
+                                                thread_name_prefix='job-tracker-poll')
+            self._thread = threading.Thread(target=self._run, name='job-tracker', daemon=True)
+            self._thread.start()
+
+    def track(self, job_id, travel_id=None):
+        """Make sure a job is being followed and return its state.
+
+        Without a travel_id the job must belong to a travel request in the
+        travels index; returns None if it does not.
+        """
+        self.start()
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if travel_id and not job.travel_id:
+                job.travel_id = travel_id
+            return job
+
+        published = None
+        if travel_id is None:
+            if self._unknown.get(job_id):
+                return None
+            hits = opensearch_ops.search_documents(
+                'travels',
+                query={'term': {'external_job_id': job_id}},
+                size=1,
+                source=['external_job_status_data'])['hits']['hits']
+            if not hits:
+                self.stats['unknown_jobs'] += 1
+                self._unknown.set(job_id, True)
+                return None
+            travel_id = hits[0]['_id']
+            published = hits[0]['_source'].get('external_job_status_data')
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._add(job_id, travel_id)
+                job.status_data = published
+                self._wakeup.set()
+            return job
+
+    def _add(self, job_id, travel_id):
+        """Register a job, evicting the oldest (finished first) when full
+        (caller holds the lock)"""
+        if len(self._jobs) >= MAX_TRACKED_JOBS:
+            oldest = next((key for key, job in self._jobs.items() if job.finished),
+                          next(iter(self._jobs)))
+            del self._jobs[oldest]
+            self.stats['evictions'] += 1
+        job = self._jobs[job_id] = TrackedJob(job_id, travel_id)
+        return job
+
+    def get_status(self, job_id):
+        """Return (status_data, retry_after_seconds, error) from the cache"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None, math.ceil(MIN_POLL_INTERVAL), None
+        if job.finished:
+            return job.status_data, 0, None
+        retry_after = max(1, math.ceil(job.next_poll_at - time.monotonic()))
+        if not self.is_leader:
+            retry_after = max(retry_after, math.ceil(SYNC_INTERVAL))
+        return job.status_data, retry_after, job.error
+
+    def wait_for_change(self, job_id, seen_version, timeout):
+        """Block until the job's status moves past seen_version or timeout.
+
+        Every subscriber of a job waits on the same condition, so one
+        upstream poll wakes all of them at once. Returns (version, status_data).
+        """
+        job = self.track(job_id)
+        if job is None:
+            return seen_version + 1, not_found_status(job_id)
+        with job.changed:
+            if job.version == seen_version:
+                job.changed.wait(timeout)
+            return job.version, job.status_data
+
+    def get_result(self, job_id):
+        """Return the job result, fetching it once for all concurrent callers"""
+        job = self.track(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        if job.result_data is None:
+            with job.result_lock:
+                if job.result_data is None:
+                    self.stats['result_fetches'] += 1
+                    completed = job.status == 'COMPLETED'
+                    result_data = load_job_result(job_id, completed)
+                    if not is_final_result(result_data, completed):
+                        return result_data  # not cached either, see ingest_job_result
+                    job.result_data = result_data
+        return job.result_data
+
+    # Background loop
+    def _run(self):
+        while True:
+            try:
+                self._try_become_leader()
+                now = time.monotonic()
+                if now - self._last_sync >= SYNC_INTERVAL:
+                    self._last_sync = now
+                    self._sync_from_index()
+                if self.is_leader:
+                    self._poll_due_jobs()
+                self._forget_stale_jobs()
+            except Exception as e:
+                logger.error(f"Job tracker loop error: {e}")
+            self._wakeup.wait(timeout=0.25)
+            self._wakeup.clear()
+
+    def _try_become_leader(self):
+        if self._lock_fd is not None:
+            return
+        if fcntl is None:
+            self._lock_fd = -1  # no cross-process locking available: everyone polls
+            return
+        fd = os.open(self._lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return
+        self._lock_fd = fd
+        logger.info(f"📡 Job tracker leader is process {os.getpid()}")
+
+    def _sync_from_index(self):
+        """Load in-flight jobs and the statuses published by the leader"""
+        since = (datetime.utcnow() - MAX_JOB_AGE).isoformat()
+        result = opensearch_ops.search_documents(
+            'travels',
+            query={
+                'bool': {
+                    'must': [
+                        {'exists': {'field': 'external_job_id'}},
+                        {'range': {'created_at': {'gte': since}}}
+                    ],
+                    'must_not': [
+                        {'terms': {'external_job_status': sorted(TERMINAL_STATUSES)}}
+                    ]
+                }
+            },
+            size=500)
+
+        hits = result['hits']['hits']
+        # Followers also refresh the jobs they are asked about that just
+        # finished, whatever their age
+        asked = []
+        if not self.is_leader:
+            pending = [job_id for job_id, job in list(self._jobs.items()) if not job.finished]
+            if pending:
+                asked = opensearch_ops.search_documents(
+                    'travels',
+                    query={'terms': {'external_job_id': pending}},
+                    size=len(pending))['hits']['hits']
+                # Jobs whose travel request is gone would stay PENDING forever
+                known = {hit['_source'].get('external_job_id') for hit in asked}
+                with self._lock:
+                    for job_id in pending:
+                        if job_id not in known and job_id in self._jobs:
+                            del self._jobs[job_id]
+
+        with self._lock:
+            for hit in hits + asked:
+                travel = hit['_source']
+                job_id = travel.get('external_job_id')
+                if not job_id:
+                    continue
+                job = self._jobs.get(job_id)
+                if job is None:
+                    if travel.get('created_at', '') < since:
+                        continue
+                    job = self._add(job_id, hit['_id'])
+                job.travel_id = job.travel_id or hit['_id']
+                # The leader only adopts what a previous leader published
+                published = travel.get('external_job_status_data')
+                if published and (not self.is_leader or job.status_data is None):
+                    if job_status_of(published) != job.status:
+                        self._set_status(job, published)
+                    else:
+                        job.status_data = published
+
+    def _poll_due_jobs(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [job for job in self._jobs.values()
+                   if not job.finished and not job.polling and job.next_poll_at <= now]
+            for job in due:
+                job.polling = True
+        for job in due:
+            self._executor.submit(self._poll_job, job)
+
+    def _poll_job(self, job):
+        try:
+            self.stats['upstream_polls'] += 1
+            status_data = fetch_job_status(job.job_id)
+            job.error = None
+            if job_status_of(status_data) != job.status:
+                job.interval = MIN_POLL_INTERVAL
+                self._set_status(job, status_data)
+                self._publish(job, status_data)
+            else:
+                job.status_data = status_data
+                job.interval = min(job.interval * BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+        except JobNotFoundError as e:
+            # Fail the job for its subscribers and every worker, and stop polling it
+            self.stats['upstream_errors'] += 1
+            logger.warning(f"⚠️ Dropping job {job.job_id}: {e}")
+            self._set_status(job, not_found_status(job.job_id))
+            self._publish(job, job.status_data)
+            with self._lock:
+                if self._jobs.get(job.job_id) is job:
+                    del self._jobs[job.job_id]
+        except Exception as e:
+            self.stats['upstream_errors'] += 1
+            job.error = str(e)
+            job.interval = min(job.interval * BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+            logger.warning(f"⚠️ Polling job {job.job_id} failed: {e}")
+        finally:
+            job.next_poll_at = time.monotonic() + job.interval
+            job.polling = False
+
+    def _set_status(self, job, status_data):
+        """Record a status transition and wake every subscriber of the job"""
+        with job.changed:
+            job.status_data = status_data
+            job.version += 1
+            job.changed.notify_all()
+        self.stats['transitions'] += 1
+        logger.info(f"📡 Job {job.job_id} is now {job.status}")
+
+    def _publish(self, job, status_data):
+        """Write a status transition to the job's travels document"""
+
+        try:
+            if not job.travel_id:
+                result = opensearch_ops.search_documents(
+                    'travels', query={'term': {'external_job_id': job.job_id}}, size=1)
+                if result['hits']['hits']:
+                    job.travel_id = result['hits']['hits'][0]['_id']
+            if job.travel_id:
+                opensearch_ops.update_document('travels', job.travel_id, {
+                    'external_job_status': job.status,
+                    'external_job_status_data': status_data,
+                    'external_job_checked_at': datetime.utcnow().isoformat()
+                })
+        except Exception as e:
+            logger.error(f"Failed to store status of job {job.job_id}: {e}")
+
+    def _forget_stale_jobs(self):
+        cutoff = time.monotonic() - MAX_JOB_AGE.total_seconds()
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.registered_at < cutoff]:
+                del self._jobs[job_id]
+
+
+# Shared instance for the whole worker process
+job_tracker = JobTracker()
+metrics.register_collector('job_tracker', lambda: {
+    **job_tracker.stats,
+    'tracked_jobs': len(job_tracker._jobs),
+    'leader': job_tracker.is_leader
+})
@@ -0,0 +1,198 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import multiprocessing
+import threading
+import logging
+import math
+import time
+import os
+
+import bcrypt
+
+from config.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes. Hashes made with another cost are
+# replaced transparently at the next successful login.
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+
+# Hashing processes per worker: bounds the CPU a login storm can take
+POOL_SIZE = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, min(4, (os.cpu_count() or 2) // 2))))
+# Hashes running or waiting; beyond that requests get a 503 at once
+QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', POOL_SIZE * 8))
+# Longest a request waits for its hash before giving up with a 503
+TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+
+class HasherBusyError(Exception):
+    """Raised when the hashing queue is full; retry_after is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing is overloaded, retry later')
+        self.retry_after = retry_after
+
+
+# bcrypt only reads this many bytes of a password; newer releases raise
+# for longer ones instead of ignoring the rest
+MAX_PASSWORD_BYTES = 72
+
+
+def _secret(password):
+    """The bytes of a password bcrypt uses, as older releases truncated them"""
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+# Run in the pool processes
+def _hash(password, rounds):
+    started = time.time()
+    hashed = bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode('utf-8')
+    return hashed, started, time.time()
+
+
+def _check(hashed, password):
+    started = time.time()
+    try:
+        valid = bcrypt.checkpw(_secret(password), hashed.encode('utf-8'))
+    except ValueError:
+        valid = False  # not a bcrypt hash
+    return valid, started, time.time()
+
+
+def hash_cost(hashed):
+    """Cost factor of a bcrypt hash ($2b$12$...), or None"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt.
+
+    Hashing runs in POOL_SIZE separate processes, so a login storm uses
+    at most that many cores and request threads only wait, leaving the
+    worker free to serve cheap endpoints. At most QUEUE_LIMIT hashes may
+    be running or queued: further ones are refused with HasherBusyError
+    instead of piling up behind them.
+    """
+
+    def __init__(self):
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(QUEUE_LIMIT)
+        self._in_flight = 0
+        # Moving average of one hash, for Retry-After
+        self._avg_seconds = 0.25
+        self.stats = {'hashed': 0, 'checked': 0, 'rejected': 0, 'timeouts': 0, 'rehashed': 0}
+
+    def _executor(self):
+        """The pool of this process (created lazily, again after a fork)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # spawn: forking a threaded worker could copy held locks
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=POOL_SIZE,
+                        mp_context=multiprocessing.get_context('spawn'))
+                    self._slots = threading.BoundedSemaphore(QUEUE_LIMIT)
+                    self._in_flight = 0
+                    self._pid = os.getpid()
+        return self._pool
+
+    def retry_after(self):
+        """Seconds until the current queue has likely drained"""
+        return max(1, min(30, math.ceil(self._in_flight * self._avg_seconds / POOL_SIZE)))
+
+    def _submit(self, fn, *args):
+        pool = self._executor()
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            metrics.inc('password_hasher.rejected')
+            raise HasherBusyError(self.retry_after())
+        with self._lock:
+            self._in_flight += 1
+        submitted_at = time.time()
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.submitted_at = submitted_at
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if future is None or future.cancelled() or future.exception() is not None:
+            return
+        _, started, finished = future.result()
+        seconds = finished - started
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+        metrics.observe('password_hasher.queue_seconds', max(0.0, started - future.submitted_at))
+        metrics.observe('password_hasher.hash_seconds', seconds)
+
+    def _run(self, fn, *args):
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=TIMEOUT)[0]
+        except FutureTimeoutError:
+            # Leave it running: its slot is freed once it finishes
+            self.stats['timeouts'] += 1
+            metrics.inc('password_hasher.timeouts')
+            raise HasherBusyError(self.retry_after())
+
+    def hash_password(self, password):
+        hashed = self._run(_hash, password, BCRYPT_LOG_ROUNDS)
+        self.stats['hashed'] += 1
+        return hashed
+
+    def check_password(self, hashed, password):
+        valid = self._run(_check, hashed, password)
+        self.stats['checked'] += 1
+        return valid
+
+    @staticmethod
+    def needs_rehash(hashed):
+        return hash_cost(hashed) != BCRYPT_LOG_ROUNDS
+
+    def rehash_in_background(self, password, on_done):
+        """Hash with the current cost and pass the hash to on_done.
+
+        Best effort: skipped when the pool is busy, the next login
+        tries again.
+        """
+        try:
+            future = self._submit(_hash, password, BCRYPT_LOG_ROUNDS)
+        except HasherBusyError:
+            return False
+
+        def store(hashed):
+            try:
+                on_done(hashed)
+                self.stats['rehashed'] += 1
+            except Exception as e:
+                logger.error(f"Failed to store rehashed password: {e}")
+
+        def done(future):
+            if future.exception() is not None:
+                logger.error(f"Password rehash failed: {future.exception()}")
+                return
+            # Not on the pool's result thread, which other requests wait on
+            threading.Thread(target=store, args=(future.result()[0],), daemon=True).start()
+
+        future.add_done_callback(done)
+        return True
+
+
+# Shared instance for the whole worker process
+password_hasher = PasswordHasher()
+metrics.register_collector('password_hasher', lambda: {
+    **password_hasher.stats,
+    'in_flight': password_hasher._in_flight,
+    'pool_size': POOL_SIZE,
+    'queue_limit': QUEUE_LIMIT,
+    'log_rounds': BCRYPT_LOG_ROUNDS
+})
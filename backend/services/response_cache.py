@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+import functools
+import hashlib
+import logging
+import uuid
+import os
+
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Cached responses per worker, and their total size in bytes
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 2000))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Larger responses are never cached (their ETag is still honoured)
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRY_BYTES', 512 * 1024))
+# Backstop for writes that bypass invalidate(), e.g. the backfill scripts
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+# Searches see a write only after the next index refresh: responses built
+# this soon after a user's data changed are served but not cached
+SETTLE_TIME = timedelta(seconds=float(os.getenv('RESPONSE_CACHE_SETTLE_SECONDS', 2)))
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """Per-user cache of GET responses with strong ETags.
+
+    Every user has a version document in `response_versions`, replaced by
+    invalidate() on each write to data the cached endpoints return. A
+    cached response is keyed by user and full path and is only served
+    while the user's version is the one it was built under, so a write
+    made by any worker invalidates the responses cached by all of them
+    at the cost of one realtime get per request. The ETag is a hash of
+    the body: a matching If-None-Match gets a 304 without a body, whether
+    the response came from the cache or was just rebuilt.
+    """
+
+    def __init__(self):
+        self._entries = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                                 weigher=lambda entry: len(entry['body']),
+                                 maxweight=RESPONSE_CACHE_MAX_BYTES)
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'stored': 0,
+                      'not_stored': 0, 'invalidations': 0, 'invalidation_errors': 0}
+
+    def version(self, user_id):
+        """(version, changed_at) of a user's cached data"""
+        doc = opensearch_ops.mget('response_versions', [user_id])[0]
+        if not doc.get('found'):
+            return '0', None
+        return doc['_source'].get('version', '0'), _parse_time(doc['_source'].get('changed_at'))
+
+    def invalidate(self, user_id):
+        """Drop every cached response of a user, in all workers.
+
+        Never raises: a failed invalidation is logged and the stale
+        responses expire after RESPONSE_CACHE_TTL.
+        """
+        if not user_id:
+            return
+        self._entries.evict(lambda entry: entry['user_id'] == user_id)
+        try:
+            opensearch_ops.index_document('response_versions', user_id, {
+                'version': uuid.uuid4().hex,
+                'changed_at': datetime.utcnow().isoformat()
+            })
+            self.stats['invalidations'] += 1
+        except Exception as e:
+            self.stats['invalidation_errors'] += 1
+            logger.error(f"Failed to invalidate cached responses of user {user_id}: {e}")
+
+    def _not_modified(self, etag, headers):
+        self.stats['not_modified'] += 1
+        response = make_response('', 304)
+        response.headers.update(headers)
+        response.set_etag(etag)
+        return response
+
+    def serve(self, view, *args, **kwargs):
+        """Answer a GET from the cache, or through view and cache it"""
+        user_id = get_jwt_identity()
+        key = (user_id, request.full_path)
+        try:
+            version, changed_at = self.version(user_id)
+        except Exception as e:
+            logger.error(f"Failed to read the response version of user {user_id}: {e}")
+            return view(*args, **kwargs)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry['version'] == version:
+            self.stats['hits'] += 1
+            metrics.inc('response_cache.hits')
+            if entry['etag'] in request.if_none_match:
+                return self._not_modified(entry['etag'], entry['headers'])
+            response = make_response(entry['body'], 200)
+            response.headers.update(entry['headers'])
+            response.set_etag(entry['etag'])
+            return response
+
+        self.stats['misses'] += 1
+        metrics.inc('response_cache.misses')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        body = response.get_data()
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        headers = {'Content-Type': response.headers['Content-Type'],
+                   'Cache-Control': 'private, no-cache',
+                   'Vary': 'Authorization'}
+        settled = changed_at is None or datetime.utcnow() - changed_at >= SETTLE_TIME
+        if settled and len(body) <= RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            self._entries.set(key, {'user_id': user_id, 'version': version, 'etag': etag,
+                                    'body': body, 'headers': headers})
+            self.stats['stored'] += 1
+        else:
+            self.stats['not_stored'] += 1
+
+        if etag in request.if_none_match:
+            return self._not_modified(etag, headers)
+        response.headers.update(headers)
+        response.set_etag(etag)
+        return response
+
+
+def cached_response(view):
+    """Cache a user-scoped GET endpoint (apply below @jwt_required)"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return response_cache.serve(view, *args, **kwargs)
+    return wrapper
+
+
+def _collect():
+    lookups = response_cache.stats['hits'] + response_cache.stats['misses']
+    return {
+        **response_cache.stats,
+        'hit_rate': round(response_cache.stats['hits'] / lookups, 4) if lookups else None,
+        'size': len(response_cache._entries),
+        'bytes': response_cache._entries.weight,
+        'evictions': response_cache._entries.stats['evictions']
+    }
+
+
+# Shared instance for the whole worker process
+response_cache = ResponseCache()
+metrics.register_collector('response_cache', _collect)
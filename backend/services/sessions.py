@@ -0,0 +1,149 @@
+from datetime import datetime
+import logging
+import os
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops
+from services.cache import TTLCache
+from services.token_revocation import revocation_cache
+
+logger = logging.getLogger(__name__)
+
+# Validated sessions are trusted for this long without asking the index again
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', 10))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+
+# Page size when collecting the tokens of every session of a user
+TOKEN_PAGE_SIZE = int(os.getenv('SESSION_TOKEN_PAGE_SIZE', 1000))
+
+# access token jti -> {'_id': session doc id, '_source': session doc}
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+
+def _find_legacy_session(jti):
+    """Sessions created before they were keyed by jti carry a random id"""
+    result = opensearch_ops.search_documents(
+        'sessions',
+        query={
+            'bool': {
+                'must': [
+                    {'term': {'access_token_jti': jti}},
+                    {'term': {'is_active': True}}
+                ]
+            }
+        },
+        size=1
+    )
+    hits = result['hits']['hits']
+    return hits[0] if hits else None
+
+
+def get_active_session(jti):
+    """Return the active session of an access token, or None.
+
+    Sessions are stored with the access token's jti as document id, so
+    this is one realtime get, skipped entirely for sessions validated
+    within the last SESSION_CACHE_TTL seconds.
+    """
+    session = session_cache.get(jti)
+    if session is not None:
+        return session
+
+    doc = opensearch_ops.get_document('sessions', jti)
+    if doc is not None:
+        session = {'_id': doc['_id'], '_source': doc['_source']}
+    else:
+        session = _find_legacy_session(jti)
+        if session is not None:
+            metrics.inc('sessions.legacy_lookups')
+
+    if session is None or not session['_source'].get('is_active'):
+        return None
+    session_cache.set(jti, session)
+    return session
+
+
+def invalidate_session(jti):
+    """Drop a session from this worker's cache (call on every revocation)"""
+    if jti:
+        session_cache.pop(jti)
+
+
+def _active_sessions_query(user_id):
+    return {
+        'bool': {
+            'must': [
+                {'term': {'user_id': user_id}},
+                {'term': {'is_active': True}}
+            ]
+        }
+    }
+
+
+def _session_tokens(session, user_id):
+    """(jti, user_id, expires_at, type) of a session's access and refresh tokens"""
+    try:
+        expires_at = datetime.fromisoformat(session.get('expires_at'))
+    except (TypeError, ValueError):
+        expires_at = None
+    return [(session.get('access_token_jti'), user_id, expires_at, 'access'),
+            (session.get('refresh_token_jti'), user_id, expires_at, 'refresh')]
+
+
+def _revoke_session_tokens(user_id):
+    """Blacklist the access and refresh tokens of every active session of a user"""
+    revoked = 0
+    seen = set()
+    query = _active_sessions_query(user_id)
+    while True:
+        # Sessions already handled are excluded, so each page is new ones
+        if seen:
+            query = {'bool': {**_active_sessions_query(user_id)['bool'],
+                              'must_not': [{'ids': {'values': list(seen)}}]}}
+        hits = opensearch_ops.search_documents('sessions', query=query,
+                                               size=TOKEN_PAGE_SIZE)['hits']['hits']
+        tokens = []
+        for hit in hits:
+            seen.add(hit['_id'])
+            tokens.extend(_session_tokens(hit['_source'], user_id))
+        revoked += revocation_cache.revoke_many(tokens)
+        if len(hits) < TOKEN_PAGE_SIZE:
+            return revoked
+
+
+def end_session(session_doc):
+    """Deactivate one session and blacklist its access and refresh tokens,
+    so that they are rejected by every worker. Returns the tokens revoked."""
+    session = session_doc['_source']
+    tokens = revocation_cache.revoke_many(_session_tokens(session, session['user_id']))
+    opensearch_ops.update_document('sessions', session_doc['_id'], {
+        'is_active': False,
+        'revoked_at': datetime.utcnow().isoformat()
+    })
+    invalidate_session(session.get('access_token_jti'))
+    metrics.inc('sessions.revoked')
+    return tokens
+
+
+def revoke_user_sessions(user_id, revoke_tokens=False):
+    """Deactivate every active session of a user in one update by query.
+
+    With revoke_tokens the sessions' access and refresh tokens are
+    blacklisted first, so they stop working on every endpoint and not
+    only on those that validate the session. Returns
+    {'sessions': count, 'tokens': count}.
+    """
+    tokens = _revoke_session_tokens(user_id) if revoke_tokens else 0
+    result = opensearch_ops.update_by_query('sessions', _active_sessions_query(user_id), {
+        'is_active': False,
+        'logout_at': datetime.utcnow().isoformat()
+    })
+    session_cache.evict(lambda session: session['_source'].get('user_id') == user_id)
+    metrics.inc('sessions.revoked', result['updated'])
+    return {'sessions': result['updated'], 'tokens': tokens}
+
+
+metrics.register_collector('session_cache', lambda: {
+    **session_cache.stats,
+    'size': len(session_cache)
+})
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+import threading
+import logging
+import time
+import os
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops
+
+logger = logging.getLogger(__name__)
+
+# How often revocations made by other workers are fetched (staleness bound)
+SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', 5))
+
+# Re-read this far behind the watermark: entries only become searchable
+# after the next index refresh, possibly later than newer ones
+SYNC_OVERLAP = timedelta(seconds=float(os.getenv('REVOCATION_SYNC_OVERLAP_SECONDS', 30)))
+
+# Longest token lifetime: older revocations can no longer matter
+MAX_TOKEN_LIFETIME = timedelta(days=int(os.getenv('REVOCATION_MAX_TOKEN_LIFETIME_DAYS', 30)))
+
+PAGE_SIZE = int(os.getenv('REVOCATION_PAGE_SIZE', 1000))
+
+
+def _parse_time(value):
+    """Parse an ISO timestamp into a naive UTC datetime"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class RevocationCache:
+    """Per-worker set of revoked JWT ids (jti -> expiry).
+
+    Loaded from `blacklisted_tokens` on first use, then kept current by a
+    background thread that fetches entries newer than a watermark every
+    SYNC_INTERVAL seconds and drops the ones whose token has expired.
+    is_revoked() is a dict lookup: a revocation made by another worker
+    is seen here after at most SYNC_INTERVAL seconds, one made by this
+    worker immediately.
+    """
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._watermark = None
+        self.stats = {'syncs': 0, 'sync_errors': 0, 'fetched': 0, 'pruned': 0,
+                      'last_sync_at': None}
+
+    def start(self):
+        """Load the revocations and start syncing (idempotent, fork-safe)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            try:
+                self._sync()
+            except Exception as e:
+                self.stats['sync_errors'] += 1
+                logger.error(f"Failed to load revoked tokens: {e}")
+            threading.Thread(target=self._run, name='token-revocation', daemon=True).start()
+
+    def is_revoked(self, jti):
+        self.start()
+        return jti in self._revoked
+
+    def revoke(self, jti, user_id, expires_at=None, token_type='access'):
+        """Blacklist a token and make it revoked in this worker right away"""
+        now = datetime.utcnow()
+        expires_at = expires_at or now + MAX_TOKEN_LIFETIME
+        opensearch_ops.index_document('blacklisted_tokens', jti, {
+            'jti': jti,
+            'user_id': user_id,
+            'token_type': token_type,
+            'blacklisted_at': now.isoformat(),
+            'expires_at': expires_at.isoformat()
+        })
+        self._revoked[jti] = expires_at
+
+    def revoke_many(self, tokens):
+        """Blacklist (jti, user_id, expires_at, token_type) tuples with one bulk request"""
+        now = datetime.utcnow()
+        entries = {}
+        for jti, user_id, expires_at, token_type in tokens:
+            if jti:
+                entries[jti] = (user_id, expires_at or now + MAX_TOKEN_LIFETIME, token_type)
+        if not entries:
+            return 0
+        opensearch_ops.bulk_index('blacklisted_tokens', (
+            (jti, {
+                'jti': jti,
+                'user_id': user_id,
+                'token_type': token_type,
+                'blacklisted_at': now.isoformat(),
+                'expires_at': expires_at.isoformat()
+            }) for jti, (user_id, expires_at, token_type) in entries.items()))
+        for jti, (_, expires_at, _) in entries.items():
+            self._revoked[jti] = expires_at
+        return len(entries)
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                self._sync()
+                self._prune()
+            except Exception as e:
+                self.stats['sync_errors'] += 1
+                logger.error(f"Revoked token sync failed: {e}")
+
+    def _sync(self):
+        """Fetch revocations newer than the watermark, oldest first"""
+        now = datetime.utcnow()
+        since = (self._watermark - SYNC_OVERLAP) if self._watermark else now - MAX_TOKEN_LIFETIME
+
+        while True:
+            result = opensearch_ops.search_documents(
+                'blacklisted_tokens',
+                query={'range': {'blacklisted_at': {'gte': since.isoformat()}}},
+                size=PAGE_SIZE,
+                sort=[{'blacklisted_at': {'order': 'asc'}}])
+            hits = result['hits']['hits']
+            newest = since
+            for hit in hits:
+                doc = hit['_source']
+                revoked_at = _parse_time(doc.get('blacklisted_at')) or now
+                expires_at = _parse_time(doc.get('expires_at')) or revoked_at + MAX_TOKEN_LIFETIME
+                if expires_at > now:
+                    self._revoked[doc.get('jti') or hit['_id']] = expires_at
+                newest = max(newest, revoked_at)
+            self.stats['fetched'] += len(hits)
+            # A full page means there may be more; stop if the page did not advance
+            if len(hits) < PAGE_SIZE or newest == since:
+                break
+            since = newest
+
+        # Everything revoked before `now` has been seen, modulo refresh delay
+        # which the overlap of the next sync covers
+        self._watermark = now
+        self.stats['syncs'] += 1
+        self.stats['last_sync_at'] = now.isoformat()
+
+    def _prune(self):
+        now = datetime.utcnow()
+        expired = [jti for jti, expires_at in list(self._revoked.items()) if expires_at <= now]
+        for jti in expired:
+            self._revoked.pop(jti, None)
+        self.stats['pruned'] += len(expired)
+
+
+# Shared instance for the whole worker process
+revocation_cache = RevocationCache()
+metrics.register_collector('token_revocation', lambda: {
+    **revocation_cache.stats,
+    'revoked_tokens': len(revocation_cache._revoked)
+})
@@ -0,0 +1,92 @@
+from datetime import datetime
+import os
+
+from config.opensearch_client import opensearch_ops
+
+# Documents fetched per page while walking an index
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 500))
+
+# Never exported: credentials
+EXCLUDED_FIELDS = {'users': {'password'}}
+
+
+def _record(index, hit):
+    excluded = EXCLUDED_FIELDS.get(index, ())
+    return {
+        'type': index,
+        'id': hit['_id'],
+        'document': {k: v for k, v in hit['_source'].items() if k not in excluded}
+    }
+
+
+def _user_documents(index, user_id):
+    return opensearch_ops.iter_documents(index, {'term': {'user_id': user_id}},
+                                         page_size=EXPORT_PAGE_SIZE)
+
+
+def _legacy_packages(user_id, job_ids):
+    """Packages of these jobs created before packages carried a user_id"""
+    if not job_ids:
+        return iter(())
+    query = {
+        'bool': {
+            'filter': [{'terms': {'job_id': job_ids}}],
+            # Already exported by the user_id walk
+            'must_not': [{'term': {'user_id': user_id}}]
+        }
+    }
+    return opensearch_ops.iter_documents('travel_packages', query, page_size=EXPORT_PAGE_SIZE)
+
+
+def iter_user_export(user_id, user_doc):
+    """Yield the export records of a user, one document at a time.
+
+    The first record describes the export and the last one counts the
+    documents per index, so that a truncated download can be detected.
+    Packages created before they carried a user_id are linked to the user
+    by the job ids of the travels: they follow each page of travels,
+    looked up with that page's job ids only.
+    """
+    counts = {}
+    yield {
+        'type': 'export',
+        'user_id': user_id,
+        'export_date': datetime.utcnow().isoformat(),
+        'indices': ['users', 'preferences', 'travels', 'travel_packages', 'sessions']
+    }
+
+    yield _record('users', user_doc)
+    counts['users'] = 1
+
+    counts['preferences'] = 0
+    for hit in _user_documents('preferences', user_id):
+        counts['preferences'] += 1
+        yield _record('preferences', hit)
+
+    counts['travel_packages'] = 0
+    for hit in _user_documents('travel_packages', user_id):
+        counts['travel_packages'] += 1
+        yield _record('travel_packages', hit)
+
+    counts['travels'] = 0
+    job_ids = []
+    for hit in _user_documents('travels', user_id):
+        counts['travels'] += 1
+        if hit['_source'].get('external_job_id'):
+            job_ids.append(hit['_source']['external_job_id'])
+        yield _record('travels', hit)
+        if counts['travels'] % EXPORT_PAGE_SIZE == 0:
+            for package in _legacy_packages(user_id, job_ids):
+                counts['travel_packages'] += 1
+                yield _record('travel_packages', package)
+            job_ids = []
+    for package in _legacy_packages(user_id, job_ids):
+        counts['travel_packages'] += 1
+        yield _record('travel_packages', package)
+
+    counts['sessions'] = 0
+    for hit in _user_documents('sessions', user_id):
+        counts['sessions'] += 1
+        yield _record('sessions', hit)
+
+    yield {'type': 'summary', 'counts': counts}
@@ -0,0 +1,105 @@
+from datetime import datetime
+import logging
+import uuid
+import os
+
+from config.metrics import metrics
+from config.opensearch_client import opensearch_ops, DocumentConflictError
+
+logger = logging.getLogger(__name__)
+
+# Users registered from now on get uuid5(USER_ID_NAMESPACE, normalized email)
+# as id, so finding a user by email is a realtime get. Never change it.
+USER_ID_NAMESPACE = uuid.UUID('d2e4ab7a-7a76-489a-b304-0b6687d588a0')
+
+# Search the users index for emails that have neither a derived id nor an
+# alias. Only for deployments with users from before the derived ids, until
+# scripts/migrate_user_emails.py has been run.
+EMAIL_SEARCH_FALLBACK = os.getenv('USER_EMAIL_SEARCH_FALLBACK', 'false').lower() == 'true'
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+def user_id_for_email(email):
+    """Document id of a user registered with this email"""
+    return str(uuid.uuid5(USER_ID_NAMESPACE, normalize_email(email)))
+
+
+def _find_legacy_user(email):
+    """Users created with a random id: through their alias, else by search"""
+    normalized = normalize_email(email)
+    alias = opensearch_ops.get_document('user_emails', normalized)
+    if alias is not None:
+        metrics.inc('users.alias_lookups')
+        return opensearch_ops.get_document('users', alias['_source']['user_id'])
+
+    if not EMAIL_SEARCH_FALLBACK:
+        return None
+    metrics.inc('users.email_searches')
+    result = opensearch_ops.search_documents(
+        'users',
+        query={
+            'bool': {
+                'should': [
+                    {'term': {'email_normalized': normalized}},
+                    {'term': {'email': email.strip()}},
+                    {'term': {'email': normalized}}
+                ]
+            }
+        },
+        size=1
+    )
+    hits = result['hits']['hits']
+    return hits[0] if hits else None
+
+
+def find_user_by_email(email):
+    """Return the user document ({'_id', '_source'}) for an email, or None"""
+    user = opensearch_ops.get_document('users', user_id_for_email(email))
+    if user is None:
+        user = _find_legacy_user(email)
+    return user
+
+
+def _claim_email(email, user_id):
+    """Create the user_emails alias of an address (op_type=create).
+
+    Raises DocumentConflictError if the address belongs to another user,
+    e.g. a legacy one whose alias the migration wrote. An alias already
+    pointing at user_id is left by a registration that failed halfway.
+    """
+    normalized = normalize_email(email)
+    try:
+        opensearch_ops.index_document('user_emails', normalized, {
+            'email_normalized': normalized,
+            'user_id': user_id
+        }, op_type='create')
+    except DocumentConflictError:
+        alias = opensearch_ops.get_document('user_emails', normalized)
+        if alias is None or alias['_source'].get('user_id') != user_id:
+            raise
+
+
+def create_user(email, password_hash, name, username):
+    """Create a user, or raise DocumentConflictError if the email is taken.
+
+    The address is claimed with an op_type=create of its alias, then the
+    user is written with op_type=create on the id derived from it: two
+    concurrent registrations of the same address cannot both succeed and
+    nothing is read first.
+    """
+    user_id = user_id_for_email(email)
+    _claim_email(email, user_id)
+    user_data = {
+        'id': user_id,
+        'email': email,
+        'email_normalized': normalize_email(email),
+        'password': password_hash,
+        'name': name,
+        'username': username,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    opensearch_ops.index_document('users', user_id, user_data, op_type='create')
+    return user_id, user_data
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Tests never talk to a cluster
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import os
+
+from config.opensearch_client import opensearch_ops
+from services.activity_buffer import ActivityBuffer
+
+
+def _buffer():
+    """A buffer flushed by hand instead of by its thread"""
+    buffer = ActivityBuffer()
+    buffer._pid = os.getpid()
+    return buffer
+
+
+def test_touches_are_coalesced_into_one_bulk_update(monkeypatch):
+    for session_id in ('ab1', 'ab2'):
+        opensearch_ops.index_document('sessions', session_id, {'is_active': True})
+    updates = []
+    bulk_update = opensearch_ops.bulk_update
+
+    def recording_bulk_update(index, documents, **kwargs):
+        documents = list(documents)
+        updates.append(documents)
+        return bulk_update(index, documents, **kwargs)
+
+    monkeypatch.setattr(opensearch_ops, 'bulk_update', recording_bulk_update)
+    buffer = _buffer()
+    start = datetime(2025, 6, 1, 12, 0)
+    for minute in range(3):
+        buffer.touch('ab1', when=start + timedelta(minutes=minute))
+    buffer.touch('ab2', when=start)
+
+    assert buffer.latest('ab1') == '2025-06-01T12:02:00'
+    assert buffer.flush() == 2
+    assert updates == [[('ab1', {'last_activity': '2025-06-01T12:02:00'}),
+                        ('ab2', {'last_activity': '2025-06-01T12:00:00'})]]
+    assert opensearch_ops.get_document('sessions', 'ab1')['_source']['last_activity'] == \
+        '2025-06-01T12:02:00'
+    assert buffer.flush() == 0
+
+
+def test_recent_stored_activity_is_not_written_again():
+    buffer = _buffer()
+    now = datetime(2025, 6, 1, 12, 0)
+
+    buffer.touch('ab3', stored_activity=(now - timedelta(seconds=10)).isoformat(), when=now)
+    buffer.touch('ab4', stored_activity=(now - timedelta(hours=1)).isoformat(), when=now)
+    assert buffer.latest('ab3') is None
+    assert buffer.latest('ab4') == now.isoformat()
+    assert buffer.stats['skipped'] == 1
+
+
+def test_failed_flush_keeps_newer_activity(monkeypatch):
+    buffer = _buffer()
+    buffer.touch('ab5', when=datetime(2025, 6, 1, 12, 0))
+
+    def failing_bulk_update(index, documents, **kwargs):
+        # Activity recorded while the flush is running
+        buffer.touch('ab5', when=datetime(2025, 6, 1, 12, 5))
+        raise Exception('cluster down')
+
+    monkeypatch.setattr(opensearch_ops, 'bulk_update', failing_bulk_update)
+    assert buffer.flush() == 0
+    assert buffer.latest('ab5') == '2025-06-01T12:05:00'
+    assert buffer.stats['flush_errors'] == 1
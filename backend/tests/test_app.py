@@ -0,0 +1,13 @@
+from app import create_app
+
+
+def test_metrics_are_off_by_default(monkeypatch):
+    monkeypatch.delenv('METRICS_ENABLED', raising=False)
+    assert create_app().test_client().get('/api/metrics').status_code == 404
+
+
+def test_metrics_can_be_enabled(monkeypatch):
+    monkeypatch.setenv('METRICS_ENABLED', 'true')
+    response = create_app().test_client().get('/api/metrics')
+    assert response.status_code == 200
+    assert 'counters' in response.json
@@ -0,0 +1,104 @@
+import pytest
+
+from app import create_app
+from config.opensearch_client import opensearch_ops
+from services import sessions
+from services.password_hasher import password_hasher, HasherBusyError
+
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+
+def _login(client, email):
+    response = client.post('/api/auth/login', json={'email': email, 'password': 'Secret123!'})
+    assert response.status_code == 200
+    return response.json
+
+
+def test_revoked_session_tokens_are_rejected(client):
+    client.post('/api/auth/register', json={'email': 'revoke@x.it', 'password': 'Secret123!',
+                                            'name': 'R', 'username': 'revoke'})
+    revoked = _login(client, 'revoke@x.it')
+    current = _login(client, 'revoke@x.it')
+
+    response = client.delete(f"/api/auth/sessions/{revoked['session_id']}",
+                             headers={'Authorization': f"Bearer {current['access_token']}"})
+    assert response.status_code == 200
+
+    response = client.get('/api/user/preferences',
+                          headers={'Authorization': f"Bearer {revoked['access_token']}"})
+    assert response.status_code == 401
+    response = client.post('/api/auth/refresh',
+                           headers={'Authorization': f"Bearer {revoked['refresh_token']}"})
+    assert response.status_code == 401
+    response = client.get('/api/auth/profile',
+                          headers={'Authorization': f"Bearer {current['access_token']}"})
+    assert response.status_code == 200
+
+
+def test_password_over_bcrypt_limit_is_rejected(client):
+    response = client.post('/api/auth/register', json={'email': 'long@x.it', 'password': 'è' * 40,
+                                                       'name': 'L', 'username': 'long'})
+    assert response.status_code == 400
+    assert 'password' in response.json['details']
+
+    # A long password at login is just wrong, not a server error
+    client.post('/api/auth/register', json={'email': 'short@x.it', 'password': 'Secret123!',
+                                            'name': 'S', 'username': 'short'})
+    response = client.post('/api/auth/login', json={'email': 'short@x.it', 'password': 'x' * 100})
+    assert response.status_code == 401
+
+
+def test_logout_deactivates_every_session_with_one_update(client, monkeypatch):
+    client.post('/api/auth/register', json={'email': 'logout@x.it', 'password': 'Secret123!',
+                                            'name': 'L', 'username': 'logout'})
+    first = _login(client, 'logout@x.it')
+    second = _login(client, 'logout@x.it')
+    calls = []
+    update_by_query = opensearch_ops.update_by_query
+
+    def recording_update_by_query(index, query, body, **kwargs):
+        calls.append(index)
+        return update_by_query(index, query, body, **kwargs)
+
+    monkeypatch.setattr(opensearch_ops, 'update_by_query', recording_update_by_query)
+    response = client.post('/api/auth/logout',
+                           headers={'Authorization': f"Bearer {first['access_token']}"})
+
+    assert response.status_code == 200
+    assert calls == ['sessions']
+    for session in (first, second):
+        doc = opensearch_ops.get_document('sessions', session['session_id'])
+        assert doc['_source']['is_active'] is False
+
+
+def test_logout_all_revokes_the_tokens_of_every_session(client, monkeypatch):
+    monkeypatch.setattr(sessions, 'TOKEN_PAGE_SIZE', 1)  # one session per page
+    client.post('/api/auth/register', json={'email': 'everywhere@x.it', 'password': 'Secret123!',
+                                            'name': 'E', 'username': 'everywhere'})
+    logins = [_login(client, 'everywhere@x.it') for _ in range(3)]
+
+    response = client.post('/api/auth/logout-all',
+                           headers={'Authorization': f"Bearer {logins[0]['access_token']}"})
+    assert response.status_code == 200
+    assert response.json['revoked_sessions'] == 3
+    for login in logins:
+        response = client.post('/api/auth/refresh',
+                               headers={'Authorization': f"Bearer {login['refresh_token']}"})
+        assert response.status_code == 401
+
+
+def test_busy_hasher_answers_503_with_retry_after(client, monkeypatch):
+    def busy(*args):
+        raise HasherBusyError(7)
+
+    monkeypatch.setattr(password_hasher, 'hash_password', busy)
+    monkeypatch.setattr(password_hasher, 'check_password', busy)
+
+    response = client.post('/api/auth/register', json={'email': 'busy@x.it', 'password': 'Secret123!',
+                                                       'name': 'B', 'username': 'busy'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+    assert response.json['error'] == 'Too many registration attempts, retry shortly'
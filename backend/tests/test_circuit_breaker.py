@@ -0,0 +1,81 @@
+import os
+import time
+
+from opensearchpy.exceptions import ConnectionError, TransportError
+
+from config import opensearch_client as client_module
+from config.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from config.opensearch_client import opensearch_ops
+
+
+def test_failures_open_the_circuit_until_a_trial_succeeds():
+    breaker = CircuitBreaker('test.breaker', failure_threshold=3, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # consecutive failures only
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # one trial call at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_opens_the_circuit_again():
+    breaker = CircuitBreaker('test.breaker', failure_threshold=1, reset_timeout=0.05)
+    breaker.trip()
+    time.sleep(0.06)
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+class DownClient:
+    """OpenSearch client double: unreachable, or answering 500/400"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def get(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+def _offline(monkeypatch, error):
+    client = DownClient(error)
+    breaker = CircuitBreaker('test.opensearch', failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(client_module, 'opensearch_client', client)
+    monkeypatch.setattr(client_module, 'opensearch_breaker', breaker)
+    # No background probe: the test drives the circuit
+    monkeypatch.setattr(client_module, '_probe_pid', os.getpid())
+    return client, breaker
+
+
+def test_outage_short_circuits_to_the_local_store(monkeypatch):
+    client_module.local_store.index('users', 'cb1', {'email': 'cb@x.it'})
+    client, breaker = _offline(monkeypatch, ConnectionError('N/A', 'refused', None))
+
+    for _ in range(4):
+        assert opensearch_ops.get_document('users', 'cb1')['_source']['email'] == 'cb@x.it'
+    assert client.calls == 2
+    assert breaker.state == OPEN
+
+
+def test_client_errors_do_not_open_the_circuit(monkeypatch):
+    client, breaker = _offline(monkeypatch, TransportError(400, 'bad request', {}))
+
+    for _ in range(4):
+        opensearch_ops.get_document('users', 'cb2')
+    assert client.calls == 4
+    assert breaker.state == CLOSED
@@ -0,0 +1,47 @@
+import pytest
+
+from config.opensearch_client import opensearch_ops, _source_params
+from services.fieldsets import FieldSet
+
+FIELDS = FieldSet({'id': [], 'price': ['total_price'], 'trip': ['request.dates', 'request.travelers']},
+                  summary=['id', 'price'])
+
+
+def test_selected_fields():
+    assert FIELDS.selected({}) == ['id', 'price', 'trip']
+    assert FIELDS.selected({'view': 'summary'}) == ['id', 'price']
+    assert FIELDS.selected({'fields': 'trip, id,trip', 'view': 'summary'}) == ['trip', 'id']
+    with pytest.raises(ValueError, match='hotels'):
+        FIELDS.selected({'fields': 'id,hotels'})
+    with pytest.raises(ValueError):
+        FIELDS.selected({'view': 'tiny'})
+
+
+def test_source_filter_of_the_selection():
+    assert FIELDS.source(['trip', 'price']) == {
+        'includes': ['request.dates', 'request.travelers', 'total_price']}
+    # Nothing to read: no document body at all, not the whole of it
+    assert FIELDS.source(['id']) is False
+    assert FIELDS.source(['id'], always=['user_id']) == {'includes': ['user_id']}
+    assert FIELDS.project({'id': 'x', 'price': 1, 'trip': {}}, ['price']) == {'price': 1}
+
+
+def test_source_params_for_get_and_mget():
+    assert _source_params(None) == {}
+    assert _source_params(False) == {'_source': 'false'}
+    assert _source_params(['a', 'b.c']) == {'_source_includes': 'a,b.c'}
+    assert _source_params({'includes': ['a'], 'excludes': ['a.b']}) == {
+        '_source_includes': 'a', '_source_excludes': 'a.b'}
+
+
+def test_operations_return_only_the_requested_source():
+    opensearch_ops.index_document('travels', 'fs-1', {'user_id': 'fs', 'status': 'new',
+                                                      'dates': {'from': '2025-06-01', 'to': '2025-06-08'}})
+
+    assert opensearch_ops.get_document('travels', 'fs-1', source=['dates.to'])['_source'] == {
+        'dates': {'to': '2025-06-08'}}
+    hits = opensearch_ops.search_documents('travels', query={'term': {'user_id': 'fs'}},
+                                           source={'includes': ['status', 'dates'],
+                                                   'excludes': ['dates.from']})['hits']['hits']
+    assert hits[0]['_source'] == {'status': 'new', 'dates': {'to': '2025-06-08'}}
+    assert opensearch_ops.mget('travels', ['fs-1'], source=False)[0]['_source'] == {}
@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from routes import travel as travel_routes
+from services.job_tracker import job_tracker
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(job_tracker, 'start', lambda: None)
+    monkeypatch.setattr(travel_routes, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+    return create_app().test_client()
+
+
+def _events(body):
+    """(event, data) pairs of an event stream, keep-alive comments included"""
+    events = []
+    for message in body.split('\n\n'):
+        if message.startswith(': '):
+            events.append(('comment', message[2:]))
+        elif message.startswith('event: '):
+            head, data = message.split('\n', 1)
+            events.append((head[7:], json.loads(data[6:])))
+    return events
+
+
+def test_stream_pushes_transitions_then_the_result(client, monkeypatch):
+    job = job_tracker.track('job-sse', travel_id='t-sse')
+    monkeypatch.setattr(job_tracker, 'get_result', lambda job_id: [{'id_pacchetto': 'p1'}])
+
+    def progress():
+        time.sleep(0.1)  # long enough for a keep-alive
+        job_tracker._set_status(job, {'status': 'RUNNING'})
+        time.sleep(0.1)
+        job_tracker._set_status(job, {'status': 'COMPLETED'})
+
+    threading.Thread(target=progress).start()
+    response = client.get('/api/travel/jobs/job-sse/events')
+
+    assert response.mimetype == 'text/event-stream'
+    events = _events(response.get_data(as_text=True))
+    assert ('comment', 'keep-alive') in events
+    assert [event for event in events if event[0] != 'comment'] == [
+        ('status', {'status': 'RUNNING'}), ('status', {'status': 'COMPLETED'}),
+        ('result', [{'id_pacchetto': 'p1'}])]
+
+
+def test_failed_job_ends_the_stream(client):
+    job = job_tracker.track('job-sse-failed', travel_id='t-sse-failed')
+    job_tracker._set_status(job, {'status': 'FAILED'})
+
+    events = _events(client.get('/api/travel/jobs/job-sse-failed/events').get_data(as_text=True))
+    assert events == [('status', {'status': 'FAILED'}),
+                      ('failure', {'error': 'Job failed', 'details': {'status': 'FAILED'}})]
+
+
+def test_unknown_job_is_not_streamed(client):
+    assert client.get('/api/travel/jobs/job-nowhere/events').status_code == 404
@@ -0,0 +1,73 @@
+import pytest
+
+from config.opensearch_client import opensearch_ops
+from services import job_results
+from services.job_results import (stored_job_result, load_job_result, get_result_marker,
+                                  save_travel_packages)
+
+
+def test_stored_job_result_keeps_package_order():
+    opensearch_ops.bulk_index('travel_packages', [
+        ('job9:p1', {'job_id': 'job9', 'package_id': 'p1', 'hotels_selezionati': {'roma': {}}}),
+        ('job9:p2', {'job_id': 'job9', 'package_id': 'p2', 'esperienze_selezionate': {'roma': {}}})
+    ])
+    marker = {'job_id': 'job9', 'status': 'stored', 'package_ids': ['job9:p2', 'job9:p1']}
+
+    assert stored_job_result(marker) == [
+        {'id_pacchetto': 'p2', 'hotels_selezionati': {}, 'esperienze_selezionate': {'roma': {}}},
+        {'id_pacchetto': 'p1', 'hotels_selezionati': {'roma': {}}, 'esperienze_selezionate': {}}
+    ]
+    assert stored_job_result({'job_id': 'job8', 'package_ids': []}) == []
+    with pytest.raises(Exception, match='job9:p3'):
+        stored_job_result({**marker, 'package_ids': ['job9:p1', 'job9:p3']})
+
+
+def test_interim_result_is_not_stored(monkeypatch):
+    replies = [{'status': 'RUNNING'}, [{'id_pacchetto': 'p1'}]]
+    monkeypatch.setattr(job_results, 'fetch_job_result', lambda job_id: replies.pop(0))
+
+    assert load_job_result('job7') == {'status': 'RUNNING'}
+    assert get_result_marker('job7') is None
+    assert load_job_result('job7') == [{'id_pacchetto': 'p1'}]
+    assert get_result_marker('job7')['package_ids'] == ['job7:p1']
+    # Later calls are rebuilt from the stored packages
+    assert load_job_result('job7') == [
+        {'id_pacchetto': 'p1', 'hotels_selezionati': {}, 'esperienze_selezionate': {}}]
+
+
+def test_completed_job_result_is_stored_as_is(monkeypatch):
+    replies = [{'message': 'no packages'}]
+    monkeypatch.setattr(job_results, 'fetch_job_result', lambda job_id: replies.pop(0))
+
+    assert load_job_result('job6', completed=True) == {'message': 'no packages'}
+    # Served from the marker, the external API is not asked again
+    assert load_job_result('job6') == {'message': 'no packages'}
+
+
+def test_saving_a_result_again_overwrites_its_packages(monkeypatch):
+    calls = []
+    bulk_index = opensearch_ops.bulk_index
+
+    def counting_bulk_index(index, documents, **kwargs):
+        calls.append(index)
+        return bulk_index(index, documents, **kwargs)
+
+    monkeypatch.setattr(opensearch_ops, 'bulk_index', counting_bulk_index)
+    result = [{'id_pacchetto': 'p1'}, {'id_pacchetto': 'p2'}, {}]
+
+    ids = save_travel_packages('job5', result, user_id='u5')
+    assert ids == ['job5:p1', 'job5:p2', 'job5:package_3']
+    assert save_travel_packages('job5', result, user_id='u5') == ids
+    # One bulk request per save, whatever the number of packages
+    assert calls == ['travel_packages', 'travel_packages']
+    hits = opensearch_ops.search_documents('travel_packages', query={'term': {'job_id': 'job5'}},
+                                           size=10)['hits']
+    assert hits['total']['value'] == 3
+
+
+def test_failed_package_save_raises(monkeypatch):
+    monkeypatch.setattr(opensearch_ops, 'bulk_index', lambda index, documents, **kwargs: {
+        'indexed': 0, 'errors': [{'_id': 'job4:p1', 'status': 400, 'error': 'mapper_parsing'}]})
+
+    with pytest.raises(Exception, match='1 of 1'):
+        save_travel_packages('job4', [{'id_pacchetto': 'p1'}], user_id='u4')
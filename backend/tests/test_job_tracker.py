@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from config.opensearch_client import opensearch_ops
+from services import job_tracker as tracker_module
+from services.job_tracker import JobTracker, JobNotFoundError, MIN_POLL_INTERVAL
+
+
+@pytest.fixture
+def tracker(tmp_path, monkeypatch):
+    tracker = JobTracker(lock_file=str(tmp_path / 'tracker.lock'))
+    # Poll by hand instead of from the background loop
+    monkeypatch.setattr(tracker, 'start', lambda: None)
+    return tracker
+
+
+def _travel(travel_id, job_id):
+    opensearch_ops.index_document('travels', travel_id, {
+        'user_id': 'u1', 'external_job_id': job_id, 'created_at': datetime.utcnow().isoformat()})
+
+
+def test_only_jobs_of_a_travel_request_are_tracked(tracker):
+    _travel('t-track', 'job-track')
+
+    assert tracker.track('job-unknown') is None
+    assert tracker.track('job-track').travel_id == 't-track'
+    assert tracker.track('job-track') is tracker.track('job-track')
+
+
+def test_status_transitions_are_published_and_polling_backs_off(tracker, monkeypatch):
+    _travel('t-poll', 'job-poll')
+    replies = [{'status': 'RUNNING'}, {'status': 'RUNNING'}, {'status': 'COMPLETED'}]
+    monkeypatch.setattr(tracker_module, 'fetch_job_status', lambda job_id: replies.pop(0))
+    job = tracker.track('job-poll')
+
+    tracker._poll_job(job)
+    assert (job.status, job.version, job.interval) == ('RUNNING', 1, MIN_POLL_INTERVAL)
+    tracker._poll_job(job)
+    assert job.version == 1
+    assert job.interval > MIN_POLL_INTERVAL
+    tracker._poll_job(job)
+    assert job.finished
+
+    travel = opensearch_ops.get_document('travels', 't-poll')['_source']
+    assert travel['external_job_status'] == 'COMPLETED'
+    assert tracker.get_status('job-poll') == ({'status': 'COMPLETED'}, 0, None)
+    assert tracker.stats['upstream_polls'] == 3
+
+
+def test_job_unknown_upstream_fails_once(tracker, monkeypatch):
+    _travel('t-gone', 'job-gone')
+
+    def fetch(job_id):
+        raise JobNotFoundError(job_id)
+
+    monkeypatch.setattr(tracker_module, 'fetch_job_status', fetch)
+    job = tracker.track('job-gone')
+    tracker._poll_job(job)
+
+    assert job.status == 'ERROR'
+    assert opensearch_ops.get_document('travels', 't-gone')['_source']['external_job_status'] == 'ERROR'
+    assert 'job-gone' not in tracker._jobs
+
+
+def test_oldest_finished_job_is_evicted_first(tracker, monkeypatch):
+    monkeypatch.setattr(tracker_module, 'MAX_TRACKED_JOBS', 2)
+    running = tracker.track('job-a', travel_id='t-a')
+    finished = tracker.track('job-b', travel_id='t-b')
+    finished.status_data = {'status': 'COMPLETED'}
+
+    tracker.track('job-c', travel_id='t-c')
+    assert set(tracker._jobs) == {'job-a', 'job-c'}
+    assert tracker._jobs['job-a'] is running
+    assert tracker.stats['evictions'] == 1
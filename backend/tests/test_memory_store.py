@@ -0,0 +1,29 @@
+from config.memory_store import MemoryStore
+from config.query_dsl import merge_partial
+
+
+def test_merge_partial_matches_opensearch():
+    source = {'travelers': {'adults': 2, 'children': 1}, 'tags': ['a', 'b'], 'name': 'A'}
+
+    # Objects merge recursively, arrays and scalars are replaced
+    assert merge_partial(source, {'travelers': {'adults': 3}, 'tags': ['c']}) == {
+        'travelers': {'adults': 3, 'children': 1}, 'tags': ['c'], 'name': 'A'}
+    assert merge_partial(source, {'travelers': None}) == {
+        'travelers': None, 'tags': ['a', 'b'], 'name': 'A'}
+    assert source['travelers'] == {'adults': 2, 'children': 1}
+
+
+def test_partial_updates_keep_sibling_keys():
+    store = MemoryStore(keyword_fields={'travels': {'user_id'}})
+    store.index('travels', 't1', {'user_id': 'u1', 'dates': {'check_in': '2025-06-01',
+                                                              'check_out': '2025-06-08'}})
+    store.index('travels', 't2', {'user_id': 'u1', 'travelers': {'adults': 2, 'children': 1}})
+
+    store.update('travels', 't1', {'dates': {'check_out': '2025-06-10'}})
+    store.update_by_query('travels', {'term': {'user_id': 'u1'}}, {'travelers': {'adults': 4}})
+
+    t1 = store.get('travels', 't1')['_source']
+    t2 = store.get('travels', 't2')['_source']
+    assert t1['dates'] == {'check_in': '2025-06-01', 'check_out': '2025-06-10'}
+    assert t1['travelers'] == {'adults': 4}
+    assert t2['travelers'] == {'adults': 4, 'children': 1}
@@ -0,0 +1,22 @@
+from config.opensearch_client import opensearch_ops
+
+
+def test_get_document_returns_none_when_missing():
+    opensearch_ops.index_document('users', 'u1', {'email': 'a@x.it'})
+
+    assert opensearch_ops.get_document('users', 'u1')['_source']['email'] == 'a@x.it'
+    assert opensearch_ops.get_document('users', 'missing') is None
+    assert opensearch_ops.get_document('no_such_index', 'u1') is None
+
+
+def test_bulk_index_reports_existing_documents_on_create():
+    response = opensearch_ops.bulk_index('travel_packages', [('bulk:p1', {'package_id': 'p1'}),
+                                                             ('bulk:p2', {'package_id': 'p2'})])
+    assert response == {'indexed': 2, 'errors': []}
+
+    response = opensearch_ops.bulk_index('travel_packages', [('bulk:p2', {'package_id': 'new'}),
+                                                             ('bulk:p3', {'package_id': 'p3'})],
+                                         op_type='create')
+    assert response['indexed'] == 1
+    assert [(e['_id'], e['status']) for e in response['errors']] == [('bulk:p2', 409)]
+    assert opensearch_ops.get_document('travel_packages', 'bulk:p2')['_source']['package_id'] == 'p2'
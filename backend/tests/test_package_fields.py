@@ -0,0 +1,54 @@
+import importlib.util
+import os
+
+from config.opensearch_client import opensearch_ops
+from services.job_results import package_pricing, package_experiences
+
+
+def test_pricing_from_hotels():
+    pricing = package_pricing({
+        'Roma': {'checkin': '01/06/2025', 'checkout': '04/06/2025', 'daily_prices': 99.9},
+        'Napoli': {'checkin': '04/06/2025', 'checkout': '06/06/2025', 'daily_prices': 'n/a'},
+        'Bari': {'checkin': 'soon', 'daily_prices': 50},
+        'Lecce': None
+    })
+
+    assert pricing['total_price'] == 349.7
+    assert pricing['nights'] == 3 + 2 + 1 + 1
+    assert pricing['destinations'] == ['Roma', 'Napoli', 'Bari', 'Lecce']
+    assert pricing['city_costs'][0] == {'city': 'Roma', 'nights': 3, 'daily_price': 99.9,
+                                        'cost': 299.7}
+    assert package_pricing(None) == {'total_price': 0, 'nights': 0, 'destinations': [],
+                                     'city_costs': []}
+
+
+def test_experience_fields():
+    assert package_experiences({
+        'Roma': {'categoria': ' Cultura '},
+        'Napoli': {'categorie': ['cibo', 'CULTURA', None]},
+        'Bari': 'not an object'
+    }) == {'experience_count': 3, 'experience_cities': ['Roma', 'Napoli', 'Bari'],
+           'experience_categories': ['cultura', 'cibo']}
+
+
+def _backfill_script():
+    path = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'backfill_package_fields.py')
+    spec = importlib.util.spec_from_file_location('backfill_package_fields', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_backfill_adds_the_fields_to_older_packages():
+    opensearch_ops.index_document('travel_packages', 'old-1', {
+        'user_id': 'u-old',
+        'hotels_selezionati': {'Roma': {'checkin': '01/06/2025', 'checkout': '03/06/2025',
+                                        'daily_prices': 100}},
+        'esperienze_selezionate': {'Roma': {'categoria': 'Arte'}}})
+
+    _backfill_script().main()
+
+    package = opensearch_ops.get_document('travel_packages', 'old-1')['_source']
+    assert (package['total_price'], package['nights'], package['destinations']) == (200, 2, ['Roma'])
+    assert package['experience_categories'] == ['arte']
+    assert package['hotels_selezionati']['Roma']['daily_prices'] == 100
@@ -0,0 +1,150 @@
+import uuid
+
+import pytest
+
+from app import create_app
+from config.opensearch_client import opensearch_ops
+from routes import travel as travel_routes
+from services.job_results import save_travel_packages
+
+
+def _hotel(checkin, checkout, daily_price):
+    return {'checkin': checkin, 'checkout': checkout, 'daily_prices': daily_price}
+
+
+# (job, package key, hotels, experiences) saved for the user of each test
+PACKAGES = [
+    ('job-a', 'p1', {'Roma': _hotel('01/06/2025', '04/06/2025', 100)},
+     {'Roma': {'categoria': 'Cultura'}}),
+    ('job-a', 'p2', {'Roma': _hotel('01/06/2025', '03/06/2025', 80),
+                     'Napoli': _hotel('03/06/2025', '05/06/2025', 120)},
+     {'Napoli': {'categorie': ['Cibo', 'cultura']}}),
+    ('job-b', 'p1', {'Firenze': _hotel('10/07/2025', '17/07/2025', 150)},
+     {'Firenze': {'category': 'Arte'}}),
+    ('job-b', 'p2', {'Napoli': _hotel('10/07/2025', '11/07/2025', 'n/a')}, {}),
+    ('job-b', 'p3', {'Milano': _hotel('10/07/2025', '12/07/2025', 200)}, {}),
+]
+
+
+@pytest.fixture
+def user():
+    """(client, headers, user_id) of a new user owning PACKAGES"""
+    client = create_app().test_client()
+    email = f"{uuid.uuid4().hex[:12]}@x.it"
+    response = client.post('/api/auth/register', json={'email': email, 'password': 'Secret123!',
+                                                       'name': 'P', 'username': email})
+    user_id = response.json['user']['id']
+    for job in ('job-a', 'job-b'):
+        save_travel_packages(f"{job}-{user_id}", [
+            {'id_pacchetto': key, 'hotels_selezionati': hotels, 'esperienze_selezionate': experiences}
+            for package_job, key, hotels, experiences in PACKAGES if package_job == job
+        ], user_id=user_id)
+    return client, {'Authorization': f"Bearer {response.json['access_token']}"}, user_id
+
+
+def _get(client, headers, path):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def test_pages_are_chained_with_the_cursor(user):
+    client, headers, _ = user
+    ids = []
+    cursor = ''
+    pages = 0
+    while cursor is not None:
+        page = _get(client, headers, f"/api/travel/my-packages?limit=2&cursor={cursor}")
+        assert page['total'] == 5
+        ids.extend(package['id'] for package in page['packages'])
+        cursor = page['next_cursor']
+        pages += 1
+
+    assert pages == 3
+    assert len(ids) == len(set(ids)) == 5
+    assert ids == [package['id'] for package in
+                   _get(client, headers, '/api/travel/my-packages')['packages']]
+
+
+def test_price_sort_pages_like_one_query(user):
+    client, headers, _ = user
+    first = _get(client, headers, '/api/travel/my-packages?sort=price_asc&limit=3')
+    rest = _get(client, headers, '/api/travel/my-packages?sort=price_asc&limit=3'
+                                 f"&cursor={first['next_cursor']}")
+
+    prices = [package['total_price'] for package in first['packages'] + rest['packages']]
+    assert prices == [0, 300, 400, 400, 1050]
+    assert rest['next_cursor'] is None
+
+
+def test_destination_filter(user):
+    client, headers, _ = user
+    packages = _get(client, headers, '/api/travel/my-packages?destination=Napoli')['packages']
+
+    assert sorted(package['package_id'] for package in packages) == ['p2', 'p2']
+
+
+@pytest.mark.parametrize('query', ['sort=cheapest', 'limit=many', 'cursor=not-a-cursor',
+                                   'sort=price_asc&cursor=WyIyMDI1Il0='])
+def test_invalid_page_parameters_are_rejected(user, query):
+    client, headers, _ = user
+    assert client.get(f"/api/travel/my-packages?{query}", headers=headers).status_code == 400
+
+
+def test_search_filters_and_counts_facets(user):
+    client, headers, _ = user
+    result = _get(client, headers, '/api/travel/packages/search?category=Cultura&max_price=500')
+
+    assert sorted(package['id'].split(':')[1] for package in result['packages']) == ['p1', 'p2']
+    assert result['total'] == 2
+    facets = result['facets']
+    assert facets['destinations'] == [{'value': 'Roma', 'count': 2}, {'value': 'Napoli', 'count': 1}]
+    assert facets['experience_categories'] == [{'value': 'cultura', 'count': 2},
+                                               {'value': 'cibo', 'count': 1}]
+    assert [bucket['count'] for bucket in facets['price']] == [2, 0, 0, 0]
+    assert facets['price'][1] == {'value': '500.0-1000.0', 'count': 0, 'from': 500.0, 'to': 1000.0}
+    assert [bucket['count'] for bucket in facets['nights']] == [1, 1, 0, 0]
+
+
+def test_search_ors_repeated_filters(user):
+    client, headers, _ = user
+    result = _get(client, headers, '/api/travel/packages/search?destination=Firenze'
+                                   '&destination=Milano&min_nights=2&max_nights=7')
+
+    assert sorted(package['destinations'][0] for package in result['packages']) == ['Firenze', 'Milano']
+
+
+def test_search_scope(user, monkeypatch):
+    client, headers, user_id = user
+    assert client.get('/api/travel/packages/search?scope=all', headers=headers).status_code == 403
+    assert client.get('/api/travel/packages/search?min_price=cheap',
+                      headers=headers).status_code == 400
+
+    save_travel_packages('job-someone-else', [{'id_pacchetto': 'p1'}], user_id='someone-else')
+    monkeypatch.setattr(travel_routes, 'PACKAGE_SEARCH_ADMINS', {user_id})
+    own = _get(client, headers, '/api/travel/packages/search')
+    everyone = _get(client, headers, '/api/travel/packages/search?scope=all&limit=100')
+    assert own['total'] == 5
+    assert 'job-someone-else:p1' in [package['id'] for package in everyone['packages']]
+
+
+def test_sparse_fieldsets_fetch_only_what_they_return(user, monkeypatch):
+    client, headers, _ = user
+    sources = []
+    search_documents = opensearch_ops.search_documents
+
+    def recording_search(index, **kwargs):
+        sources.append(kwargs.get('source'))
+        return search_documents(index, **kwargs)
+
+    monkeypatch.setattr(opensearch_ops, 'search_documents', recording_search)
+    packages = _get(client, headers, '/api/travel/my-packages?fields=id,total_price')['packages']
+    summary = _get(client, headers, '/api/travel/my-packages?view=summary')['packages']
+
+    assert {tuple(package) for package in packages} == {('id', 'total_price')}
+    assert sources[0] == {'includes': ['total_price']}
+    assert set(summary[0]) == {'id', 'package_id', 'job_id', 'travel_id', 'destinations',
+                               'total_price', 'nights', 'status', 'created_at'}
+    assert 'hotels_selezionati' not in sources[1]['includes']
+    response = client.get('/api/travel/my-packages?fields=id,secret', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from services import password_hasher as hasher_module
+from services.password_hasher import PasswordHasher, HasherBusyError
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setattr(hasher_module, 'QUEUE_LIMIT', 1)
+    hasher = PasswordHasher()
+    pool = ThreadPoolExecutor(max_workers=1)
+    # Threads instead of processes, so the test can hold a hash back
+    monkeypatch.setattr(hasher, '_executor', lambda: pool)
+    yield hasher
+    pool.shutdown()
+
+
+def test_full_queue_is_refused_with_retry_after(hasher, monkeypatch):
+    release = threading.Event()
+
+    def slow_hash(password, rounds):
+        started = time.time()
+        release.wait(5)
+        return f"hash-of-{password}", started, time.time()
+
+    monkeypatch.setattr(hasher_module, '_hash', slow_hash)
+    hashed = []
+    first = threading.Thread(target=lambda: hashed.append(hasher.hash_password('one')))
+    first.start()
+    while not hasher._in_flight:
+        time.sleep(0.01)
+
+    with pytest.raises(HasherBusyError) as busy:
+        hasher.hash_password('two')
+    assert 1 <= busy.value.retry_after <= 30
+    assert hasher.stats['rejected'] == 1
+
+    release.set()
+    first.join()
+    assert hashed == ['hash-of-one']
+    # The slot is free again
+    assert hasher.hash_password('three') == 'hash-of-three'
+
+
+def test_hashes_verify_and_report_their_cost(hasher, monkeypatch):
+    monkeypatch.setattr(hasher_module, 'BCRYPT_LOG_ROUNDS', 4)
+    hashed = hasher.hash_password('Secret123!')
+
+    assert hasher.check_password(hashed, 'Secret123!')
+    assert not hasher.check_password(hashed, 'wrong')
+    assert not hasher.check_password('not-a-hash', 'Secret123!')
+    assert hasher_module.hash_cost(hashed) == 4
+    assert not hasher.needs_rehash(hashed)
+    monkeypatch.setattr(hasher_module, 'BCRYPT_LOG_ROUNDS', 5)
+    assert hasher.needs_rehash(hashed)
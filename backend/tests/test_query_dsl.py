@@ -0,0 +1,154 @@
+import pytest
+
+from config.memory_store import MemoryStore
+from config.query_dsl import matches, sort_hits, search_after_hits, filter_source, aggregate
+from config.sqlite_store import SQLiteStore
+
+KEYWORDS = {'travels': {'user_id', 'status', 'tags'}}
+
+TRAVELS = [
+    ('t1', {'user_id': 'u1', 'status': 'submitted', 'tags': ['mare', 'relax'], 'budget': 800,
+            'title': 'Estate in Sardegna', 'dates': {'check_in': '2025-06-01'}}),
+    ('t2', {'user_id': 'u1', 'status': 'completed', 'tags': ['montagna'], 'budget': 1500,
+            'title': 'Trekking in Trentino'}),
+    ('t3', {'user_id': 'u2', 'status': 'submitted', 'budget': 300, 'title': 'Weekend a Roma',
+            'dates': {'check_in': '2025-05-10'}}),
+    ('t4', {'user_id': 'u2', 'status': 'cancelled', 'tags': ['mare'], 'title': 'Sardegna del nord'}),
+]
+
+
+@pytest.mark.parametrize('query, expected', [
+    (None, ['t1', 't2', 't3', 't4']),
+    ({'term': {'user_id': 'u1'}}, ['t1', 't2']),
+    ({'term': {'tags': {'value': 'mare'}}}, ['t1', 't4']),
+    ({'terms': {'status': ['completed', 'cancelled']}}, ['t2', 't4']),
+    ({'ids': {'values': ['t3', 'missing']}}, ['t3']),
+    # Text fields match by token, case insensitively
+    ({'match': {'title': 'sardegna'}}, ['t1', 't4']),
+    ({'match': {'title': {'query': 'sardegna nord', 'operator': 'and'}}}, ['t4']),
+    # Keyword fields match exactly
+    ({'match': {'status': 'Submitted'}}, []),
+    ({'exists': {'field': 'dates.check_in'}}, ['t1', 't3']),
+    ({'range': {'budget': {'gte': 300, 'lt': 1500}}}, ['t1', 't3']),
+    ({'range': {'dates.check_in': {'gt': '2025-05-31'}}}, ['t1']),
+    ({'bool': {'filter': [{'term': {'status': 'submitted'}}],
+               'must_not': {'term': {'user_id': 'u2'}}}}, ['t1']),
+    ({'bool': {'should': [{'term': {'tags': 'montagna'}}, {'range': {'budget': {'lt': 500}}}]}},
+     ['t2', 't3']),
+    ({'bool': {'must': {'term': {'user_id': 'u2'}},
+               'should': [{'term': {'tags': 'mare'}}]}}, ['t3', 't4']),
+    ({'bool': {'must': {'term': {'user_id': 'u2'}}, 'should': [{'term': {'tags': 'mare'}}],
+               'minimum_should_match': 1}}, ['t4']),
+])
+def test_matches(query, expected):
+    assert [doc_id for doc_id, source in TRAVELS
+            if matches(query, doc_id, source, KEYWORDS['travels'])] == expected
+
+
+def test_unsupported_queries_are_refused():
+    with pytest.raises(ValueError):
+        matches({'wildcard': {'title': 'sard*'}}, 't1', TRAVELS[0][1])
+
+
+def _hits():
+    return [{'_id': doc_id, '_source': source} for doc_id, source in TRAVELS]
+
+
+def test_sort_puts_missing_values_last_both_ways():
+    assert [h['_id'] for h in sort_hits(_hits(), [{'budget': 'asc'}])] == ['t3', 't1', 't2', 't4']
+    assert [h['_id'] for h in sort_hits(_hits(), [{'budget': {'order': 'desc'}}])] == [
+        't2', 't1', 't3', 't4']
+    assert [h['_id'] for h in sort_hits(_hits(), ['user_id', {'_id': 'desc'}])] == [
+        't2', 't1', 't4', 't3']
+
+
+def test_search_after_continues_the_sort():
+    sort = [{'budget': 'desc'}, {'_id': 'asc'}]
+    hits = sort_hits(_hits(), sort)
+
+    assert [h['_id'] for h in search_after_hits(hits, sort, hits[1]['sort'])] == ['t3', 't4']
+    assert search_after_hits(hits, sort, hits[-1]['sort']) == []
+
+
+def test_source_filtering():
+    source = TRAVELS[0][1]
+
+    assert filter_source(source, ['user_id', 'dates.*']) == {
+        'user_id': 'u1', 'dates': {'check_in': '2025-06-01'}}
+    assert filter_source(source, {'excludes': ['tags', 'title', 'dates']}) == {
+        'user_id': 'u1', 'status': 'submitted', 'budget': 800}
+    assert filter_source(source, False) == {}
+    assert filter_source(source, None) is source
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = MemoryStore(keyword_fields=KEYWORDS)
+    else:
+        store = SQLiteStore(str(tmp_path / 'store.sqlite3'), keyword_fields=KEYWORDS)
+    for doc_id, source in TRAVELS:
+        store.index('travels', doc_id, source)
+    return store
+
+
+def test_stores_answer_like_the_evaluator(store):
+    # Keyword lookups may come from an index, the answer must not change
+    for query in ({'term': {'user_id': 'u2'}}, {'terms': {'tags': ['mare', 'relax']}},
+                  {'bool': {'filter': [{'term': {'user_id': 'u1'}},
+                                       {'range': {'budget': {'gt': 1000}}}]}}):
+        expected = [doc_id for doc_id, source in TRAVELS
+                    if matches(query, doc_id, source, KEYWORDS['travels'])]
+        result = store.search('travels', query, size=10)
+        assert [hit['_id'] for hit in result['hits']['hits']] == expected
+        assert result['hits']['total']['value'] == len(expected)
+
+
+def test_stores_keep_keyword_lookups_current(store):
+    store.update('travels', 't3', {'user_id': 'u1'})
+    store.delete('travels', 't1')
+
+    hits = store.search('travels', {'term': {'user_id': 'u1'}}, size=10)['hits']['hits']
+    assert [hit['_id'] for hit in hits] == ['t2', 't3']
+    assert store.search('travels', {'term': {'user_id': 'u2'}}, size=10)['hits']['hits'][0]['_id'] == 't4'
+
+
+def test_stores_page_with_search_after(store):
+    sort = [{'budget': 'asc'}, {'_id': 'asc'}]
+    first = store.search('travels', None, size=2, sort=sort)['hits']['hits']
+    rest = store.search('travels', None, size=2, sort=sort,
+                        search_after=first[-1]['sort'])['hits']['hits']
+
+    assert [hit['_id'] for hit in first + rest] == ['t3', 't1', 't2', 't4']
+
+
+def test_terms_aggregation_counts_like_opensearch():
+    sources = [source for _, source in TRAVELS]
+    result = aggregate({
+        'statuses': {'terms': {'field': 'status', 'size': 2}},
+        'tags': {'terms': {'field': 'tags', 'missing': 'none', 'order': {'_key': 'asc'}},
+                 'aggs': {'users': {'value_count': {'field': 'user_id'}}}}
+    }, sources)
+
+    # Ties on the count are broken by ascending key; the rest is summed
+    assert result['statuses'] == {'doc_count_error_upper_bound': 0, 'sum_other_doc_count': 1,
+                                  'buckets': [{'key': 'submitted', 'doc_count': 2},
+                                              {'key': 'cancelled', 'doc_count': 1}]}
+    assert [(b['key'], b['doc_count'], b['users']['value']) for b in result['tags']['buckets']] == [
+        ('mare', 2, 2), ('montagna', 1, 1), ('none', 1, 1), ('relax', 1, 1)]
+
+
+def test_range_aggregation_includes_from_and_excludes_to():
+    sources = [source for _, source in TRAVELS]
+    result = aggregate({'budgets': {'range': {'field': 'budget', 'ranges': [
+        {'to': 800}, {'from': 800, 'to': 1500}, {'key': 'high', 'from': 1500}]}}}, sources)
+
+    assert result['budgets']['buckets'] == [
+        {'key': '*-800.0', 'to': 800.0, 'doc_count': 1},
+        {'key': '800.0-1500.0', 'from': 800.0, 'to': 1500.0, 'doc_count': 1},
+        {'key': 'high', 'from': 1500.0, 'doc_count': 1}]
+
+
+def test_unsupported_aggregations_are_refused():
+    with pytest.raises(ValueError):
+        aggregate({'avg_budget': {'avg': {'field': 'budget'}}}, [])
@@ -0,0 +1,41 @@
+import pytest
+
+from config import opensearch_client as client_module
+from config.opensearch_client import opensearch_ops, refresh_policy
+
+
+class RecordingClient:
+    """OpenSearch client double keeping the refresh parameter of each write"""
+
+    def __init__(self):
+        self.refresh = []
+
+    def index(self, index, id, body, refresh, **params):
+        self.refresh.append((index, refresh))
+        return {'_index': index, '_id': id, 'result': 'created'}
+
+    def update(self, index, id, body, refresh):
+        self.refresh.append((index, refresh))
+        return {'_index': index, '_id': id, 'result': 'updated'}
+
+
+def test_policy_is_per_index_and_per_call():
+    assert refresh_policy('sessions') == 'false'
+    assert refresh_policy('travel_packages') == 'wait_for'
+    assert refresh_policy('sessions', 'wait_for') == 'wait_for'
+    assert refresh_policy('sessions', True) == 'true'
+    assert refresh_policy('travel_packages', False) == 'false'
+    with pytest.raises(ValueError):
+        refresh_policy('sessions', 'always')
+
+
+def test_writes_send_the_policy_of_their_index(monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(client_module, 'opensearch_client', client)
+
+    opensearch_ops.index_document('sessions', 's1', {'is_active': True})
+    opensearch_ops.index_document('preferences', 'u1', {'budget': 100})
+    opensearch_ops.update_document('travels', 't1', {'status': 'done'}, refresh='wait_for')
+
+    assert client.refresh == [('sessions', 'false'), ('preferences', 'wait_for'),
+                              ('travels', 'wait_for')]
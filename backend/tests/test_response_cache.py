@@ -0,0 +1,71 @@
+from datetime import timedelta
+import uuid
+
+import pytest
+
+from app import create_app
+from services import response_cache as cache_module
+from services.response_cache import response_cache, ResponseCache
+
+
+def _register(client):
+    email = f"{uuid.uuid4().hex[:12]}@x.it"
+    response = client.post('/api/auth/register', json={'email': email, 'password': 'Secret123!',
+                                                       'name': 'C', 'username': email})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}, response.json['user']['id']
+
+
+@pytest.fixture
+def user(monkeypatch):
+    """(client, headers, user_id) of a new user; responses are cached at once"""
+    monkeypatch.setattr(cache_module, 'SETTLE_TIME', timedelta(0))
+    client = create_app().test_client()
+    return (client, *_register(client))
+
+
+def test_matching_etag_gets_304(user):
+    client, headers, _ = user
+    first = client.get('/api/user/preferences', headers=headers)
+    etag = first.headers['ETag']
+    hits = response_cache.stats['hits']
+
+    again = client.get('/api/user/preferences', headers={**headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == etag
+    assert response_cache.stats['hits'] == hits + 1
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_writes_invalidate_cached_responses(user):
+    client, headers, _ = user
+    etag = client.get('/api/user/preferences', headers=headers).headers['ETag']
+
+    response = client.put('/api/user/preferences', headers=headers, json={'travel_style': 'slow'})
+    assert response.status_code == 200
+    response = client.get('/api/user/preferences', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['preferences'] == {'travel_style': 'slow'}
+    assert response.headers['ETag'] != etag
+
+
+def test_invalidation_reaches_other_workers(user):
+    client, headers, user_id = user
+    body = client.get('/api/user/preferences', headers=headers).get_data()
+    assert client.get('/api/user/preferences', headers=headers).get_data() == body
+
+    # Another worker's cache, sharing only the response_versions index
+    ResponseCache().invalidate(user_id)
+    misses = response_cache.stats['misses']
+    client.get('/api/user/preferences', headers=headers)
+    assert response_cache.stats['misses'] == misses + 1
+
+
+def test_responses_of_other_users_are_not_shared(user):
+    client, headers, _ = user
+    other_headers, _ = _register(client)
+    client.put('/api/user/preferences', headers=headers, json={'budget_range': 'low'})
+    assert client.get('/api/user/preferences', headers=headers).json['preferences'] == {
+        'budget_range': 'low'}
+
+    assert client.get('/api/user/preferences', headers=other_headers).json['preferences'] == {}
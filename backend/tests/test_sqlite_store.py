@@ -0,0 +1,39 @@
+from datetime import date
+
+import pytest
+
+from config.document_store import DocumentStore
+from config.sqlite_store import SQLiteStore
+
+
+def test_travel_with_dates_is_stored(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'store.sqlite3'), keyword_fields={'travels': {'user_id'}})
+    store.index('travels', 't1', {
+        'user_id': 'u1',
+        'dates': {'check_in': date(2025, 6, 1), 'check_out': date(2025, 6, 8)}
+    })
+    store.update('travels', 't1', {'status': 'submitted'})
+
+    source = store.get('travels', 't1')['_source']
+    assert source['dates'] == {'check_in': '2025-06-01', 'check_out': '2025-06-08'}
+    assert source['status'] == 'submitted'
+    hits = store.search('travels', {'term': {'user_id': 'u1'}})['hits']['hits']
+    assert [hit['_id'] for hit in hits] == ['t1']
+
+
+def test_partial_updates_keep_sibling_keys(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'store.sqlite3'), keyword_fields={'travels': {'user_id'}})
+    store.index('travels', 't1', {'user_id': 'u1', 'travelers': {'adults': 2, 'children': 1},
+                                  'dates': {'check_in': '2025-06-01'}})
+
+    store.update('travels', 't1', {'dates': {'check_out': '2025-06-08'}})
+    store.update_by_query('travels', {'term': {'user_id': 'u1'}}, {'travelers': {'adults': 4}})
+
+    source = store.get('travels', 't1')['_source']
+    assert source['dates'] == {'check_in': '2025-06-01', 'check_out': '2025-06-08'}
+    assert source['travelers'] == {'adults': 4, 'children': 1}
+
+
+def test_document_store_is_abstract():
+    with pytest.raises(TypeError):
+        DocumentStore()
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import os
+
+from config.opensearch_client import opensearch_ops
+from services.token_revocation import RevocationCache
+
+
+def _worker():
+    """A worker's cache, synced by hand instead of by its thread"""
+    cache = RevocationCache()
+    cache._pid = os.getpid()
+    cache._sync()
+    return cache
+
+
+def test_revocations_reach_other_workers_at_the_next_sync():
+    worker, other = _worker(), _worker()
+
+    worker.revoke('jti-a', 'u1')
+    assert worker.is_revoked('jti-a')
+    assert not other.is_revoked('jti-a')
+    other._sync()
+    assert other.is_revoked('jti-a')
+
+
+def test_checks_do_not_query_the_index(monkeypatch):
+    worker = _worker()
+    worker.revoke_many([('jti-b', 'u1', None, 'access'), ('jti-c', 'u1', None, 'refresh'),
+                        (None, 'u1', None, 'refresh')])
+    searches = []
+    monkeypatch.setattr(opensearch_ops, 'search_documents',
+                        lambda *args, **kwargs: searches.append(args))
+
+    assert worker.is_revoked('jti-b') and worker.is_revoked('jti-c')
+    assert not worker.is_revoked('jti-unknown')
+    assert searches == []
+
+
+def test_expired_revocations_are_dropped():
+    past = datetime.utcnow() - timedelta(minutes=1)
+    worker = _worker()
+    worker.revoke('jti-old', 'u1', expires_at=past)
+    worker.revoke('jti-new', 'u1')
+
+    assert not _worker().is_revoked('jti-old')
+    worker._prune()
+    assert not worker.is_revoked('jti-old')
+    assert worker.is_revoked('jti-new')
@@ -0,0 +1,58 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+
+import pytest
+
+from config import travel_api_client as client_module
+from config.travel_api_client import TravelAPIClient, TravelAPITokenManager
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections open
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.client_address[1], self.headers.get('Authorization')))
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TRAVEL_API_URL', f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(client_module, 'travel_api_tokens',
+                        TravelAPITokenManager(fetch_token=lambda: ('secret', 900)))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_connection(upstream):
+    client = TravelAPIClient(pool_size=2)
+    for _ in range(5):
+        assert client.get('/api/search/job1/status').ok
+
+    ports = {port for port, _ in upstream.requests}
+    assert len(upstream.requests) == 5
+    assert len(ports) == 1
+    assert {auth for _, auth in upstream.requests} == {'Bearer secret'}
+    client.close()
+
+
+def test_session_is_rebuilt_after_fork(upstream, monkeypatch):
+    client = TravelAPIClient()
+    session = client.session()
+    assert client.session() is session
+
+    monkeypatch.setattr(client_module.os, 'getpid', lambda: -1)
+    assert client.session() is not session
+    client.close()
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from config.travel_api_client import TravelAPITokenManager
+
+
+class Upstream:
+    """Token endpoint double numbering the tokens it mints"""
+
+    def __init__(self, ttl=900, delay=0):
+        self.ttl = ttl
+        self.delay = delay
+        self.minted = 0
+
+    def fetch_token(self):
+        time.sleep(self.delay)
+        self.minted += 1
+        return f"token-{self.minted}", self.ttl
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_concurrent_callers_share_one_refresh():
+    upstream = Upstream(delay=0.1)
+    tokens = TravelAPITokenManager(fetch_token=upstream.fetch_token)
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(tokens.get_token())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert upstream.minted == 1
+    assert seen == ['token-1'] * 8
+    assert tokens.get_token() == 'token-1'
+    assert upstream.minted == 1
+
+
+def test_token_is_refreshed_ahead_of_expiry():
+    upstream = Upstream(ttl=900)
+    tokens = TravelAPITokenManager(fetch_token=upstream.fetch_token, refresh_margin=60)
+    assert tokens.get_token() == 'token-1'
+    # Inside the refresh margin the cached token is still served
+    tokens._expires_at = time.monotonic() + 30
+
+    assert tokens.get_token() == 'token-1'
+    deadline = time.monotonic() + 2
+    while tokens.stats['refreshes'] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert tokens.get_token() == 'token-2'
+
+
+def test_expired_token_is_refreshed_before_use():
+    upstream = Upstream(ttl=900)
+    tokens = TravelAPITokenManager(fetch_token=upstream.fetch_token)
+    tokens.get_token()
+    tokens._expires_at = time.monotonic() - 1
+
+    assert tokens.get_token() == 'token-2'
+
+
+def test_rejected_token_is_replaced_once():
+    upstream = Upstream()
+    tokens = TravelAPITokenManager(fetch_token=upstream.fetch_token)
+    sent = []
+
+    def send(token):
+        sent.append(token)
+        return Response(401 if token == 'token-1' else 200)
+
+    assert tokens.call(send).status_code == 200
+    assert sent == ['token-1', 'token-2']
+    assert tokens.stats['retries_on_401'] == 1
+    # A stale rejection does not throw away the fresh token
+    tokens.invalidate('token-1')
+    assert tokens.get_token() == 'token-2'
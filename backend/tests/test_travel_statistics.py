@@ -0,0 +1,28 @@
+from app import create_app
+from config.opensearch_client import opensearch_ops
+
+
+def test_statistics_are_counted_by_aggregations(monkeypatch):
+    client = create_app().test_client()
+    response = client.post('/api/auth/register', json={'email': 'stats@x.it', 'password': 'Secret123!',
+                                                       'name': 'S', 'username': 'stats'})
+    user_id = response.json['user']['id']
+    headers = {'Authorization': f"Bearer {response.json['access_token']}"}
+    travels = [('submitted', ['mare', 'cibo']), ('completed', ['mare']), (None, ['arte'])]
+    for number, (status, passions) in enumerate(travels):
+        travel = {'user_id': user_id, 'passions': passions}
+        if status:
+            travel['status'] = status
+        opensearch_ops.index_document('travels', f'stats-{number}', travel)
+    opensearch_ops.index_document('travels', 'stats-other', {'user_id': 'someone-else',
+                                                             'status': 'completed'})
+    # Counted without fetching the travel documents
+    monkeypatch.setattr(opensearch_ops, 'search_documents', None)
+
+    response = client.get('/api/travel/statistics', headers=headers)
+    assert response.status_code == 200
+    assert response.json['statistics'] == {
+        'total_travels': 3,
+        'status_breakdown': {'submitted': 1, 'completed': 1, 'unknown': 1},
+        'popular_passions': {'mare': 2, 'cibo': 1, 'arte': 1}
+    }
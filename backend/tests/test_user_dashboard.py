@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from app import create_app
+from config import opensearch_client as client_module
+from config.opensearch_client import opensearch_ops
+
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+
+def _register(client, email):
+    response = client.post('/api/auth/register', json={'email': email, 'password': 'Secret123!',
+                                                       'name': 'D', 'username': email})
+    body = response.json
+    return body['user']['id'], {'Authorization': f"Bearer {body['access_token']}"}
+
+
+def test_dashboard_is_one_multi_search(client, monkeypatch):
+    user_id, headers = _register(client, 'dash@x.it')
+    for day, status in enumerate(['submitted', 'completed', 'completed', 'submitted',
+                                  'cancelled', 'completed', 'submitted'], start=1):
+        opensearch_ops.index_document('travels', f'dash-{day}', {
+            'user_id': user_id, 'status': status, 'created_at': f'2025-06-{day:02d}T10:00:00',
+            'passions': ['mare', 'cibo', 'arte', 'storia']})
+    searches = []
+    msearch = opensearch_ops.msearch
+
+    def recording_msearch(requests):
+        searches.append([index for index, _ in requests])
+        return msearch(requests)
+
+    monkeypatch.setattr(opensearch_ops, 'msearch', recording_msearch)
+    monkeypatch.setattr(opensearch_ops, 'search_documents', None)  # must not be used
+
+    response = client.get('/api/user/dashboard', headers=headers)
+    assert response.status_code == 200
+    assert searches == [['users', 'travels', 'preferences']]
+    body = response.json
+    assert body['user']['email'] == 'dash@x.it'
+    assert body['statistics'] == {'total_travels': 7, 'completed_travels': 3,
+                                  'pending_travels': 4}
+    assert [travel['id'] for travel in body['recent_travels']] == [
+        'dash-7', 'dash-6', 'dash-5', 'dash-4', 'dash-3']
+    assert body['recent_travels'][0]['passions'] == ['mare', 'cibo', 'arte']
+
+
+class MultiSearchClient:
+    """OpenSearch client double failing the second search of a msearch"""
+
+    def msearch(self, body):
+        return {'responses': [{'hits': {'total': {'value': 0, 'relation': 'eq'}, 'hits': []}},
+                              {'error': {'type': 'index_not_found_exception'}, 'status': 404}]}
+
+
+def test_failed_search_of_a_msearch_is_answered_locally(monkeypatch):
+    opensearch_ops.index_document('preferences', 'ms-1', {'user_id': 'ms-user'})
+    monkeypatch.setattr(client_module, 'opensearch_client', MultiSearchClient())
+    monkeypatch.setattr(client_module, '_probe_pid', os.getpid())
+
+    users, preferences = opensearch_ops.msearch([
+        ('users', {'query': {'ids': {'values': ['ms-user']}}}),
+        ('preferences', {'query': {'term': {'user_id': 'ms-user'}}})])
+    assert users['hits']['hits'] == []
+    assert [hit['_id'] for hit in preferences['hits']['hits']] == ['ms-1']
@@ -0,0 +1,39 @@
+import pytest
+
+from config.opensearch_client import opensearch_ops, DocumentConflictError
+from services.users import create_user, find_user_by_email, user_id_for_email
+
+
+def test_registration_claims_the_address():
+    user_id, _ = create_user('Ada@X.it', 'hash', 'Ada', 'ada')
+
+    assert user_id == user_id_for_email('ada@x.it')
+    assert find_user_by_email(' ADA@x.it')['_id'] == user_id
+    with pytest.raises(DocumentConflictError):
+        create_user('ada@x.it', 'hash', 'Ada', 'ada2')
+
+
+def test_legacy_address_with_alias_cannot_be_registered_again():
+    opensearch_ops.index_document('users', 'legacy-1', {'email': 'Old@X.it', 'name': 'Old'})
+    # As written by scripts/migrate_user_emails.py
+    opensearch_ops.bulk_index('user_emails', [
+        ('old@x.it', {'email_normalized': 'old@x.it', 'user_id': 'legacy-1'})], op_type='create')
+
+    assert find_user_by_email('old@x.it')['_id'] == 'legacy-1'
+    with pytest.raises(DocumentConflictError):
+        create_user('OLD@x.it', 'hash', 'Old', 'old')
+
+
+def test_registration_interrupted_after_the_alias_can_be_retried():
+    user_id = user_id_for_email('half@x.it')
+    opensearch_ops.index_document('user_emails', 'half@x.it',
+                                  {'email_normalized': 'half@x.it', 'user_id': user_id})
+
+    assert create_user('half@x.it', 'hash', 'Half', 'half')[0] == user_id
+
+
+def test_unknown_address_is_not_searched(monkeypatch):
+    monkeypatch.setattr(opensearch_ops, 'search_documents',
+                        lambda *args, **kwargs: pytest.fail('searched the users index'))
+
+    assert find_user_by_email('nobody@x.it') is None
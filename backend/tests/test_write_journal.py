@@ -0,0 +1,135 @@
+import json
+import os
+
+from config.query_dsl import merge_partial
+from config.write_journal import WriteJournal, WRITTEN_AT, written_at
+
+
+class Cluster:
+    """Just enough of OpenSearch for replay: documents with seq_no, and bulk
+    actions honouring if_seq_no"""
+
+    def __init__(self):
+        self.docs = {}
+        self.seq_no = 0
+        self.before_bulk = None
+
+    def write(self, index, doc_id, source):
+        self.seq_no += 1
+        self.docs[(index, doc_id)] = (source, self.seq_no)
+
+    def source(self, index, doc_id):
+        return self.docs[(index, doc_id)][0]
+
+    def get_docs(self, index, ids, source):
+        found = {}
+        for doc_id in ids:
+            if (index, doc_id) in self.docs:
+                doc, seq_no = self.docs[(index, doc_id)]
+                if source is not None:
+                    doc = {k: v for k, v in doc.items() if k in source}
+                found[doc_id] = {'_id': doc_id, '_source': doc, '_seq_no': seq_no,
+                                 '_primary_term': 1}
+        return found
+
+    def send_bulk(self, actions):
+        if self.before_bulk:
+            self.before_bulk()
+        indexed, errors = 0, []
+        for action in actions:
+            key = (action['_index'], action['_id'])
+            op = action['_op_type']
+            current = self.docs.get(key)
+            status = None
+            if 'if_seq_no' in action and (current is None or current[1] != action['if_seq_no']):
+                status = 409
+            elif op == 'create' and current is not None:
+                status = 409
+            elif op in ('update', 'delete') and current is None:
+                status = 404
+            if status:
+                errors.append({'_index': key[0], '_id': key[1], 'op_type': op, 'status': status,
+                               'error': 'refused'})
+                continue
+            if op == 'delete':
+                del self.docs[key]
+            elif op == 'update':
+                self.write(*key, merge_partial(current[0], action['doc']))
+            else:
+                self.write(*key, action['_source'])
+            indexed += 1
+        return {'indexed': indexed, 'errors': errors}
+
+    def replay(self, directory):
+        return WriteJournal(str(directory)).replay(self.send_bulk, self.get_docs)
+
+
+def _write(path, entries):
+    with open(path, 'w', encoding='utf-8') as handle:
+        for entry in entries:
+            handle.write(json.dumps(entry) + '\n')
+
+
+def _source(cluster, index, doc_id):
+    return {k: v for k, v in cluster.source(index, doc_id).items() if k != WRITTEN_AT}
+
+
+def test_replay_merges_files_by_timestamp(tmp_path):
+    # '1000' sorts before '999' although its writes came later
+    _write(tmp_path / '1000.1.ndjson', [
+        {'op': 'update', 'index': 'travels', 'id': 't1', 'body': {'status': 'done'}, 'ts': 2.0}])
+    _write(tmp_path / '999.1.ndjson', [
+        {'op': 'index', 'index': 'travels', 'id': 't1', 'body': {'status': 'new'}, 'ts': 1.0},
+        {'op': 'update', 'index': 'travels', 'id': 't1', 'body': {'status': 'running'}, 'ts': 1.5}])
+    cluster = Cluster()
+
+    assert cluster.replay(tmp_path) == 3
+    assert _source(cluster, 'travels', 't1') == {'status': 'done'}
+    assert cluster.source('travels', 't1')[WRITTEN_AT] == written_at(2.0)
+    assert not list(tmp_path.glob('*.ndjson'))
+
+
+def test_replay_does_not_undo_newer_live_writes(tmp_path):
+    cluster = Cluster()
+    # Written live after the journaled writes were made
+    cluster.write('sessions', 's1', {'is_active': False, WRITTEN_AT: written_at(20.0)})
+    cluster.write('users', 'u1', {'name': 'New', WRITTEN_AT: written_at(20.0)})
+    _write(tmp_path / '999.1.ndjson', [
+        {'op': 'update', 'index': 'sessions', 'id': 's1', 'body': {'is_active': True}, 'ts': 10.0},
+        {'op': 'index', 'index': 'users', 'id': 'u1', 'body': {'name': 'Old'}, 'ts': 10.0},
+        {'op': 'update', 'index': 'users', 'id': 'u1', 'body': {'city': 'Roma'}, 'ts': 30.0}])
+
+    assert cluster.replay(tmp_path) == 1
+    assert _source(cluster, 'sessions', 's1') == {'is_active': False}
+    assert _source(cluster, 'users', 'u1') == {'name': 'New', 'city': 'Roma'}
+
+
+def test_replay_loses_to_a_write_made_while_it_runs(tmp_path):
+    cluster = Cluster()
+    cluster.write('users', 'u1', {'name': 'Before'})
+    _write(tmp_path / '999.1.ndjson', [
+        {'op': 'update', 'index': 'users', 'id': 'u1', 'body': {'name': 'Journaled'}, 'ts': 10.0}])
+    cluster.before_bulk = lambda: cluster.write('users', 'u1', {'name': 'Live'})
+
+    assert cluster.replay(tmp_path) == 0
+    assert cluster.source('users', 'u1') == {'name': 'Live'}
+
+
+def test_replay_keeps_conflicting_creates(tmp_path):
+    _write(tmp_path / '999.1.ndjson', [
+        {'op': 'create', 'index': 'users', 'id': 'u1', 'body': {'email': 'a@x.it'}, 'ts': 1.0},
+        {'op': 'update', 'index': 'users', 'id': 'u1', 'body': {'name': 'A'}, 'ts': 2.0},
+        {'op': 'create', 'index': 'users', 'id': 'u2', 'body': {'email': 'b@x.it'}, 'ts': 3.0}])
+    cluster = Cluster()
+    # u1 was created by an interrupted replay, u2 by someone else
+    cluster.write('users', 'u1', {'email': 'a@x.it', 'name': 'A', WRITTEN_AT: written_at(2.0)})
+    cluster.write('users', 'u2', {'email': 'other@x.it'})
+
+    # The update of u1 is skipped: the cluster document already has it
+    assert cluster.replay(tmp_path) == 1
+    conflicts = [json.loads(line) for path in tmp_path.glob('conflicts-*.jsonl')
+                 for line in open(path, encoding='utf-8')]
+    assert conflicts == [{'index': 'users', 'id': 'u2', 'journaled': {'email': 'b@x.it'},
+                          'existing': {'email': 'other@x.it'}}]
+    assert cluster.source('users', 'u2') == {'email': 'other@x.it'}
+    assert not os.path.exists(tmp_path / '999.1.ndjson')
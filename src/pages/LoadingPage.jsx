@@ -40,9 +40,58 @@ const LoadingPage = ({ user, setUser }) => {
     }
 
     setJobId(currentJobId);
-    startPolling(currentJobId);
+    if (window.EventSource) {
+      return startStreaming(currentJobId);
+    }
+    return startPolling(currentJobId);
   }, [location]);
 
+  const startStreaming = (jobId) => {
+    console.log(`[DEBUG] Subscribing to events for job: ${jobId}`);
+    let stopPolling = null;
+    const events = new EventSource(travelAPI.jobEventsUrl(jobId));
+
+    events.addEventListener('status', (event) => {
+      const statusResponse = JSON.parse(event.data);
+      const jobStatus = statusResponse.status || statusResponse.state || 'PROCESSING';
+      setStatus(jobStatus);
+      setProgress(prev => (jobStatus === 'COMPLETED' ? 100 : Math.min(Math.max(prev, 20) + 5, 90)));
+    });
+
+    events.addEventListener('result', (event) => {
+      events.close();
+      const resultResponse = JSON.parse(event.data);
+      console.log('[INFO] Job result received:', resultResponse);
+      setResult(resultResponse);
+      setStatus('COMPLETED');
+      setProgress(100);
+      setTimeout(() => {
+        navigate('/profile', { state: { activeSection: 'packages' } });
+      }, 2000);
+    });
+
+    events.addEventListener('failure', (event) => {
+      events.close();
+      console.error('[ERROR] Job failed:', event.data);
+      setStatus('FAILED');
+      setProgress(100);
+      setError('Il processo di ricerca è fallito. Riprova più tardi.');
+    });
+
+    events.onerror = () => {
+      // The browser reconnects on its own; fall back to polling only if it gives up
+      if (events.readyState === EventSource.CLOSED && !stopPolling) {
+        console.warn('[WARN] Event stream closed, falling back to polling');
+        stopPolling = startPolling(jobId);
+      }
+    };
+
+    return () => {
+      events.close();
+      if (stopPolling) stopPolling();
+    };
+  };
+
   const startPolling = (jobId) => {
     console.log(`[DEBUG] Starting polling for job: ${jobId}`);
     
@@ -263,6 +263,8 @@ function ProfilePage() {
   const [packages, setPackages] = useState([]);
   const [packagesLoading, setPackagesLoading] = useState(true);
   const [packagesError, setPackagesError] = useState("");
+  const [packagesCursor, setPackagesCursor] = useState(null);
+  const [packagesLoadingMore, setPackagesLoadingMore] = useState(false);
 
   // Fetch packages when packages section is selected
   useEffect(() => {
@@ -279,6 +281,7 @@ function ProfilePage() {
         console.log("[DEBUG] Number of packages:", response.packages?.length || 0);
         
         setPackages(response.packages || []);
+        setPackagesCursor(response.next_cursor || null);
         
         if (response.packages && response.packages.length > 0) {
           console.log("[DEBUG] First package:", response.packages[0]);
@@ -296,6 +299,22 @@ function ProfilePage() {
     }
   }, [selectedSection]);
 
+  // Append the next page of packages, following the cursor of the last one
+  const loadMorePackages = async () => {
+    try {
+      setPackagesLoadingMore(true);
+      const { travelAPI } = await import("../services/api");
+      const response = await travelAPI.getUserPackages(packagesCursor);
+      setPackages((current) => [...current, ...(response.packages || [])]);
+      setPackagesCursor(response.next_cursor || null);
+    } catch (error) {
+      console.error("[ERROR] Error fetching more packages:", error);
+      setPackagesError(`Errore nel caricamento dei pacchetti: ${error.message}`);
+    } finally {
+      setPackagesLoadingMore(false);
+    }
+  };
+
   const renderPackagesSection = () => {
     console.log("[DEBUG] Rendering packages section");
     console.log("[DEBUG] Packages state:", packages);
@@ -376,6 +395,17 @@ function ProfilePage() {
                   </Grid>
                 ))}
               </Grid>
+              {packagesCursor && (
+                <Box sx={{ textAlign: "center", mt: 3 }}>
+                  <Button
+                    variant="outlined"
+                    disabled={packagesLoadingMore}
+                    onClick={loadMorePackages}
+                  >
+                    {packagesLoadingMore ? "Caricamento..." : "Carica altri pacchetti"}
+                  </Button>
+                </Box>
+              )}
             </Box>
           )}
         </CardContent>
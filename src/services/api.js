@@ -162,7 +162,13 @@ export const travelAPI = {
 
   getJobResult: (jobId) => apiCall(`/travel/get-job-result/${jobId}`),
 
-  getUserPackages: () => apiCall('/travel/my-packages'),
+  // Server-Sent Events stream with job status transitions and the final result
+  jobEventsUrl: (jobId) => `${API_BASE_URL}/travel/jobs/${jobId}/events`,
+
+  // Pass the next_cursor of the previous page to load the following one
+  getUserPackages: (cursor) => apiCall(
+    `/travel/my-packages${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''}`
+  ),
 };
 
 // User API